@@ -8,29 +8,156 @@ DB：SQLite (aat_poc_v2.db)
 @11星協作：@光蘊 @典野 @理樞
 """
 
+import hmac
+import math
 import os
 import sqlite3
 import json
-from flask import Flask, render_template, jsonify, request, request
+import threading
+import time
+import click
+from flask import Flask, Response, render_template, jsonify, request, request
 from datetime import datetime
 
+from db_pool import ConnectionPool
+from response_cache import ResponseCache, file_version
+from precompute import Precomputer
+from live_feed import LiveFeed
+from query_executor import QueryExecutor
+from metrics import Metrics, connection_factory, slow_log
+from fast_json import FastJSONProvider
+from compression import ResponseCompressor
+from response_format import FormatError, accept_variant, render, requested_format
+from zw_rollup import rollup_source, refresh_rollups
+import zw_columnar
+from zw_export import EXPORT_FORMATS, export_query, stream_export
+from zw_ingest import Ingestor, IngestError
+from bulk_load import LOAD_TABLES, LOAD_CHUNK_ROWS, BulkLoader, LoadError
+from row_pager import PAGE_TABLES, PAGE_LIMIT_DEFAULT, fetch_page
+from zw_filter import MACHINE_FILTER_COLUMNS, ZwFilter
+from zw_spc import NELSON_RULES, EWMA_LAMBDA, EWMA_L, CUSUM_K, CUSUM_H, analyze as spc_analyze, group_series
+from zw_schema import time_columns, explain_checks, migrate as migrate_zw_schema
+from zw_matrix import MATRIX_MIN_BATCHES, PairMatrix, PairMatrixCache
+from zw_health import HEALTH_WEIGHTS, HealthStore, health_score
+
 app = Flask(__name__)
 
+# jsonify() 使用 orjson（未安裝時為標準庫 json）
+app.json = FastJSONProvider(app)
+
 # DB 路徑
-DB_PATH = os.path.join(os.path.dirname(__file__), 'data', 'aat_poc_v2.db')
-ZW_DB_PATH = os.path.join(os.path.dirname(__file__), 'data', 'zw_poc_fake_60d.db')
+DB_PATH = os.environ.get(
+    'AAT_DB_PATH', os.path.join(os.path.dirname(__file__), 'data', 'aat_poc_v2.db'))
+ZW_DB_PATH = os.environ.get(
+    'ZW_DB_PATH', os.path.join(os.path.dirname(__file__), 'data', 'zw_poc_fake_60d.db'))
+
+# 分段統計引擎：sqlite（預設）或 numpy（欄式快照，需安裝 numpy）
+ZW_ENGINE = os.environ.get('ZW_ENGINE', 'sqlite')
+ZW_COLUMNAR_DIR = os.environ.get(
+    'ZW_COLUMNAR_DIR', os.path.join(os.path.dirname(__file__), 'data', 'zw_columnar'))
+
+# 啟動時套用正崴 DB 結構遷移（冪等；唯讀部署時略過，查詢退回原始運算式）
+if os.environ.get('ZW_AUTO_MIGRATE', '1') == '1' and os.path.exists(ZW_DB_PATH):
+    try:
+        migrate_zw_schema(ZW_DB_PATH)
+    except sqlite3.OperationalError:
+        pass
+
+# 每個 worker 一組唯讀連線池（conn.close() 會歸還而非關閉；連線的 SQL 計入 /metrics）
+db_pool = ConnectionPool(DB_PATH, factory=connection_factory)
+zw_db_pool = ConnectionPool(ZW_DB_PATH, factory=connection_factory)
 
 def get_db():
     """取得 DB 連線（展示用）"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return db_pool.acquire()
 
 def get_zw_db():
     """取得正崴 DB 連線（深度分析）"""
-    conn = sqlite3.connect(ZW_DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return zw_db_pool.acquire()
+
+def db_version():
+    """兩個 DB 的版本（mtime/size），供回應快取判斷失效"""
+    return file_version(DB_PATH, ZW_DB_PATH)
+
+# 各路由的 SQL 數 / SQL 時間 / 序列化時間（/metrics、Server-Timing）；需在回應快取之前註冊
+request_metrics = Metrics()
+request_metrics.init_app(app)
+
+# gzip / brotli 回應壓縮；需在回應快取之前註冊（快取保存各編碼的壓縮結果）
+compressor = ResponseCompressor()
+compressor.init_app(app)
+
+# /api/* 回應快取（DB 變動時自動失效）
+response_cache = ResponseCache(db_version, compressor=compressor, variant_fn=accept_variant)
+response_cache.init_app(app)
+
+# MES 資料寫入（單一寫入連線，WAL 模式）；需設定 ZW_INGEST_TOKEN 並帶 Bearer token，未設定時停用
+zw_ingestor = Ingestor(ZW_DB_PATH)
+ZW_INGEST_TOKEN = os.environ.get('ZW_INGEST_TOKEN')
+
+# 耗時區塊由背景預先計算（PRECOMPUTE_INTERVAL 秒或 DB 變動時重算）
+precomputer = Precomputer(db_version)
+
+# DB 變動時推送增量（/api/stream）
+live_feed = LiveFeed(db_version)
+
+# 操作員 × 機台稀疏矩陣（依篩選條件快取，ZW_MATRIX_CACHE_SIZE 份）
+zw_matrix_cache = PairMatrixCache()
+
+# 機台健康狀態（溫度 / 振動 EWMA），只套用新增的 machine_status
+zw_health_store = HealthStore()
+
+# 端點內互不相依的查詢平行執行（每個請求最多 QUERY_PARALLELISM 條連線）
+query_executor = QueryExecutor()
+
+def query_parallel(pool, queries):
+    """
+    以連線池中的不同連線平行執行 [(sql, params)]，回傳各自的 fetchall() 結果
+    """
+    def call(sql, params):
+        def run():
+            conn = pool.acquire()
+            try:
+                return conn.execute(sql, params).fetchall()
+            finally:
+                conn.close()
+        return run
+    return query_executor.map([call(sql, params) for sql, params in queries])
+
+def get_zw_source(conn):
+    """production_log 聚合來源（rollup 表，或等價的原始表子查詢）"""
+    return rollup_source(conn, ZW_DB_PATH)
+
+def row_page(conn, tables):
+    """
+    原始資料 keyset 分頁（/api/daily_capacity_rows、/api/zw_rows 共用）
+    ?table= &columns=a,b &limit= &cursor= &order=desc &start= &end= &<篩選欄位>= &format=columnar|msgpack
+    """
+    try:
+        fmt = requested_format()
+        table = request.args.get('table', tables[0])
+        if table not in tables:
+            raise ValueError(f"table 需為: {', '.join(tables)}")
+        columns = request.args.get('columns')
+        try:
+            limit = int(request.args.get('limit', PAGE_LIMIT_DEFAULT))
+        except ValueError:
+            raise ValueError("limit 需為整數")
+        page = fetch_page(
+            conn, table,
+            columns=[c.strip() for c in columns.split(',') if c.strip()] if columns else None,
+            filters={name: request.args.get(name) for name in PAGE_TABLES[table][2]},
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            cursor=request.args.get('cursor'),
+            limit=limit,
+            descending=request.args.get('order', 'asc').lower() == 'desc'
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        conn.close()
+    return render(page, fmt)
 
 # ============================================================
 # API Routes - 數據端點
@@ -39,26 +166,15 @@ def get_zw_db():
 @app.route('/api/stats')
 def api_stats():
     """總覽統計"""
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # 表數量
-    cursor.execute("SELECT COUNT(*) FROM _table_catalog")
-    table_count = cursor.fetchone()[0]
-    
-    # 總筆數
-    cursor.execute("SELECT SUM(row_count) FROM _table_catalog")
-    total_rows = cursor.fetchone()[0]
-    
-    # 產線數
-    cursor.execute("SELECT COUNT(DISTINCT line_no) FROM daily_capacity")
-    line_count = cursor.fetchone()[0]
-    
-    # 平均良率
-    cursor.execute("SELECT AVG(yield_rate) FROM daily_capacity")
-    avg_yield = cursor.fetchone()[0]
-    
-    conn.close()
+    # 表數量、總筆數、產線數、平均良率（互不相依，平行查詢）
+    catalog, lines, yields = query_parallel(db_pool, [
+        ("SELECT COUNT(*), SUM(row_count) FROM _table_catalog", ()),
+        ("SELECT COUNT(DISTINCT line_no) FROM daily_capacity", ()),
+        ("SELECT AVG(yield_rate) FROM daily_capacity", ()),
+    ])
+    table_count, total_rows = catalog[0]
+    line_count = lines[0][0]
+    avg_yield = yields[0][0]
     
     return jsonify({
         "table_count": table_count,
@@ -339,6 +455,11 @@ def api_lowest_yield():
         ]
     })
 
+@app.route('/api/daily_capacity_rows')
+def api_daily_capacity_rows():
+    """daily_capacity 原始資料分頁（keyset：date, id）"""
+    return row_page(get_db(), ['daily_capacity'])
+
 # ============================================================
 # Page Routes
 # ============================================================
@@ -456,110 +577,487 @@ def api_aoi_simulation():
 # 正崴深度分析 API（PYLIB: 複用現有模式）
 # ============================================================
 
-@app.route('/api/zw_stats')
-def api_zw_stats():
-    """正崴數據總覽"""
-    conn = get_zw_db()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT COUNT(*) FROM production_log")
-    batch_count = cursor.fetchone()[0]
+class ZwContext:
+    """
+    單次請求的正崴查詢環境
+    bundle 時多個區塊共用同一連線，相同分組的聚合只掃描一次
+    篩選條件（?start=&end=&line_id=…）套用於所有區塊
+    """
+
+    def __init__(self, parent=None):
+        self.conn = get_zw_db()
+        self.cursor = self.conn.cursor()
+        if parent is None:
+            self._src = None
+            self._columnar = False
+            self._filter = None
+            self._shared = {}
+            self._shared_locks = {}
+            self._lock = threading.Lock()
+        else:
+            # 平行查詢的子 context：同一篩選條件與聚合快取，另一條連線
+            self._src = parent._src
+            self._columnar = parent._columnar
+            self._filter = parent._filter
+            self._shared = parent._shared
+            self._shared_locks = parent._shared_locks
+            self._lock = parent._lock
+
+    @property
+    def src(self):
+        if self._src is None:
+            self._src = get_zw_source(self.conn)
+        return self._src
+
+    @property
+    def columnar(self):
+        """欄式快照（ZW_ENGINE=numpy 且已安裝 numpy），否則為 None"""
+        if self._columnar is False:
+            if ZW_ENGINE == 'numpy' and zw_columnar.available():
+                self._columnar = zw_columnar.get_snapshot(self.conn, ZW_COLUMNAR_DIR)
+            else:
+                self._columnar = None
+        return self._columnar
+
+    @property
+    def filter(self):
+        if self._filter is None:
+            try:
+                self._filter = ZwFilter.from_args(request.args)
+            except ValueError as e:
+                raise ZwParamError(str(e))
+        return self._filter
+
+    def where(self, table='rollup', alias=None, prefix='WHERE', pad_days=0):
+        """
+        篩選條件 SQL 片段與參數：("WHERE a = ? AND …", [...])，無篩選時為 ("", [])
+        table: rollup（ctx.src）/ production_log / machine_status / maintenance_log
+        machine_status、maintenance_log 無 line_id，以該產線的機台套用；
+        shift / supplier_id / product_id 不適用而略過，區塊需以 filter.report() 回報
+        """
+        if table == 'rollup':
+            conds, params = self.filter.conditions('date', alias=alias, pad_days=pad_days)
+        elif table == 'production_log':
+            day = time_columns(self.conn, table)['day']
+            conds, params = self.filter.conditions(day, alias=alias, pad_days=pad_days)
+        else:
+            day = time_columns(self.conn, table)['day']
+            conds, params = self.filter.conditions(
+                day, ('machine_id',), alias=alias, pad_days=pad_days,
+                line_machines=f"SELECT DISTINCT machine_id FROM {self.src} WHERE line_id = ?")
+        if not conds:
+            return '', []
+        return f"{prefix} {' AND '.join(conds)}", params
+
+    @property
+    def mask(self):
+        """欄式快照的篩選遮罩（無篩選時為 None）"""
+        return self.filter.mask(self.columnar)
+
+    def shared(self, name):
+        """取得共用聚合結果（ZW_SHARED_SCANS），同一 context（含子 context）內只查詢一次"""
+        if name not in self._shared:
+            with self._lock:
+                lock = self._shared_locks.setdefault(name, threading.Lock())
+            with lock:
+                if name not in self._shared:
+                    self._shared[name] = ZW_SHARED_SCANS[name](self)
+        return self._shared[name]
+
+    def parallel(self, *jobs):
+        """
+        平行執行互不相依的 job(ctx)，回傳結果 list（順序同參數）
+        每個 job 拿到使用另一條連線的子 context；平行度上限 QUERY_PARALLELISM
+        """
+        if len(jobs) <= 1 or query_executor.parallelism <= 1:
+            return [job(self) for job in jobs]
+        
+        # 子執行緒沒有 request context：篩選條件、來源、快照先在請求執行緒解析
+        self.filter
+        self.src
+        self.columnar
+        
+        def call(job):
+            def run():
+                child = ZwContext(parent=self)
+                try:
+                    return job(child)
+                finally:
+                    child.close()
+            return run
+        return query_executor.map([call(job) for job in jobs])
+
+    def prefetch(self, *names):
+        """平行預先計算多個共用聚合"""
+        self.parallel(*(lambda ctx, name=name: ctx.shared(name) for name in names))
+
+    def close(self):
+        self.conn.close()
+
+def _scan_max_date(ctx):
+    """數據最大日期（歷史模擬數據，以此為「最近 N 天」基準）"""
+    where, params = ctx.where()
+    return ctx.conn.execute(f"SELECT MAX(date) FROM {ctx.src} {where}", params).fetchone()[0]
+
+def _scan_daily(ctx):
+    """日維度聚合：良率趨勢、振動趨勢、SPC X-bar 共用"""
+    where, params = ctx.where()
+    rows = ctx.conn.execute(f"""
+        SELECT date,
+               SUM(output_sum) as output,
+               SUM(defect_sum) as defect,
+               ROUND(100.0 * (SUM(output_sum) - SUM(defect_sum)) / SUM(output_sum), 2) as yield_rate,
+               ROUND(TOTAL(vibration_sum) / SUM(batch_count), 2) as avg_vib,
+               ROUND(TOTAL(defect_rate_sum) / SUM(batch_count) * 100, 2) as defect_pct,
+               ROUND(TOTAL(defect_rate_sum) / SUM(batch_count) * 100, 3) as avg_defect,
+               ROUND(MIN(defect_rate_min) * 100, 3) as min_defect,
+               ROUND(MAX(defect_rate_max) * 100, 3) as max_defect,
+               SUM(batch_count) as sample_size
+        FROM {ctx.src}
+        {where}
+        GROUP BY date
+        ORDER BY date
+    """, params).fetchall()
+    return [dict(row) for row in rows]
+
+def _scan_line(ctx):
+    """產線維度聚合：產線績效、產線溫度共用"""
+    where, params = ctx.where()
+    rows = ctx.conn.execute(f"""
+        SELECT line_id,
+               SUM(batch_count) as batch_count,
+               SUM(output_sum) as total_output,
+               ROUND(100.0 * (SUM(output_sum) - SUM(defect_sum)) / SUM(output_sum), 2) as yield_rate,
+               ROUND(TOTAL(cycle_time_sum) / SUM(batch_count), 3) as avg_cycle_time,
+               ROUND(TOTAL(temperature_sum) / SUM(batch_count), 1) as avg_temp,
+               ROUND(MIN(temperature_min), 1) as min_temp,
+               ROUND(MAX(temperature_max), 1) as max_temp,
+               ROUND(TOTAL(defect_rate_sum) / SUM(batch_count) * 100, 2) as avg_defect
+        FROM {ctx.src}
+        {where}
+        GROUP BY line_id
+        ORDER BY line_id
+    """, params).fetchall()
+    return [dict(row) for row in rows]
+
+def _scan_machine_recent(ctx):
+    """機台維度聚合（最近7天）：維護警示、振動機台共用"""
+    where, params = ctx.where(prefix='AND')
+    rows = ctx.conn.execute(f"""
+        SELECT machine_id,
+               MAX(runtime_max) as current_hours,
+               ROUND(TOTAL(defect_rate_sum) / SUM(batch_count) * 100, 2) as defect_pct,
+               ROUND(TOTAL(vibration_sum) / SUM(batch_count), 2) as avg_vib,
+               ROUND(MAX(vibration_max), 2) as max_vib
+        FROM {ctx.src}
+        WHERE date >= DATE(?, '-7 days') {where}
+        GROUP BY machine_id
+        ORDER BY machine_id
+    """, [ctx.shared('max_date')] + params).fetchall()
+    return [dict(row) for row in rows]
+
+def _scan_spc_subgroups(ctx, key):
+    """SPC 子群組：序列（產線/機台）× 日，依序列、日期排序"""
+    where, params = ctx.where()
+    rows = ctx.conn.execute(f"""
+        SELECT {key} as series,
+               date,
+               SUM(batch_count) as n,
+               TOTAL(defect_rate_sum) / SUM(batch_count) * 100 as xbar,
+               (MAX(defect_rate_max) - MIN(defect_rate_min)) * 100 as r,
+               SUM(defect_sum) as defect,
+               SUM(output_sum) as output
+        FROM {ctx.src}
+        {where}
+        GROUP BY {key}, date
+        ORDER BY {key}, date
+    """, params).fetchall()
+    return [dict(row) for row in rows]
+
+def _scan_spc_line(ctx):
+    return _scan_spc_subgroups(ctx, 'line_id')
+
+def _scan_spc_machine(ctx):
+    return _scan_spc_subgroups(ctx, 'machine_id')
+
+ZW_SHARED_SCANS = {
+    'max_date': _scan_max_date,
+    'daily': _scan_daily,
+    'line': _scan_line,
+    'machine_recent': _scan_machine_recent,
+    'spc_line': _scan_spc_line,
+    'spc_machine': _scan_spc_machine,
+}
+
+# 已註冊的分析區塊：name -> builder(ctx)
+ZW_SECTIONS = {}
+
+class ZwParamError(ValueError):
+    """查詢參數錯誤（回應 400）"""
+
+def zw_endpoint(name):
+    """註冊正崴分析區塊：提供 /api/zw_<name>，並可由 /api/zw_bundle 組合"""
+    def decorator(builder):
+        ZW_SECTIONS[name] = builder
+
+        def view():
+            # ?format=columnar|msgpack 或 Accept: application/msgpack
+            try:
+                fmt = requested_format()
+            except FormatError as e:
+                return jsonify({"error": str(e)}), 400
+            
+            # 無篩選參數：直接回傳背景預先計算的結果
+            if set(request.args) <= {'format'}:
+                payload, info = zw_precomputed(name)
+                if payload is not None:
+                    return precomputed_response(render(payload, fmt), [info])
+            
+            ctx = ZwContext()
+            try:
+                return render(builder(ctx), fmt)
+            except ZwParamError as e:
+                return jsonify({"error": str(e)}), 400
+            finally:
+                ctx.close()
+
+        view.__doc__ = builder.__doc__
+        app.add_url_rule(f'/api/zw_{name}', f'api_zw_{name}', view)
+        return builder
+    return decorator
+
+# ============================================================
+# 通用分段統計（單次掃描；取代各端點寫死的 CASE WHEN）
+# ============================================================
+
+# 可分段的數值欄位 / 可交叉的類別欄位
+ZW_NUMERIC_COLUMNS = ('temperature', 'vibration', 'runtime_hours', 'defect_rate', 'cycle_time', 'output_qty', 'defect_qty')
+ZW_CATEGORY_COLUMNS = ('line_id', 'machine_id', 'operator_id', 'supplier_id', 'shift', 'product_id')
+
+def _bin_case(column, edges, right, params, null=None):
+    """
+    CASE 分段運算式：x < e0 → 0，…，其餘（含 NULL）→ len(edges)；right=True 時為 <=
+    null 指定時 NULL 歸入該分段
+    """
+    op = '<=' if right else '<'
+    whens = [f"WHEN {column} IS NULL THEN {null}"] if null is not None else []
+    params.extend(edges)
+    whens += [f"WHEN {column} {op} ? THEN {i}" for i in range(len(edges))]
+    return f"CASE {' '.join(whens)} ELSE {len(edges)} END"
+
+def zw_bin_cells(ctx, column, edges, right=False, by=None, by_edges=None, by_right=False):
+    """
+    production_log 單次掃描分段統計
+    回傳 [{bin, by_value, batch_count, defect_pct, total_defect, min_defect, max_defect}]，依 (bin, by_value) 排序
+    by 為數值欄位時以 by_edges 分段（by_value 為分段序號），類別欄位則為原值
+    """
+    snap = ctx.columnar
+    if snap is not None:
+        return zw_columnar.bin_cells(snap, column, edges, right, by, by_edges, by_right, ctx.mask)
+    
+    params = []
+    select = [f"{_bin_case(column, edges, right, params)} as bin"]
+    group = ['bin']
+    if by is not None:
+        by_expr = by if by_edges is None else _bin_case(by, by_edges, by_right, params)
+        select.append(f"{by_expr} as by_value")
+        group.append('by_value')
+    where, where_params = ctx.where('production_log')
+    params.extend(where_params)
+    
+    ctx.cursor.execute(f"""
+        SELECT {', '.join(select)},
+               COUNT(*) as batch_count,
+               ROUND(AVG(defect_rate) * 100, 2) as defect_pct,
+               SUM(defect_qty) as total_defect,
+               ROUND(MIN(defect_rate) * 100, 2) as min_defect,
+               ROUND(MAX(defect_rate) * 100, 2) as max_defect
+        FROM production_log
+        {where}
+        GROUP BY {', '.join(group)}
+        ORDER BY {', '.join(group)}
+    """, params)
+    return [dict(row) for row in ctx.cursor.fetchall()]
+
+def zw_factor_cells(ctx, factors):
+    """
+    二元因子交互：factors 為 [(欄位, 門檻, 高標籤, 正常標籤, 鍵名)]，value > 門檻為高（NULL 視為正常）
+    回傳 [{鍵名: 標籤…, batch_count, defect_pct, total_defect}]，不良率由高到低（與 zw_columnar.factor_matrix 相同）
+    """
+    snap = ctx.columnar
+    if snap is not None:
+        return zw_columnar.factor_matrix(snap, factors, ctx.mask)
+    
+    params = []
+    group = [f"f{i}" for i in range(len(factors))]
+    select = [
+        f"{_bin_case(column, [threshold], True, params, null=0)} as f{i}"
+        for i, (column, threshold, _, _, _) in enumerate(factors)
+    ]
+    where, where_params = ctx.where('production_log')
+    params.extend(where_params)
     
-    cursor.execute("SELECT COUNT(DISTINCT line_id) FROM production_log")
-    line_count = cursor.fetchone()[0]
+    ctx.cursor.execute(f"""
+        SELECT {', '.join(select)},
+               COUNT(*) as batch_count,
+               ROUND(AVG(defect_rate) * 100, 2) as defect_pct,
+               SUM(defect_qty) as total_defect
+        FROM production_log
+        {where}
+        GROUP BY {', '.join(group)}
+    """, params)
+    rows = []
+    for row in ctx.cursor.fetchall():
+        item = {key: high if row[g] else normal for g, (_, _, high, normal, key) in zip(group, factors)}
+        item.update(batch_count=row['batch_count'], defect_pct=row['defect_pct'], total_defect=row['total_defect'])
+        rows.append(item)
+    rows.sort(key=lambda x: tuple(x[f[4]] for f in factors))
+    rows.sort(key=lambda x: -(x['defect_pct'] or 0))
+    return rows
+
+def zw_bin_labels(edges, right=False):
+    """分段標籤：['<1.5', '1.5-2', …, '≥3']"""
+    fmt = [f"{e:g}" for e in edges]
+    lo, hi = ('≤', '>') if right else ('<', '≥')
+    return [f"{lo}{fmt[0]}"] + [f"{a}-{b}" for a, b in zip(fmt, fmt[1:])] + [f"{hi}{fmt[-1]}"]
+
+def _parse_edges(name):
+    raw = request.args.get(name, '')
+    try:
+        edges = [float(x) for x in raw.split(',') if x.strip()]
+    except ValueError:
+        raise ZwParamError(f"{name} 需為逗號分隔數值")
+    if not all(math.isfinite(e) for e in edges):
+        raise ZwParamError(f"{name} 需為有限數值")
+    if not 1 <= len(edges) <= 50:
+        raise ZwParamError(f"{name} 需為 1-50 個分段點")
+    if any(a >= b for a, b in zip(edges, edges[1:])):
+        raise ZwParamError(f"{name} 需遞增")
+    return edges
+
+@zw_endpoint('histogram')
+def zw_histogram(ctx):
+    """
+    通用分段統計
+    ?column=vibration&edges=2.3,2.5[&right=1]
+    [&by=line_id] 或 [&by=temperature&by_edges=66,68]
+    """
+    column = request.args.get('column')
+    if column not in ZW_NUMERIC_COLUMNS:
+        raise ZwParamError(f"column 需為: {', '.join(ZW_NUMERIC_COLUMNS)}")
+    edges = _parse_edges('edges')
+    right = request.args.get('right', '').lower() in ('1', 'true', 'yes')
+    
+    by = request.args.get('by') or None
+    by_edges = None
+    if by in ZW_NUMERIC_COLUMNS:
+        by_edges = _parse_edges('by_edges')
+    elif by is not None and by not in ZW_CATEGORY_COLUMNS:
+        raise ZwParamError(f"by 需為: {', '.join(ZW_NUMERIC_COLUMNS + ZW_CATEGORY_COLUMNS)}")
+    
+    labels = zw_bin_labels(edges, right)
+    by_labels = zw_bin_labels(by_edges, right) if by_edges else None
+    
+    cells = []
+    for c in zw_bin_cells(ctx, column, edges, right, by, by_edges, right):
+        cell = {
+            "bin": c['bin'],
+            "label": labels[c['bin']],
+            "batch_count": c['batch_count'],
+            "defect_pct": c['defect_pct'],
+            "total_defect": c['total_defect'],
+            "min_defect": c['min_defect'],
+            "max_defect": c['max_defect']
+        }
+        if by is not None:
+            cell["by_value"] = c['by_value']
+            cell["by_label"] = by_labels[c['by_value']] if by_labels else c['by_value']
+        cells.append(cell)
+    
+    return {
+        "column": column,
+        "edges": edges,
+        "labels": labels,
+        "by": by,
+        "by_edges": by_edges,
+        "by_labels": by_labels,
+        "cells": cells,
+        "batch_count": sum(c['batch_count'] for c in cells)
+    }
+
+@zw_endpoint('stats')
+def zw_stats(ctx):
+    """正崴數據總覽"""
+    cursor = ctx.cursor
+    src = ctx.src
+    where, params = ctx.where()
     
-    cursor.execute("SELECT SUM(output_qty), SUM(defect_qty) FROM production_log")
+    cursor.execute(f"""
+        SELECT SUM(batch_count), COUNT(DISTINCT line_id),
+               SUM(output_sum), SUM(defect_sum), COUNT(DISTINCT date)
+        FROM {src}
+        {where}
+    """, params)
     row = cursor.fetchone()
-    total_output = row[0] or 0
-    total_defect = row[1] or 0
+    batch_count = row[0] or 0
+    line_count = row[1]
+    total_output = row[2] or 0
+    total_defect = row[3] or 0
     yield_rate = (total_output - total_defect) / total_output * 100 if total_output > 0 else 0
+    day_count = row[4]
     
-    cursor.execute("SELECT COUNT(DISTINCT DATE(timestamp)) FROM production_log")
-    day_count = cursor.fetchone()[0]
-    
-    conn.close()
-    
-    return jsonify({
+    return {
         "batch_count": f"{batch_count:,}",
         "line_count": line_count,
         "total_output": f"{total_output:,}",
         "yield_rate": round(yield_rate, 2),
         "day_count": day_count
-    })
+    }
 
-@app.route('/api/zw_yield_trend')
-def api_zw_yield_trend():
+@zw_endpoint('yield_trend')
+def zw_yield_trend(ctx):
     """正崴良率趨勢（日維度）"""
-    conn = get_zw_db()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT DATE(timestamp) as date,
-               SUM(output_qty) as output,
-               SUM(defect_qty) as defect,
-               ROUND(100.0 * (SUM(output_qty) - SUM(defect_qty)) / SUM(output_qty), 2) as yield_rate
-        FROM production_log
-        GROUP BY DATE(timestamp)
-        ORDER BY date
-    """)
+    rows = ctx.shared('daily')
     
-    rows = cursor.fetchall()
-    conn.close()
-    
-    return jsonify({
+    return {
         "labels": [row['date'] for row in rows],
         "yield_data": [row['yield_rate'] for row in rows],
         "output_data": [row['output'] for row in rows]
-    })
+    }
 
-@app.route('/api/zw_line_performance')
-def api_zw_line_performance():
+@zw_endpoint('line_performance')
+def zw_line_performance(ctx):
     """正崴產線績效"""
-    conn = get_zw_db()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT line_id,
-               COUNT(*) as batch_count,
-               SUM(output_qty) as total_output,
-               ROUND(100.0 * (SUM(output_qty) - SUM(defect_qty)) / SUM(output_qty), 2) as yield_rate,
-               ROUND(AVG(cycle_time), 3) as avg_cycle_time
-        FROM production_log
-        GROUP BY line_id
-        ORDER BY line_id
-    """)
-    
-    rows = cursor.fetchall()
-    conn.close()
+    rows = ctx.shared('line')
     
-    return jsonify({
+    return {
         "labels": [row['line_id'] for row in rows],
         "yield_data": [row['yield_rate'] for row in rows],
         "output_data": [row['total_output'] for row in rows],
         "cycle_data": [row['avg_cycle_time'] for row in rows]
-    })
+    }
 
-@app.route('/api/zw_operator_ranking')
-def api_zw_operator_ranking():
+@zw_endpoint('operator_ranking')
+def zw_operator_ranking(ctx):
     """正崴操作員績效排名"""
-    conn = get_zw_db()
-    cursor = conn.cursor()
+    cursor = ctx.cursor
+    where, params = ctx.where('production_log', alias='p')
     
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT p.operator_id,
                COUNT(*) as batch_count,
                ROUND(100.0 * (SUM(p.output_qty) - SUM(p.defect_qty)) / SUM(p.output_qty), 2) as yield_rate,
                ROUND(AVG(p.cycle_time), 3) as avg_cycle_time
         FROM production_log p
+        {where}
         GROUP BY p.operator_id
         ORDER BY yield_rate DESC
         LIMIT 10
-    """)
+    """, params)
     
     rows = cursor.fetchall()
-    conn.close()
     
-    return jsonify({
+    return {
         "top": [
             {
                 "operator_id": row['operator_id'],
@@ -569,51 +1067,53 @@ def api_zw_operator_ranking():
             }
             for row in rows
         ]
-    })
+    }
 
-@app.route('/api/zw_supplier_quality')
-def api_zw_supplier_quality():
+@zw_endpoint('supplier_quality')
+def zw_supplier_quality(ctx):
     """正崴供應商品質"""
-    conn = get_zw_db()
-    cursor = conn.cursor()
+    cursor = ctx.cursor
+    src = ctx.src
+    where, params = ctx.where(alias='p')
     
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT p.supplier_id,
                s.supplier_name,
-               COUNT(*) as batch_count,
-               ROUND(100.0 * (SUM(p.output_qty) - SUM(p.defect_qty)) / SUM(p.output_qty), 2) as yield_rate
-        FROM production_log p
+               SUM(p.batch_count) as batch_count,
+               ROUND(100.0 * (SUM(p.output_sum) - SUM(p.defect_sum)) / SUM(p.output_sum), 2) as yield_rate
+        FROM {src} p
         LEFT JOIN supplier_master s ON p.supplier_id = s.supplier_id
+        {where}
         GROUP BY p.supplier_id
         ORDER BY yield_rate DESC
-    """)
+    """, params)
     
     rows = cursor.fetchall()
-    conn.close()
     
-    return jsonify({
+    return {
         "labels": [row['supplier_id'] for row in rows],
         "names": [row['supplier_name'] for row in rows],
         "yield_data": [row['yield_rate'] for row in rows],
         "batch_data": [row['batch_count'] for row in rows]
-    })
+    }
 
-@app.route('/api/zw_defect_heatmap')
-def api_zw_defect_heatmap():
+@zw_endpoint('defect_heatmap')
+def zw_defect_heatmap(ctx):
     """正崴不良率熱力圖（產線×班次）"""
-    conn = get_zw_db()
-    cursor = conn.cursor()
+    cursor = ctx.cursor
+    src = ctx.src
+    where, params = ctx.where()
     
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT line_id, shift,
-               ROUND(AVG(defect_rate) * 100, 2) as avg_defect_rate
-        FROM production_log
+               ROUND(TOTAL(defect_rate_sum) / SUM(batch_count) * 100, 2) as avg_defect_rate
+        FROM {src}
+        {where}
         GROUP BY line_id, shift
         ORDER BY line_id, shift
-    """)
+    """, params)
     
     rows = cursor.fetchall()
-    conn.close()
     
     # 整理為熱力圖格式
     lines = sorted(set(row['line_id'] for row in rows))
@@ -627,165 +1127,104 @@ def api_zw_defect_heatmap():
             "defect_rate": row['avg_defect_rate']
         })
     
-    return jsonify({
+    return {
         "lines": lines,
         "shifts": shifts,
         "data": data
-    })
+    }
 
 # ============================================================
 # 進階分析 API（XTF 拓展層）@織明 @理樞
 # ============================================================
 
-@app.route('/api/zw_maintenance_alert')
-def api_zw_maintenance_alert():
+@zw_endpoint('maintenance_alert')
+def zw_maintenance_alert(ctx):
     """300h 維護警示 - 運行時數臨界點分析"""
-    conn = get_zw_db()
-    cursor = conn.cursor()
-    
-    # 取得數據最大日期
-    cursor.execute("SELECT MAX(timestamp) FROM production_log")
-    max_date = cursor.fetchone()[0][:10]
     
     # 運行時數分段統計
-    cursor.execute("""
-        SELECT 
-            CASE 
-                WHEN runtime_hours < 100 THEN '0-100h'
-                WHEN runtime_hours < 200 THEN '100-200h'
-                WHEN runtime_hours < 300 THEN '200-300h'
-                WHEN runtime_hours < 400 THEN '300-400h'
-                ELSE '>400h'
-            END as runtime_range,
-            COUNT(*) as batch_count,
-            ROUND(AVG(defect_rate) * 100, 2) as avg_defect_pct,
-            ROUND(MIN(defect_rate) * 100, 2) as min_defect,
-            ROUND(MAX(defect_rate) * 100, 2) as max_defect
-        FROM production_log
-        GROUP BY runtime_range
-        ORDER BY 
-            CASE runtime_range
-                WHEN '0-100h' THEN 1
-                WHEN '100-200h' THEN 2
-                WHEN '200-300h' THEN 3
-                WHEN '300-400h' THEN 4
-                ELSE 5
-            END
-    """)
-    
+    labels = ['0-100h', '100-200h', '200-300h', '300-400h', '>400h']
     runtime_data = []
-    for row in cursor.fetchall():
+    for c in zw_bin_cells(ctx, 'runtime_hours', [100, 200, 300, 400]):
         runtime_data.append({
-            "range": row['runtime_range'],
-            "batch_count": row['batch_count'],
-            "defect_rate": row['avg_defect_pct'],
-            "min": row['min_defect'],
-            "max": row['max_defect']
+            "range": labels[c['bin']],
+            "batch_count": c['batch_count'],
+            "defect_rate": c['defect_pct'],
+            "min": c['min_defect'],
+            "max": c['max_defect']
         })
     
     # 當前需要維護的機台（>280h，最近7天）
-    cursor.execute(f"""
-        SELECT machine_id,
-               MAX(runtime_hours) as current_hours,
-               ROUND(AVG(defect_rate) * 100, 2) as recent_defect
-        FROM production_log
-        WHERE DATE(timestamp) >= DATE('{max_date}', '-7 days')
-        GROUP BY machine_id
-        HAVING MAX(runtime_hours) > 280
-        ORDER BY current_hours DESC
-    """)
+    recent = [m for m in ctx.shared('machine_recent') if m['current_hours'] > 280]
     
     alerts = []
-    for row in cursor.fetchall():
+    for row in sorted(recent, key=lambda x: -x['current_hours']):
         alerts.append({
             "machine_id": row['machine_id'],
             "runtime_hours": round(row['current_hours'], 1),
-            "recent_defect": row['recent_defect'],
+            "recent_defect": row['defect_pct'],
             "urgency": "HIGH" if row['current_hours'] > 350 else "MEDIUM"
         })
     
-    conn.close()
-    
-    return jsonify({
+    return {
         "runtime_analysis": runtime_data,
         "maintenance_alerts": alerts,
         "threshold": 300,
         "insight": "300h 後不良率急升至 17.9%，建議在此前進行預防性維護"
-    })
+    }
 
-@app.route('/api/zw_temp_analysis')
-def api_zw_temp_analysis():
+@zw_endpoint('temp_analysis')
+def zw_temp_analysis(ctx):
     """溫度-不良率相關性分析"""
-    conn = get_zw_db()
-    cursor = conn.cursor()
+    temp_cells, line_rows = ctx.parallel(
+        lambda c: zw_bin_cells(c, 'temperature', [62, 64, 66, 68]),
+        lambda c: c.shared('line'),
+    )
     
     # 溫度分段
-    cursor.execute("""
-        SELECT 
-            CASE 
-                WHEN temperature < 62 THEN '<62°C'
-                WHEN temperature < 64 THEN '62-64°C'
-                WHEN temperature < 66 THEN '64-66°C'
-                WHEN temperature < 68 THEN '66-68°C'
-                ELSE '>68°C'
-            END as temp_range,
-            COUNT(*) as batch_count,
-            ROUND(AVG(defect_rate) * 100, 2) as avg_defect_pct
-        FROM production_log
-        GROUP BY temp_range
-        ORDER BY 
-            CASE temp_range
-                WHEN '<62°C' THEN 1
-                WHEN '62-64°C' THEN 2
-                WHEN '64-66°C' THEN 3
-                WHEN '66-68°C' THEN 4
-                ELSE 5
-            END
-    """)
-    
-    temp_data = [dict(row) for row in cursor.fetchall()]
+    labels = ['<62°C', '62-64°C', '64-66°C', '66-68°C', '>68°C']
+    temp_data = [
+        {"temp_range": labels[c['bin']], "batch_count": c['batch_count'], "avg_defect_pct": c['defect_pct']}
+        for c in temp_cells
+    ]
     
     # 產線溫度分佈
-    cursor.execute("""
-        SELECT line_id,
-               ROUND(AVG(temperature), 1) as avg_temp,
-               ROUND(MIN(temperature), 1) as min_temp,
-               ROUND(MAX(temperature), 1) as max_temp,
-               ROUND(AVG(defect_rate) * 100, 2) as avg_defect
-        FROM production_log
-        GROUP BY line_id
-        ORDER BY avg_temp
-    """)
-    
-    line_temp = [dict(row) for row in cursor.fetchall()]
-    
-    conn.close()
+    line_temp = [
+        {k: row[k] for k in ('line_id', 'avg_temp', 'min_temp', 'max_temp', 'avg_defect')}
+        for row in sorted(line_rows, key=lambda x: x['avg_temp'])
+    ]
     
-    return jsonify({
+    return {
         "temp_ranges": temp_data,
         "line_temperature": line_temp,
         "optimal_range": "62-66°C",
         "insight": "溫度>66°C 不良率急升至 15%+，建議強化冷卻系統"
-    })
+    }
 
-@app.route('/api/zw_cost_analysis')
-def api_zw_cost_analysis():
-    """成本損失計算"""
-    conn = get_zw_db()
-    cursor = conn.cursor()
+@zw_endpoint('cost_analysis')
+def zw_cost_analysis(ctx):
+    """
+    成本損失計算（篩選區間內）
+    total_loss / loss 為區間損失，days 為區間內有資料的天數；
+    total_loss_60d / loss_60d 為舊鍵名的別名（值相同，不一定是 60 天），保留給既有前端
+    """
+    cursor = ctx.cursor
+    src = ctx.src
     
     # 產品成本表
     cursor.execute("SELECT product_id, unit_price, unit_cost, scrap_cost FROM cost_table")
     cost_map = {row['product_id']: dict(row) for row in cursor.fetchall()}
     
+    where, params = ctx.where()
+    
     # 各產線損失
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT line_id, product_id,
-               SUM(output_qty) as total_output,
-               SUM(defect_qty) as total_defect
-        FROM production_log
+               SUM(output_sum) as total_output,
+               SUM(defect_sum) as total_defect
+        FROM {src}
+        {where}
         GROUP BY line_id, product_id
-    """)
+    """, params)
     
     line_loss = {}
     total_loss = 0
@@ -804,13 +1243,14 @@ def api_zw_cost_analysis():
             line_loss[row['line_id']] += loss
     
     # 供應商造成的損失
-    cursor.execute("""
-        SELECT p.supplier_id,
-               SUM(p.defect_qty) as total_defect,
-               p.product_id
-        FROM production_log p
-        GROUP BY p.supplier_id, p.product_id
-    """)
+    cursor.execute(f"""
+        SELECT supplier_id,
+               SUM(defect_sum) as total_defect,
+               product_id
+        FROM {src}
+        {where}
+        GROUP BY supplier_id, product_id
+    """, params)
     
     supplier_loss = {}
     for row in cursor.fetchall():
@@ -822,46 +1262,47 @@ def api_zw_cost_analysis():
                 supplier_loss[sid] = 0
             supplier_loss[sid] += loss
     
-    conn.close()
+    # 年化（區間內有資料的天數 → 365天）
+    day_count = len(ctx.shared('daily'))
+    annual_factor = 365 / day_count if day_count else 0
     
-    # 年化（60天數據 → 365天）
-    annual_factor = 365 / 60
+    def loss_entry(key, value, loss):
+        return {key: value, "loss": round(loss, 2), "loss_60d": round(loss, 2),
+                "loss_annual": round(loss * annual_factor, 2)}
     
-    return jsonify({
+    return {
+        "days": day_count,
+        "total_loss": round(total_loss, 2),
         "total_loss_60d": round(total_loss, 2),
         "total_loss_annual": round(total_loss * annual_factor, 2),
-        "line_loss": [
-            {"line_id": k, "loss_60d": round(v, 2), "loss_annual": round(v * annual_factor, 2)}
-            for k, v in sorted(line_loss.items(), key=lambda x: -x[1])
-        ],
-        "supplier_loss": [
-            {"supplier_id": k, "loss_60d": round(v, 2), "loss_annual": round(v * annual_factor, 2)}
-            for k, v in sorted(supplier_loss.items(), key=lambda x: -x[1])
-        ],
-        "insight": f"60天總損失 ¥{total_loss:,.0f}，年化約 ¥{total_loss * annual_factor:,.0f}"
-    })
+        "line_loss": [loss_entry("line_id", k, v) for k, v in sorted(line_loss.items(), key=lambda x: -x[1])],
+        "supplier_loss": [loss_entry("supplier_id", k, v) for k, v in sorted(supplier_loss.items(), key=lambda x: -x[1])],
+        "insight": f"{day_count}天總損失 ¥{total_loss:,.0f}，年化約 ¥{total_loss * annual_factor:,.0f}"
+    }
 
-@app.route('/api/zw_supplier_scorecard')
-def api_zw_supplier_scorecard():
+@zw_endpoint('supplier_scorecard')
+def zw_supplier_scorecard(ctx):
     """供應商評分卡"""
-    conn = get_zw_db()
-    cursor = conn.cursor()
+    cursor = ctx.cursor
+    src = ctx.src
+    where, params = ctx.where(alias='p')
     
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT 
             p.supplier_id,
             s.supplier_name,
             s.quality_z,
             s.cost_multiplier,
-            COUNT(*) as batch_count,
-            SUM(p.output_qty) as total_output,
-            SUM(p.defect_qty) as total_defect,
-            ROUND(100.0 * (SUM(p.output_qty) - SUM(p.defect_qty)) / SUM(p.output_qty), 2) as yield_rate,
-            ROUND(AVG(p.cycle_time), 3) as avg_cycle
-        FROM production_log p
+            SUM(p.batch_count) as batch_count,
+            SUM(p.output_sum) as total_output,
+            SUM(p.defect_sum) as total_defect,
+            ROUND(100.0 * (SUM(p.output_sum) - SUM(p.defect_sum)) / SUM(p.output_sum), 2) as yield_rate,
+            ROUND(TOTAL(p.cycle_time_sum) / SUM(p.batch_count), 3) as avg_cycle
+        FROM {src} p
         JOIN supplier_master s ON p.supplier_id = s.supplier_id
+        {where}
         GROUP BY p.supplier_id
-    """)
+    """, params)
     
     scorecards = []
     for row in cursor.fetchall():
@@ -892,23 +1333,34 @@ def api_zw_supplier_scorecard():
     # 按總分排序
     scorecards.sort(key=lambda x: -x['total_score'])
     
-    conn.close()
-    
-    return jsonify({
+    return {
         "scorecards": scorecards,
         "weights": {"quality": 60, "cost": 20, "delivery": 20},
-        "insight": f"最佳供應商: {scorecards[0]['supplier_id']}（{scorecards[0]['grade']}級）"
-    })
+        "insight": f"最佳供應商: {scorecards[0]['supplier_id']}（{scorecards[0]['grade']}級）" if scorecards else "無符合條件的數據"
+    }
 
-@app.route('/api/zw_predictive_score')
-def api_zw_predictive_score():
-    """預測性維護分數"""
-    conn = get_zw_db()
-    cursor = conn.cursor()
+def zw_health_machines(ctx):
+    """篩選條件對應的機台（machine_status 只有 machine_id；line_id 以 rollup 對應）；無篩選時為 None"""
+    machine_id = ctx.filter.values.get('machine_id')
+    line_id = ctx.filter.values.get('line_id')
+    machines = None
+    if line_id:
+        ctx.cursor.execute(f"SELECT DISTINCT machine_id FROM {ctx.src} WHERE line_id = ?", [line_id])
+        machines = [row[0] for row in ctx.cursor.fetchall()]
+    if machine_id:
+        machines = [machine_id] if machines is None or machine_id in machines else []
+    return machines
+
+def zw_health_window(ctx):
+    """指定日期區間時：區間內最後 7 天的平均（逐次查詢 machine_status）"""
+    cursor = ctx.cursor
+    day = time_columns(ctx.conn, 'machine_status')['day']
+    where, params = ctx.where('machine_status', alias='m')
     
     # 取得數據最大日期（因為是歷史模擬數據）
-    cursor.execute("SELECT MAX(timestamp) FROM machine_status")
-    max_date = cursor.fetchone()[0][:10]  # 取日期部分
+    cursor.execute(f"SELECT MAX({day}) FROM machine_status m {where}", params)
+    max_date = cursor.fetchone()[0]
+    where, params = ctx.where('machine_status', alias='m', prefix='AND')
     
     # 每台機台的健康指標（最近7天）
     cursor.execute(f"""
@@ -916,152 +1368,186 @@ def api_zw_predictive_score():
             m.machine_id,
             MAX(m.runtime_hours) as runtime_hours,
             AVG(m.temperature) as avg_temp,
-            AVG(m.vibration) as avg_vibration,
-            MAX(m.maintenance_flag) as needs_maintenance
+            AVG(m.vibration) as avg_vibration
         FROM machine_status m
-        WHERE DATE(m.timestamp) >= DATE('{max_date}', '-7 days')
+        WHERE {day} >= DATE(?, '-7 days') {where}
         GROUP BY m.machine_id
-    """)
+    """, [max_date] + params)
     
-    machine_health = []
+    machines = []
     for row in cursor.fetchall():
-        # 計算健康分數（100分制，越低越需要維護）
-        runtime_score = max(0, 100 - (row['runtime_hours'] / 5))  # 500h = 0分
-        temp_score = max(0, 100 - (row['avg_temp'] - 60) * 5)  # 80°C = 0分
-        vibration_score = max(0, 100 - (row['avg_vibration'] - 1) * 50)  # 3.0 = 0分
-        
-        health_score = runtime_score * 0.5 + temp_score * 0.3 + vibration_score * 0.2
-        
-        risk_level = 'CRITICAL' if health_score < 30 else 'HIGH' if health_score < 50 else 'MEDIUM' if health_score < 70 else 'LOW'
-        
-        machine_health.append({
-            "machine_id": row['machine_id'],
-            "runtime_hours": round(row['runtime_hours'], 1),
-            "avg_temp": round(row['avg_temp'], 1),
-            "avg_vibration": round(row['avg_vibration'], 2),
-            "health_score": round(health_score, 1),
+        score, risk_level = health_score(row['runtime_hours'], row['avg_temp'], row['avg_vibration'])
+        machines.append({**dict(row), "health_score": score, "risk_level": risk_level})
+    return machines
+
+@zw_endpoint('predictive_score')
+def zw_predictive_score(ctx):
+    """
+    預測性維護分數（machine_status：只套用日期 / line_id / machine_id，其餘篩選列於 filters.ignored）
+    無日期篩選時由機台健康狀態（溫度 / 振動 EWMA、目前運行時數）直接回答，只套用新增的 machine_status
+    """
+    if ctx.filter.start or ctx.filter.end:
+        machines = zw_health_window(ctx)
+    else:
+        zw_health_store.refresh(ctx.conn)
+        machines = zw_health_store.scores(zw_health_machines(ctx))
+    
+    machine_health = []
+    for m in machines:
+        risk_level = m['risk_level']
+        entry = {
+            "machine_id": m['machine_id'],
+            "runtime_hours": round(m['runtime_hours'], 1),
+            "avg_temp": round(m['avg_temp'], 1),
+            "avg_vibration": round(m['avg_vibration'], 2),
+            "health_score": round(m['health_score'], 1),
             "risk_level": risk_level,
             "recommendation": "立即維護" if risk_level == 'CRITICAL' else "排程維護" if risk_level == 'HIGH' else "監控中"
-        })
+        }
+        if 'last_maintenance' in m:
+            entry['last_maintenance'] = m['last_maintenance']
+        machine_health.append(entry)
     
     # 按健康分數排序（最差的在前）
     machine_health.sort(key=lambda x: x['health_score'])
     
-    conn.close()
-    
-    return jsonify({
+    return {
         "machine_health": machine_health[:20],  # Top 20 需要關注的
         "critical_count": len([m for m in machine_health if m['risk_level'] == 'CRITICAL']),
         "high_count": len([m for m in machine_health if m['risk_level'] == 'HIGH']),
-        "weights": {"runtime": 50, "temperature": 30, "vibration": 20},
+        "weights": HEALTH_WEIGHTS,
+        "filters": ctx.filter.report(MACHINE_FILTER_COLUMNS),
         "insight": f"{len([m for m in machine_health if m['risk_level'] in ['CRITICAL', 'HIGH']])} 台機台需要優先關注"
-    })
+    }
 
-@app.route('/api/zw_operator_machine_matrix')
-def api_zw_operator_machine_matrix():
-    """操作員-機台最佳配對矩陣"""
-    conn = get_zw_db()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT 
-            operator_id,
-            machine_id,
-            COUNT(*) as batch_count,
-            ROUND(100.0 * (SUM(output_qty) - SUM(defect_qty)) / SUM(output_qty), 2) as yield_rate
-        FROM production_log
-        GROUP BY operator_id, machine_id
-        HAVING COUNT(*) >= 10
-        ORDER BY yield_rate DESC
-    """)
-    
-    matrix_data = [dict(row) for row in cursor.fetchall()]
+@app.route('/api/zw_machine_health')
+def api_zw_machine_health():
+    """
+    單一機台的健康狀態與每小時分數歷史
+    ?machine_id=（必填）&format=columnar|msgpack
+    """
+    try:
+        fmt = requested_format()
+    except FormatError as e:
+        return jsonify({"error": str(e)}), 400
+    machine_id = request.args.get('machine_id')
+    if not machine_id:
+        return jsonify({"error": "需指定 machine_id"}), 400
     
-    # 找出最佳配對
-    best_pairs = matrix_data[:10]
+    conn = get_zw_db()
+    try:
+        zw_health_store.refresh(conn)
+    finally:
+        conn.close()
+    
+    states = zw_health_store.scores([machine_id])
+    if not states:
+        return jsonify({"error": f"無機台 {machine_id} 的狀態資料"}), 404
+    state = states[0]
+    return render({
+        **state,
+        "avg_temp": round(state['avg_temp'], 2),
+        "avg_vibration": round(state['avg_vibration'], 3),
+        "health_score": round(state['health_score'], 1),
+        "history": zw_health_store.history(machine_id),
+        "halflife_hours": zw_health_store.halflife,
+    }, fmt)
+
+def zw_pair_matrix(ctx):
+    """操作員 × 機台稀疏矩陣（依篩選條件快取，production_log 有新資料時重建）"""
+    where, params = ctx.where('production_log')
+    version = ctx.cursor.execute("SELECT MAX(rowid) FROM production_log").fetchone()[0] or 0
+    
+    def build():
+        ctx.cursor.execute(f"""
+            SELECT 
+                operator_id,
+                machine_id,
+                COUNT(*) as batch_count,
+                SUM(output_qty) as output_sum,
+                SUM(defect_qty) as defect_sum,
+                ROUND(100.0 * (SUM(output_qty) - SUM(defect_qty)) / SUM(output_qty), 2) as yield_rate
+            FROM production_log
+            {where}
+            GROUP BY operator_id, machine_id
+            ORDER BY operator_id, machine_id
+        """, params)
+        return PairMatrix(ctx.cursor.fetchall())
     
-    # 找出最差配對（需要調整）
-    worst_pairs = sorted(matrix_data, key=lambda x: x['yield_rate'])[:10]
+    return zw_matrix_cache.get((where, tuple(params)), version, build)
+
+@zw_endpoint('operator_machine_matrix')
+def zw_operator_machine_matrix(ctx):
+    """
+    操作員-機台最佳配對矩陣
+    ?k= 最佳 / 最差組數（預設 10）&min_batches= 最少批次數（預設 ZW_MATRIX_MIN_BATCHES）
+    &operator= / &machine= 另回傳該操作員 / 機台的整列，&grid=1 另回傳完整稀疏矩陣
+    """
+    k = min(max(request.args.get('k', 10, type=int), 1), 100)
+    min_batches = max(request.args.get('min_batches', MATRIX_MIN_BATCHES, type=int), 1)
+    matrix = zw_pair_matrix(ctx)
     
-    conn.close()
+    best_pairs = matrix.best(k, min_batches)
+    worst_pairs = matrix.worst(k, min_batches)
     
-    return jsonify({
+    result = {
         "best_pairs": best_pairs,
         "worst_pairs": worst_pairs,
-        "insight": f"最佳配對 {best_pairs[0]['operator_id']}-{best_pairs[0]['machine_id']} 良率 {best_pairs[0]['yield_rate']}%"
-    })
+        "insight": f"最佳配對 {best_pairs[0]['operator_id']}-{best_pairs[0]['machine_id']} 良率 {best_pairs[0]['yield_rate']}%" if best_pairs else "無符合條件的數據"
+    }
+    operator = request.args.get('operator')
+    if operator:
+        result['operator_row'] = matrix.operator_row(operator, min_batches)
+    machine = request.args.get('machine')
+    if machine:
+        result['machine_row'] = matrix.machine_row(machine, min_batches)
+    if request.args.get('grid', '').lower() in ('1', 'true', 'yes'):
+        result['grid'] = matrix.grid(min_batches)
+        result['matrix'] = matrix.stats()
+    return result
 
 # ============================================================
 # 進階分析 API v2（XTF8 五維度）@織明 @理樞 @光蘊
 # ============================================================
 
-@app.route('/api/zw_vibration_analysis')
-def api_zw_vibration_analysis():
+@zw_endpoint('vibration_analysis')
+def zw_vibration_analysis(ctx):
     """振動警示分析 - 隱藏殺手"""
-    conn = get_zw_db()
-    cursor = conn.cursor()
+    vib_cells, machine_rows, daily_rows = ctx.parallel(
+        lambda c: zw_bin_cells(c, 'vibration', [1.5, 2.0, 2.5, 3.0]),
+        lambda c: c.shared('machine_recent'),
+        lambda c: c.shared('daily'),
+    )
     
     # 振動分段統計
-    cursor.execute("""
-        SELECT 
-            CASE 
-                WHEN vibration < 1.5 THEN '<1.5'
-                WHEN vibration < 2.0 THEN '1.5-2.0'
-                WHEN vibration < 2.5 THEN '2.0-2.5'
-                WHEN vibration < 3.0 THEN '2.5-3.0'
-                ELSE '>3.0'
-            END as vib_range,
-            COUNT(*) as batch_count,
-            ROUND(AVG(defect_rate) * 100, 2) as avg_defect_pct,
-            ROUND(SUM(defect_qty), 0) as total_defect
-        FROM production_log
-        GROUP BY vib_range
-        ORDER BY 
-            CASE vib_range
-                WHEN '<1.5' THEN 1
-                WHEN '1.5-2.0' THEN 2
-                WHEN '2.0-2.5' THEN 3
-                WHEN '2.5-3.0' THEN 4
-                ELSE 5
-            END
-    """)
-    vib_data = [dict(row) for row in cursor.fetchall()]
-    
-    # 各機台振動狀態
-    cursor.execute("SELECT MAX(timestamp) FROM production_log")
-    max_date = cursor.fetchone()[0][:10]
+    labels = ['<1.5', '1.5-2.0', '2.0-2.5', '2.5-3.0', '>3.0']
+    vib_data = [
+        {
+            "vib_range": labels[c['bin']],
+            "batch_count": c['batch_count'],
+            "avg_defect_pct": c['defect_pct'],
+            "total_defect": float(c['total_defect'] or 0)
+        }
+        for c in vib_cells
+    ]
     
-    cursor.execute(f"""
-        SELECT machine_id,
-               ROUND(AVG(vibration), 2) as avg_vib,
-               ROUND(MAX(vibration), 2) as max_vib,
-               ROUND(AVG(defect_rate) * 100, 2) as defect_pct
-        FROM production_log
-        WHERE DATE(timestamp) >= DATE('{max_date}', '-7 days')
-        GROUP BY machine_id
-        ORDER BY avg_vib DESC
-        LIMIT 15
-    """)
-    machine_vib = [dict(row) for row in cursor.fetchall()]
+    # 各機台振動狀態（最近7天）
+    machine_vib = [
+        {k: row[k] for k in ('machine_id', 'avg_vib', 'max_vib', 'defect_pct')}
+        for row in sorted(machine_rows, key=lambda x: -x['avg_vib'])[:15]
+    ]
     
     # 振動趨勢（日維度）
-    cursor.execute("""
-        SELECT DATE(timestamp) as date,
-               ROUND(AVG(vibration), 2) as avg_vib,
-               ROUND(AVG(defect_rate) * 100, 2) as defect_pct
-        FROM production_log
-        GROUP BY date
-        ORDER BY date
-    """)
-    vib_trend = [dict(row) for row in cursor.fetchall()]
-    
-    conn.close()
+    vib_trend = [
+        {k: row[k] for k in ('date', 'avg_vib', 'defect_pct')}
+        for row in daily_rows
+    ]
     
     # 計算警示數量
     critical_machines = len([m for m in machine_vib if m['avg_vib'] > 3.0])
     warning_machines = len([m for m in machine_vib if 2.5 <= m['avg_vib'] <= 3.0])
     
-    return jsonify({
+    return {
         "vib_ranges": vib_data,
         "machine_vibration": machine_vib,
         "vib_trend": vib_trend,
@@ -1069,113 +1555,101 @@ def api_zw_vibration_analysis():
         "warning_count": warning_machines,
         "threshold": 2.5,
         "insight": f"振動 >2.5 不良率達 16%+，是正常的 10 倍。{critical_machines} 台機台需立即檢查。"
-    })
+    }
 
-@app.route('/api/zw_multifactor')
-def api_zw_multifactor():
+@zw_endpoint('multifactor')
+def zw_multifactor(ctx):
     """多因子交互分析 - 災難配方檢測"""
-    conn = get_zw_db()
-    cursor = conn.cursor()
     
-    # 三因子交互
-    cursor.execute("""
-        SELECT 
-            CASE WHEN temperature > 68 THEN '高溫' ELSE '正常溫' END as temp_g,
-            CASE WHEN runtime_hours > 300 THEN '高時數' ELSE '正常時數' END as rt_g,
-            CASE WHEN vibration > 2.5 THEN '高振動' ELSE '正常振動' END as vib_g,
-            COUNT(*) as batch_count,
-            ROUND(AVG(defect_rate) * 100, 2) as defect_pct,
-            SUM(defect_qty) as total_defect
-        FROM production_log
-        GROUP BY temp_g, rt_g, vib_g
-        ORDER BY defect_pct DESC
-    """)
-    factor_matrix = [dict(row) for row in cursor.fetchall()]
+    factor_matrix, heatmap_cells = ctx.parallel(
+        # 三因子交互
+        lambda c: zw_factor_cells(c, [
+            ('temperature', 68, '高溫', '正常溫', 'temp_g'),
+            ('runtime_hours', 300, '高時數', '正常時數', 'rt_g'),
+            ('vibration', 2.5, '高振動', '正常振動', 'vib_g'),
+        ]),
+        lambda c: zw_bin_cells(c, 'temperature', [66, 68, 70], by='runtime_hours', by_edges=[200, 300, 400]),
+    )
     
     # 雙因子熱力圖數據
-    cursor.execute("""
-        SELECT 
-            CASE 
-                WHEN temperature < 66 THEN '<66°C'
-                WHEN temperature < 68 THEN '66-68°C'
-                WHEN temperature < 70 THEN '68-70°C'
-                ELSE '>70°C'
-            END as temp_range,
-            CASE 
-                WHEN runtime_hours < 200 THEN '<200h'
-                WHEN runtime_hours < 300 THEN '200-300h'
-                WHEN runtime_hours < 400 THEN '300-400h'
-                ELSE '>400h'
-            END as runtime_range,
-            COUNT(*) as cnt,
-            ROUND(AVG(defect_rate) * 100, 2) as defect_pct
-        FROM production_log
-        GROUP BY temp_range, runtime_range
-    """)
-    heatmap_data = [dict(row) for row in cursor.fetchall()]
+    temp_labels = ['<66°C', '66-68°C', '68-70°C', '>70°C']
+    runtime_labels = ['<200h', '200-300h', '300-400h', '>400h']
+    heatmap_data = sorted(
+        (
+            {
+                "temp_range": temp_labels[c['bin']],
+                "runtime_range": runtime_labels[c['by_value']],
+                "cnt": c['batch_count'],
+                "defect_pct": c['defect_pct']
+            }
+            for c in heatmap_cells
+        ),
+        key=lambda x: (x['temp_range'], x['runtime_range'])
+    )
     
     # 找出最危險組合
     worst = factor_matrix[0] if factor_matrix else {}
     best = factor_matrix[-1] if factor_matrix else {}
     
-    conn.close()
-    
-    return jsonify({
+    return {
         "factor_matrix": factor_matrix,
         "heatmap_data": heatmap_data,
         "worst_combination": worst,
         "best_combination": best,
         "insight": f"最差組合「{worst.get('temp_g','')}+{worst.get('rt_g','')}+{worst.get('vib_g','')}」不良率 {worst.get('defect_pct',0)}%，是最佳組合的 {round(worst.get('defect_pct',1)/max(best.get('defect_pct',1),0.1), 1)} 倍"
-    })
+    }
 
-@app.route('/api/zw_time_pattern')
-def api_zw_time_pattern():
+@zw_endpoint('time_pattern')
+def zw_time_pattern(ctx):
     """時段與週間模式分析"""
-    conn = get_zw_db()
-    cursor = conn.cursor()
-    
-    # 小時分析
-    cursor.execute("""
-        SELECT strftime('%H', timestamp) as hour,
-               COUNT(*) as batch_count,
-               ROUND(AVG(defect_rate) * 100, 2) as defect_pct,
-               ROUND(AVG(cycle_time), 3) as avg_cycle
-        FROM production_log
-        GROUP BY hour
-        ORDER BY hour
-    """)
-    hourly_data = [dict(row) for row in cursor.fetchall()]
-    
-    # 週間分析
-    cursor.execute("""
-        SELECT 
-            CAST(strftime('%w', timestamp) AS INTEGER) as weekday_num,
-            CASE strftime('%w', timestamp)
-                WHEN '0' THEN '週日'
-                WHEN '1' THEN '週一'
-                WHEN '2' THEN '週二'
-                WHEN '3' THEN '週三'
-                WHEN '4' THEN '週四'
-                WHEN '5' THEN '週五'
-                WHEN '6' THEN '週六'
-            END as weekday,
-            COUNT(*) as batch_count,
-            ROUND(AVG(defect_rate) * 100, 2) as defect_pct
-        FROM production_log
-        GROUP BY weekday_num
-        ORDER BY weekday_num
-    """)
-    weekly_data = [dict(row) for row in cursor.fetchall()]
-    
-    # 班次×時段熱力圖
-    cursor.execute("""
-        SELECT shift,
-               strftime('%H', timestamp) as hour,
-               ROUND(AVG(defect_rate) * 100, 2) as defect_pct
-        FROM production_log
-        GROUP BY shift, hour
-    """)
-    shift_hour_data = [dict(row) for row in cursor.fetchall()]
+    src = ctx.src
+    where, params = ctx.where()
+    
+    def query(sql):
+        return lambda c: [dict(row) for row in c.conn.execute(sql, params).fetchall()]
+    
+    hourly_data, weekly_data, shift_hour_data = ctx.parallel(
+        # 小時分析
+        query(f"""
+            SELECT hour,
+                   SUM(batch_count) as batch_count,
+                   ROUND(TOTAL(defect_rate_sum) / SUM(batch_count) * 100, 2) as defect_pct,
+                   ROUND(TOTAL(cycle_time_sum) / SUM(batch_count), 3) as avg_cycle
+            FROM {src}
+            {where}
+            GROUP BY hour
+            ORDER BY hour
+        """),
+        # 週間分析
+        query(f"""
+            SELECT 
+                CAST(strftime('%w', date) AS INTEGER) as weekday_num,
+                CASE strftime('%w', date)
+                    WHEN '0' THEN '週日'
+                    WHEN '1' THEN '週一'
+                    WHEN '2' THEN '週二'
+                    WHEN '3' THEN '週三'
+                    WHEN '4' THEN '週四'
+                    WHEN '5' THEN '週五'
+                    WHEN '6' THEN '週六'
+                END as weekday,
+                SUM(batch_count) as batch_count,
+                ROUND(TOTAL(defect_rate_sum) / SUM(batch_count) * 100, 2) as defect_pct
+            FROM {src}
+            {where}
+            GROUP BY weekday_num
+            ORDER BY weekday_num
+        """),
+        # 班次×時段熱力圖
+        query(f"""
+            SELECT shift,
+                   hour,
+                   ROUND(TOTAL(defect_rate_sum) / SUM(batch_count) * 100, 2) as defect_pct
+            FROM {src}
+            {where}
+            GROUP BY shift, hour
+        """),
+    )
     
     # 找出最差/最佳時段
     worst_hour = max(hourly_data, key=lambda x: x['defect_pct']) if hourly_data else {}
@@ -1183,9 +1657,7 @@ def api_zw_time_pattern():
     worst_day = max(weekly_data, key=lambda x: x['defect_pct']) if weekly_data else {}
     best_day = min(weekly_data, key=lambda x: x['defect_pct']) if weekly_data else {}
     
-    conn.close()
-    
-    return jsonify({
+    return {
         "hourly": hourly_data,
         "weekly": weekly_data,
         "shift_hour": shift_hour_data,
@@ -1194,110 +1666,132 @@ def api_zw_time_pattern():
         "worst_day": worst_day,
         "best_day": best_day,
         "insight": f"最差時段 {worst_hour.get('hour','')}:00（{worst_hour.get('defect_pct',0)}%），最差日 {worst_day.get('weekday','')}（{worst_day.get('defect_pct',0)}%）"
-    })
+    }
 
-@app.route('/api/zw_maintenance_effect')
-def api_zw_maintenance_effect():
-    """維護效果驗證"""
-    conn = get_zw_db()
-    cursor = conn.cursor()
+@zw_endpoint('maintenance_effect')
+def zw_maintenance_effect(ctx):
+    """維護效果驗證（維護事件只套用日期 / line_id / machine_id，其餘篩選列於 filters.ignored）"""
+    cursor = ctx.cursor
+    maint_where, maint_params = ctx.where('maintenance_log')
     
     # 維護類型統計
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT maintenance_type,
                COUNT(*) as cnt
         FROM maintenance_log
+        {maint_where}
         GROUP BY maintenance_type
-    """)
+    """, maint_params)
     maint_types = [dict(row) for row in cursor.fetchall()]
     
-    # 維護前後比較（取每次維護前後 3 天數據）
-    cursor.execute("""
-        SELECT m.machine_id,
-               m.timestamp as maint_time,
-               m.maintenance_type
-        FROM maintenance_log m
-        ORDER BY m.timestamp
-        LIMIT 20
-    """)
-    maint_events = cursor.fetchall()
+    # 維護前後比較（每次維護前後 N 天，單次集合運算涵蓋全部事件）
+    window = min(max(request.args.get('window', 3, type=int), 1), 30)
+    src = ctx.src
+    # 日期區間套用於維護事件；產量數據前後放寬 window 天
+    daily_where, daily_params = ctx.where(pad_days=window)
+    cursor.execute(f"""
+        WITH daily AS (
+            SELECT machine_id, date,
+                   SUM(batch_count) as n,
+                   TOTAL(defect_rate_sum) as defect_rate_sum,
+                   TOTAL(vibration_sum) as vibration_sum
+            FROM {src}
+            {daily_where}
+            GROUP BY machine_id, date
+        ),
+        events AS (
+            SELECT rowid as event_id, machine_id, timestamp, maintenance_type,
+                   DATE(timestamp) as maint_date
+            FROM maintenance_log
+            {maint_where}
+        )
+        SELECT e.machine_id,
+               e.maint_date,
+               e.maintenance_type,
+               ROUND(TOTAL(CASE WHEN d.date < e.maint_date THEN d.defect_rate_sum END)
+                     / SUM(CASE WHEN d.date < e.maint_date THEN d.n END) * 100, 2) as before_defect,
+               ROUND(TOTAL(CASE WHEN d.date > e.maint_date THEN d.defect_rate_sum END)
+                     / SUM(CASE WHEN d.date > e.maint_date THEN d.n END) * 100, 2) as after_defect,
+               ROUND(TOTAL(CASE WHEN d.date < e.maint_date THEN d.vibration_sum END)
+                     / SUM(CASE WHEN d.date < e.maint_date THEN d.n END), 2) as before_vib,
+               ROUND(TOTAL(CASE WHEN d.date > e.maint_date THEN d.vibration_sum END)
+                     / SUM(CASE WHEN d.date > e.maint_date THEN d.n END), 2) as after_vib
+        FROM events e
+        JOIN daily d
+          ON d.machine_id = e.machine_id
+         AND d.date BETWEEN DATE(e.maint_date, ?) AND DATE(e.maint_date, ?)
+         AND d.date <> e.maint_date
+        GROUP BY e.event_id
+        ORDER BY e.timestamp, e.event_id
+    """, daily_params + maint_params + [f'-{window} days', f'+{window} days'])
     
     before_after = []
-    for event in maint_events:
-        machine_id = event[0]
-        maint_time = event[1][:10]
-        maint_type = event[2]
-        
-        # 維護前 3 天
-        cursor.execute(f"""
-            SELECT ROUND(AVG(defect_rate) * 100, 2) as defect_pct,
-                   ROUND(AVG(vibration), 2) as avg_vib
-            FROM production_log
-            WHERE machine_id = '{machine_id}'
-              AND DATE(timestamp) BETWEEN DATE('{maint_time}', '-3 days') AND DATE('{maint_time}', '-1 days')
-        """)
-        before = cursor.fetchone()
-        
-        # 維護後 3 天
-        cursor.execute(f"""
-            SELECT ROUND(AVG(defect_rate) * 100, 2) as defect_pct,
-                   ROUND(AVG(vibration), 2) as avg_vib
-            FROM production_log
-            WHERE machine_id = '{machine_id}'
-              AND DATE(timestamp) BETWEEN DATE('{maint_time}', '+1 days') AND DATE('{maint_time}', '+3 days')
-        """)
-        after = cursor.fetchone()
+    by_type = {}
+    for row in cursor.fetchall():
+        if not (row['before_defect'] and row['after_defect']):
+            continue
+        improvement = round(row['before_defect'] - row['after_defect'], 2)
+        before_after.append({
+            "machine_id": row['machine_id'],
+            "maint_type": row['maintenance_type'],
+            "maint_date": row['maint_date'],
+            "before_defect": row['before_defect'],
+            "after_defect": row['after_defect'],
+            "before_vib": row['before_vib'],
+            "after_vib": row['after_vib'],
+            "improvement": improvement,
+            "effective": improvement > 0
+        })
         
-        if before[0] and after[0]:
-            improvement = round(before[0] - after[0], 2)
-            before_after.append({
-                "machine_id": machine_id,
-                "maint_type": maint_type,
-                "before_defect": before[0],
-                "after_defect": after[0],
-                "improvement": improvement,
-                "effective": improvement > 0
-            })
+        t = by_type.setdefault(row['maintenance_type'], {"events": 0, "effective": 0, "improvement": 0.0, "before": 0.0, "after": 0.0})
+        t['events'] += 1
+        t['effective'] += improvement > 0
+        t['improvement'] += improvement
+        t['before'] += row['before_defect']
+        t['after'] += row['after_defect']
     
     # 計算維護效果統計
     effective_count = len([x for x in before_after if x['effective']])
     total_count = len(before_after)
     avg_improvement = round(sum(x['improvement'] for x in before_after) / max(total_count, 1), 2)
     
-    # PM vs BD 效果比較
-    pm_data = [x for x in before_after if x['maint_type'] == 'PM']
-    bd_data = [x for x in before_after if x['maint_type'] == 'BD']
-    
-    conn.close()
+    # 各維護類型效果比較
+    type_effect = [
+        {
+            "maint_type": maint_type,
+            "events": t['events'],
+            "effectiveness": round(t['effective'] / t['events'] * 100, 1),
+            "avg_improvement": round(t['improvement'] / t['events'], 2),
+            "avg_before_defect": round(t['before'] / t['events'], 2),
+            "avg_after_defect": round(t['after'] / t['events'], 2)
+        }
+        for maint_type, t in sorted(by_type.items())
+    ]
+    effectiveness = {t['maint_type']: t['effectiveness'] for t in type_effect}
     
-    return jsonify({
+    return {
         "maint_types": maint_types,
         "before_after": before_after[:15],
+        "by_type": type_effect,
+        "event_count": total_count,
+        "window_days": window,
         "effective_rate": round(effective_count / max(total_count, 1) * 100, 1),
         "avg_improvement": avg_improvement,
-        "pm_effectiveness": round(len([x for x in pm_data if x['effective']]) / max(len(pm_data), 1) * 100, 1),
-        "bd_effectiveness": round(len([x for x in bd_data if x['effective']]) / max(len(bd_data), 1) * 100, 1),
+        "pm_effectiveness": effectiveness.get('PM', 0.0),
+        "bd_effectiveness": effectiveness.get('BD', 0.0),
+        # 篩選全部套用於產量數據；維護事件只套用日期 / line_id / machine_id
+        "filters": ctx.filter.report(MACHINE_FILTER_COLUMNS),
         "insight": f"維護有效率 {round(effective_count / max(total_count, 1) * 100, 1)}%，平均改善 {avg_improvement}%"
-    })
+    }
 
-@app.route('/api/zw_spc_chart')
-def api_zw_spc_chart():
+@zw_endpoint('spc_chart')
+def zw_spc_chart(ctx):
     """SPC 控制圖數據"""
-    conn = get_zw_db()
-    cursor = conn.cursor()
-    
     # 日維度不良率（X-bar chart）
-    cursor.execute("""
-        SELECT DATE(timestamp) as date,
-               ROUND(AVG(defect_rate) * 100, 3) as avg_defect,
-               ROUND(MIN(defect_rate) * 100, 3) as min_defect,
-               ROUND(MAX(defect_rate) * 100, 3) as max_defect,
-               COUNT(*) as sample_size
-        FROM production_log
-        GROUP BY date
-        ORDER BY date
-    """)
-    daily_data = [dict(row) for row in cursor.fetchall()]
+    daily_data = [
+        {k: row[k] for k in ('date', 'avg_defect', 'min_defect', 'max_defect', 'sample_size')}
+        for row in ctx.shared('daily')
+    ]
     
     # 計算控制線
     if daily_data:
@@ -1339,11 +1833,9 @@ def api_zw_spc_chart():
             "mr": round(mr, 3)
         })
     
-    conn.close()
-    
     out_of_control_count = len([d for d in daily_data if d.get('out_of_control')])
     
-    return jsonify({
+    return {
         "xbar_data": daily_data,
         "mr_data": mr_data,
         "mean": round(mean, 2),
@@ -1353,7 +1845,288 @@ def api_zw_spc_chart():
         "violations": violations[:10],
         "process_capability": "穩定" if out_of_control_count < 3 else "不穩定",
         "insight": f"製程平均不良率 {round(mean, 2)}%，UCL={ucl}%，{out_of_control_count} 點超出控制線"
-    })
+    }
+
+ZW_SPC_DIMENSIONS = {'line': 'spc_line', 'machine': 'spc_machine'}
+
+def _spc_recent():
+    recent = request.args.get('recent', 1, type=int)
+    if not 1 <= recent <= 30:
+        raise ZwParamError("recent 需為 1-30")
+    return recent
+
+@zw_endpoint('spc')
+def zw_spc(ctx):
+    """
+    各產線 / 各機台 SPC（X-bar/R、p 圖、EWMA、CUSUM、Nelson 八大規則）
+    ?by=line|machine（預設 line）&series=L01,L02（指定序列時附逐點數據）&points=1 &recent=1
+    """
+    by = request.args.get('by', 'line')
+    if by not in ZW_SPC_DIMENSIONS:
+        raise ZwParamError(f"by 需為: {', '.join(ZW_SPC_DIMENSIONS)}")
+    recent = _spc_recent()
+    wanted = request.args.get('series')
+    wanted = {s.strip() for s in wanted.split(',') if s.strip()} if wanted else None
+    include_points = wanted is not None or request.args.get('points', '') in ('1', 'true', 'yes')
+    
+    series = []
+    for series_id, points in group_series(ctx.shared(ZW_SPC_DIMENSIONS[by])):
+        if wanted is not None and series_id not in wanted:
+            continue
+        result = spc_analyze(points, recent, include_points)
+        result["series"] = series_id
+        series.append(result)
+    
+    return {
+        "by": by,
+        "series": series,
+        "rules": NELSON_RULES,
+        "params": {
+            "ewma_lambda": EWMA_LAMBDA,
+            "ewma_l": EWMA_L,
+            "cusum_k": CUSUM_K,
+            "cusum_h": CUSUM_H
+        },
+        "out_of_control_count": len([s for s in series if s['out_of_control']])
+    }
+
+@zw_endpoint('spc_violations')
+def zw_spc_violations(ctx):
+    """
+    目前失控的序列（最後 recent 個子群組內有任何訊號）
+    ?by=line,machine（預設兩者）&recent=1
+    """
+    dims = [d.strip() for d in request.args.get('by', 'line,machine').split(',') if d.strip()]
+    unknown = [d for d in dims if d not in ZW_SPC_DIMENSIONS]
+    if unknown:
+        raise ZwParamError(f"by 需為: {', '.join(ZW_SPC_DIMENSIONS)}")
+    recent = _spc_recent()
+    
+    violations = []
+    series_count = 0
+    for by in dims:
+        for series_id, points in group_series(ctx.shared(ZW_SPC_DIMENSIONS[by])):
+            series_count += 1
+            result = spc_analyze(points, recent)
+            if not result['out_of_control']:
+                continue
+            violations.append({
+                "by": by,
+                "series": series_id,
+                "last_date": result['last_date'],
+                "recent_signals": result['recent_signals'],
+                "center": result['center'],
+                "sigma": result['sigma'],
+                "violations": result['violations'],
+                "signals": result['signals']
+            })
+    
+    # 訊號越多越優先
+    violations.sort(key=lambda v: (-sum(len(s['signals']) for s in v['recent_signals']), v['by'], v['series']))
+    
+    return {
+        "violations": violations,
+        "series_count": series_count,
+        "out_of_control_count": len(violations),
+        "rules": NELSON_RULES,
+        "insight": f"{len(violations)} / {series_count} 個序列目前失控" if series_count else "無符合條件的數據"
+    }
+
+# ============================================================
+# 背景預先計算（stale-while-revalidate）
+# ============================================================
+
+ZW_PRECOMPUTE = [
+    name.strip()
+    for name in os.environ.get('ZW_PRECOMPUTE', 'cost_analysis,supplier_scorecard,operator_machine_matrix').split(',')
+    if name.strip()
+]
+
+def zw_compute(builder, path='/api/zw_bundle'):
+    """在請求之外（背景執行緒）執行 builder(ctx)；path 的查詢參數即篩選條件"""
+    with app.test_request_context(path):
+        ctx = ZwContext()
+        try:
+            return builder(ctx)
+        finally:
+            ctx.close()
+
+def _precompute_job(name):
+    """在背景執行緒中以無參數請求計算區塊"""
+    return lambda: zw_compute(ZW_SECTIONS[name], f'/api/zw_{name}')
+
+def zw_precomputed(name):
+    """預先計算的 (payload, info)；未註冊、停用或尚無結果時為 (None, None)"""
+    if not precomputer.enabled or name not in precomputer.jobs:
+        return None, None
+    return precomputer.get(name)
+
+def precomputed_response(response, infos):
+    """標示資料時間；過期結果不寫入回應快取"""
+    age = max(info['age'] for info in infos)
+    stale = any(info['stale'] for info in infos)
+    computed_at = min(info['computed_at'] for info in infos)
+    response.headers['Age'] = str(int(age))
+    response.headers['X-Precomputed-At'] = datetime.fromtimestamp(computed_at).isoformat(timespec='seconds')
+    response.headers['X-Stale'] = '1' if stale else '0'
+    if stale:
+        response_cache.skip()
+    return response
+
+for _name in ZW_PRECOMPUTE:
+    if _name in ZW_SECTIONS:
+        precomputer.register(_name, _precompute_job(_name))
+
+# 分析頁載入時使用的區塊
+ZW_BUNDLE_DEFAULT = [
+    'stats', 'yield_trend', 'line_performance', 'defect_heatmap', 'operator_ranking',
+    'maintenance_alert', 'temp_analysis', 'cost_analysis', 'supplier_scorecard',
+    'predictive_score', 'vibration_analysis', 'multifactor', 'time_pattern',
+    'maintenance_effect', 'spc_chart',
+]
+
+@app.route('/api/zw_bundle')
+def api_zw_bundle():
+    """
+    分析頁一次取回多個區塊
+    ?sections=stats,yield_trend,...（預設為分析頁全部區塊）&format=columnar|msgpack
+    同一連線執行，相同分組的聚合只掃描一次
+    """
+    try:
+        fmt = requested_format()
+    except FormatError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    sections = request.args.get('sections')
+    if sections:
+        names = [name.strip() for name in sections.split(',') if name.strip()]
+    else:
+        names = ZW_BUNDLE_DEFAULT
+    
+    unknown = [name for name in names if name not in ZW_SECTIONS]
+    if unknown:
+        return jsonify({
+            "error": f"未知區塊: {', '.join(unknown)}",
+            "available": sorted(ZW_SECTIONS)
+        }), 400
+    
+    # 無篩選參數時，已預先計算的區塊直接取用
+    payload, infos = {}, []
+    if set(request.args) <= {'sections', 'format'}:
+        for name in names:
+            section, info = zw_precomputed(name)
+            if section is not None:
+                payload[name] = section
+                infos.append(info)
+    
+    ctx = ZwContext()
+    try:
+        for name in names:
+            if name not in payload:
+                payload[name] = ZW_SECTIONS[name](ctx)
+    except ZwParamError as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        ctx.close()
+    
+    response = render({name: payload[name] for name in names}, fmt)
+    return precomputed_response(response, infos) if infos else response
+
+@app.route('/api/zw_export')
+def api_zw_export():
+    """
+    原始資料串流匯出
+    ?table=production_log|machine_status|maintenance_log（預設 production_log）
+    &format=csv|ndjson &start=YYYY-MM-DD &end=YYYY-MM-DD
+    &line_id= &machine_id= &shift= &gzip=1
+    """
+    table = request.args.get('table', 'production_log')
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"format 需為: {', '.join(EXPORT_FORMATS)}"}), 400
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    
+    conn = get_zw_db()
+    try:
+        sql, params, columns = export_query(
+            conn, table,
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            line_id=request.args.get('line_id'),
+            machine_id=request.args.get('machine_id'),
+            shift=request.args.get('shift'),
+        )
+    except ValueError as e:
+        conn.close()
+        return jsonify({"error": str(e)}), 400
+    
+    mimetype, ext = EXPORT_FORMATS[fmt]
+    filename = f"{table}.{ext}"
+    if compress:
+        mimetype, filename = 'application/gzip', filename + '.gz'
+    
+    response = Response(
+        stream_export(conn, fmt, sql, params, columns, compress),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "X-Accel-Buffering": "no"
+        }
+    )
+    # 連線於回應關閉時歸還（輸出結束、客戶端中斷，或本體從未被讀取）
+    response.call_on_close(conn.close)
+    return response
+
+@app.route('/api/zw_ingest', methods=['POST'])
+def api_zw_ingest():
+    """
+    MES 資料寫入
+    ?table=production_log|machine_status|maintenance_log（預設 production_log）
+    &batch_key=（或 Idempotency-Key header）&refresh=0（略過 rollup 更新）
+    Body：JSON 陣列（或 {"rows": [...]}），或 NDJSON（application/x-ndjson）
+    """
+    if not ZW_INGEST_TOKEN:
+        # 未設定 token 時停用寫入（fail closed）
+        return jsonify({"error": "未啟用資料寫入（需設定 ZW_INGEST_TOKEN）"}), 403
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(),
+                               f"Bearer {ZW_INGEST_TOKEN}".encode()):
+        return jsonify({"error": "未授權"}), 401
+    
+    table = request.args.get('table', 'production_log')
+    batch_key = request.args.get('batch_key') or request.headers.get('Idempotency-Key')
+    refresh = request.args.get('refresh', '1') != '0'
+    
+    try:
+        if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+            rows = [json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()]
+        else:
+            rows = json.loads(request.get_data(as_text=True) or 'null')
+            if isinstance(rows, dict):
+                table = rows.get('table', table)
+                rows = rows.get('rows')
+    except ValueError as e:
+        return jsonify({"error": f"JSON 解析失敗: {e}"}), 400
+    
+    try:
+        result = zw_ingestor.ingest(table, rows, batch_key=batch_key, refresh=refresh)
+    except IngestError as e:
+        return jsonify({
+            "error": str(e),
+            "rows": [{"row": i, "error": msg} for i, msg in e.errors]
+        }), 400
+    except sqlite3.IntegrityError as e:
+        # 違反資料表約束（NOT NULL / UNIQUE / CHECK / trigger）
+        return jsonify({"error": f"資料違反約束: {e}"}), 400
+    except sqlite3.OperationalError as e:
+        # 唯讀部署或 DB 被鎖定過久
+        return jsonify({"error": f"無法寫入: {e}"}), 503
+    
+    return jsonify(result), 200 if result['replayed'] else 201
+
+@app.route('/api/zw_rows')
+def api_zw_rows():
+    """正崴原始資料分頁（keyset：timestamp, rowid）"""
+    return row_page(get_zw_db(), ['production_log', 'machine_status', 'maintenance_log'])
 
 @app.route('/analysis')
 def analysis():
@@ -1365,6 +2138,223 @@ def health():
     """健康檢查"""
     return jsonify({"status": "ok", "timestamp": datetime.now().isoformat()})
 
+@app.route('/api/_debug/cache')
+def api_debug_cache():
+    """回應快取命中統計與壓縮率"""
+    return jsonify({**response_cache.stats(), "compression": compressor.stats()})
+
+@app.route('/api/_debug/precompute')
+def api_debug_precompute():
+    """背景預先計算：各工作的最近執行時間與耗時"""
+    return jsonify(precomputer.stats())
+
+@app.route('/api/_debug/matrix')
+def api_debug_matrix():
+    """操作員 × 機台矩陣快取：份數、重建次數、記憶體"""
+    return jsonify(zw_matrix_cache.stats())
+
+@app.route('/api/_debug/health')
+def api_debug_health():
+    """機台健康狀態：機台數、水位線、載入次數與增量套用筆數"""
+    return jsonify(zw_health_store.stats())
+
+# ============================================================
+# 即時推送（SSE）：DB 變動時各來源只計算一次增量，再廣播給所有訂閱者
+# ============================================================
+
+def _live_changed(payload, state):
+    """整份比較：有變動才推送"""
+    return (payload, payload) if payload != state else (None, state)
+
+def _live_daily_points(state, fetch):
+    """
+    新增 / 更新的日資料點
+    state = {date: point}（只保留最後一天起的點）；fetch(since) 回傳 since 以後的日資料
+    """
+    since = max(state) if state else None
+    points = fetch(since)
+    changed = [point for point in points if (state or {}).get(point['date']) != point]
+    if points:
+        last = points[-1]['date']
+        state = {point['date']: point for point in points if point['date'] >= last}
+    return ({"points": changed} if changed and since is not None else None), state
+
+def live_zw_kpi(state):
+    return _live_changed(zw_compute(ZW_SECTIONS['stats'], '/api/zw_stats'), state)
+
+def live_zw_daily(state):
+    def fetch(since):
+        if since is None:
+            since = zw_compute(lambda ctx: ctx.shared('max_date'))
+            if since is None:
+                return []
+        rows = zw_compute(lambda ctx: ctx.shared('daily'), f'/api/zw_bundle?start={since}')
+        return [
+            {"date": row['date'], "yield_rate": row['yield_rate'], "output": row['output']}
+            for row in rows
+        ]
+    return _live_daily_points(state, fetch)
+
+def live_spc_violations(state):
+    """新出現 / 訊號變動的失控序列，以及已恢復的序列"""
+    result = zw_compute(ZW_SECTIONS['spc_violations'], '/api/zw_spc_violations')
+    current = {f"{v['by']}:{v['series']}": v for v in result['violations']}
+    if state is None:
+        return None, current
+    new = [v for key, v in current.items() if key not in state or state[key]['recent_signals'] != v['recent_signals']]
+    resolved = [{"by": v['by'], "series": v['series']} for key, v in state.items() if key not in current]
+    payload = None
+    if new or resolved:
+        payload = {
+            "new": new,
+            "resolved": resolved,
+            "out_of_control_count": result['out_of_control_count'],
+            "series_count": result['series_count'],
+        }
+    return payload, current
+
+def live_aat_kpi(state):
+    with app.test_request_context('/api/stats'):
+        payload = api_stats().get_json()
+    return _live_changed(payload, state)
+
+def live_aat_daily(state):
+    def fetch(since):
+        conn = get_db()
+        try:
+            if since is None:
+                since = conn.execute("SELECT MAX(date) FROM daily_capacity").fetchone()[0]
+            rows = conn.execute("""
+                SELECT date, AVG(yield_rate) as yield_rate
+                FROM daily_capacity
+                WHERE date >= ?
+                GROUP BY date
+                ORDER BY date
+            """, (since,)).fetchall()
+        finally:
+            conn.close()
+        return [{"date": row['date'], "yield_rate": round(row['yield_rate'], 4)} for row in rows]
+    return _live_daily_points(state, fetch)
+
+live_feed.register('zw_kpi', live_zw_kpi)
+live_feed.register('zw_daily', live_zw_daily)
+live_feed.register('spc_violations', live_spc_violations)
+live_feed.register('aat_kpi', live_aat_kpi)
+live_feed.register('aat_daily', live_aat_daily)
+
+@app.route('/api/stream')
+def api_stream():
+    """
+    SSE 即時推送（text/event-stream）
+    事件：zw_kpi / zw_daily / spc_violations / aat_kpi / aat_daily，data 為增量 JSON
+    重連時瀏覽器自動帶 Last-Event-ID，補送斷線期間的事件
+    """
+    if live_feed.full():
+        return jsonify({"error": "即時推送連線數已達上限，請稍後再試"}), 503
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    return Response(
+        live_feed.subscribe(last_event_id),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/api/_debug/live')
+def api_debug_live():
+    """即時推送：訂閱數與已發布事件"""
+    return jsonify(live_feed.stats())
+
+@app.route('/api/_debug/slow_queries')
+def api_debug_slow_queries():
+    """
+    慢查詢紀錄（需設定 SLOW_QUERY_MS）：最近的 SQL、參數、耗時、路由與查詢計畫
+    ?limit= 筆數 &flagged=1 只列出有全表掃描或暫存 B-tree 的紀錄
+    """
+    limit = request.args.get('limit', type=int)
+    flagged = request.args.get('flagged', '').lower() in ('1', 'true', 'yes')
+    return jsonify({
+        **slow_log.stats(),
+        "entries": slow_log.recent(limit, flagged),
+    })
+
+# /metrics 另外輸出的狀態值
+request_metrics.gauge('db_pool_connections', '連線池連線數', lambda: [
+    ({"db": db, "state": state}, pool.stats()[state])
+    for db, pool in (('aat', db_pool), ('zw', zw_db_pool)) for state in ('idle', 'created', 'reused')
+])
+request_metrics.gauge('response_cache_entries', '回應快取筆數', lambda: response_cache.stats()['size'])
+request_metrics.gauge('response_cache_lookups_total', '回應快取查詢次數', lambda: [
+    ({"result": result}, response_cache.stats()[result]) for result in ('hits', 'misses', 'not_modified')
+], kind='counter')
+request_metrics.gauge('response_compression_bytes_total', '回應壓縮前後的位元組數', lambda: [
+    ({"encoding": encoding, "direction": direction}, stats[f'bytes_{direction}'])
+    for encoding, stats in compressor.stats().items() for direction in ('in', 'out')
+], kind='counter')
+request_metrics.gauge('live_subscribers', '/api/stream 訂閱數', lambda: live_feed.subscribers)
+
+# ============================================================
+# CLI
+# ============================================================
+
+@app.cli.command('zw-rollup')
+@click.option('--rebuild', is_flag=True, help='清空後完整重建')
+def zw_rollup_command(rebuild):
+    """更新 production_log 預聚合表"""
+    added = refresh_rollups(ZW_DB_PATH, rebuild=rebuild)
+    click.echo(f"rollup 已更新：新增 {added:,} 筆原始資料")
+
+@app.cli.command('zw-migrate')
+@click.option('--check', is_flag=True, help='以 EXPLAIN QUERY PLAN 檢查時間窗查詢是否走索引')
+def zw_migrate_command(check):
+    """新增時間生成欄位與覆蓋索引"""
+    applied = migrate_zw_schema(ZW_DB_PATH)
+    click.echo(f"已套用: {', '.join(applied)}" if applied else "結構已是最新")
+    if not check:
+        return
+    
+    conn = get_zw_db()
+    failed = 0
+    for name, plan, issues in explain_checks(conn):
+        click.echo(f"{'NG' if issues else 'OK'}  {name}")
+        for detail in plan:
+            click.echo(f"      {detail}")
+        for issue in issues:
+            click.echo(f"    ! {issue}")
+        failed += bool(issues)
+    conn.close()
+    if failed:
+        raise SystemExit(1)
+
+@app.cli.command('zw-load')
+@click.argument('table', type=click.Choice(list(LOAD_TABLES)))
+@click.argument('sources', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--checkpoint', help='斷點檔路徑（預設 <DB>.<table>.load.json）')
+@click.option('--chunk', default=LOAD_CHUNK_ROWS, show_default=True, help='每段交易筆數')
+@click.option('--skip-invalid', is_flag=True, help='略過格式錯誤的資料列（預設遇錯即停止）')
+@click.option('--no-rollup', is_flag=True, help='production_log 匯入後不更新 rollup')
+def zw_load_command(table, sources, checkpoint, chunk, skip_invalid, no_rollup):
+    """匯入歷史 CSV / CSV.gz（可中斷，重跑同一指令即續傳）"""
+    db_path = ZW_DB_PATH if LOAD_TABLES[table][0] == 'zw' else DB_PATH
+    
+    def progress(loader):
+        elapsed = time.perf_counter() - loader.started
+        rate = loader.loaded / elapsed if elapsed else 0
+        click.echo(f"  {loader.loaded:,} 筆  {elapsed:,.1f}s  {rate:,.0f} rows/s", err=True)
+    
+    loader = BulkLoader(db_path, table, checkpoint=checkpoint, chunk=chunk,
+                        skip_invalid=skip_invalid, progress=progress)
+    try:
+        result = loader.run(list(sources))
+    except LoadError as e:
+        raise click.ClickException(f"{e}（已提交的部分記錄於 {loader.checkpoint}，修正後重跑即續傳）")
+    
+    click.echo(f"{table}: 新增 {result['loaded']:,} 筆，略過 {result['skipped']:,} 筆錯誤資料，"
+               f"{result['seconds']:,.1f}s（索引重建 {result['index_seconds']:,.1f}s），"
+               f"{result['rows_per_sec'] or 0:,} rows/s")
+    if table == 'production_log' and not no_rollup:
+        added = refresh_rollups(ZW_DB_PATH)
+        click.echo(f"rollup 已更新：新增 {added:,} 筆原始資料")
+
 # ============================================================
 # Main
 # ============================================================
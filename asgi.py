@@ -0,0 +1,198 @@
+"""
+ASGI 服務模式（選用）
+====================
+- 啟動：pip install uvicorn 後 `uvicorn asgi:app --workers 2`
+- 事件迴圈負責連線與收送；Flask 路由（含 SQLite 查詢）以 await 交給有上限的執行緒池
+  （ASGI_THREADS，預設與連線池 DB_POOL_SIZE 相同），慢查詢只佔一條執行緒，不卡住整個行程
+- 與 WSGI（gunicorn）模式共用同一組路由，JSON 格式、快取、ETag 完全相同
+- 有 Content-Length 的回應在執行緒內一次取完；串流回應（/api/zw_export）逐塊取
+- /api/stream 由事件迴圈直接推送（不佔執行緒），閒置訂閱只佔一個 asyncio.Event，
+  不受 LIVE_MAX_SUBSCRIBERS 限制（該上限用於保留 gthread 的執行緒）
+"""
+
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from app import app as flask_app, live_feed
+from db_pool import DB_POOL_SIZE
+
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', DB_POOL_SIZE))
+
+
+def build_environ(scope, body):
+    """ASGI HTTP scope -> WSGI environ（PEP 3333）"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'CONTENT_LENGTH':
+            environ['CONTENT_LENGTH'] = value
+        else:
+            key = 'HTTP_' + name
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class AsgiAdapter:
+    """以執行緒池執行 WSGI app 的 ASGI 介面"""
+
+    def __init__(self, wsgi_app, threads=ASGI_THREADS):
+        self.wsgi_app = wsgi_app
+        self.threads = threads
+        self._executor = None
+        self._pid = None
+
+    @property
+    def executor(self):
+        # uvicorn --workers 以子行程執行：每個行程一組執行緒池
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix='asgi')
+            self._pid = os.getpid()
+        return self._executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            if scope['path'] == '/api/stream':
+                await self._stream(scope, receive, send)
+            else:
+                await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.executor
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_body(self, receive):
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    def _start(self, environ):
+        """（執行緒內）執行 WSGI app；非串流回應直接取完 body"""
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+            return lambda data: None
+
+        result = self.wsgi_app(environ, start_response)
+        iterator = iter(result)
+        if any(k == b'content-length' for k, _ in started.get('headers', ())):
+            try:
+                body = b''.join(iterator)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+            return started['status'], started['headers'], body, None
+        # 串流：先取第一塊（start_response 可能延後到第一次迭代才呼叫）
+        first = next(iterator, b'')
+        return started['status'], started['headers'], first, (iterator, result)
+
+    async def _http(self, scope, receive, send):
+        body = await self._read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_running_loop()
+        environ = build_environ(scope, body)
+        status, headers, first, result = await loop.run_in_executor(self.executor, self._start, environ)
+
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        if result is None:
+            await send({'type': 'http.response.body', 'body': first})
+            return
+
+        iterator, result = result
+        try:
+            chunk = first
+            while True:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await loop.run_in_executor(self.executor, next, iterator, None)
+                if chunk is None:
+                    break
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            # 結束或客戶端中斷：關閉 generator（歸還 DB 連線）
+            if hasattr(result, 'close'):
+                await loop.run_in_executor(self.executor, result.close)
+
+    async def _stream(self, scope, receive, send):
+        """/api/stream：事件迴圈直接推送 SSE"""
+        environ = build_environ(scope, b'')
+        last_event_id = environ.get('HTTP_LAST_EVENT_ID')
+        if last_event_id is None:
+            last_event_id = (parse_qs(environ['QUERY_STRING']).get('last_event_id') or [None])[0]
+
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        disconnected = asyncio.ensure_future(watch_disconnect())
+        events = live_feed.subscribe_async(last_event_id)
+        try:
+            while not disconnected.done():
+                chunk = asyncio.ensure_future(events.__anext__())
+                await asyncio.wait({chunk, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if not chunk.done():
+                    chunk.cancel()
+                    await asyncio.gather(chunk, return_exceptions=True)
+                    break
+                await send({'type': 'http.response.body', 'body': chunk.result().encode('utf-8'), 'more_body': True})
+        except OSError:
+            pass
+        finally:
+            disconnected.cancel()
+            await events.aclose()
+
+
+app = AsgiAdapter(flask_app)
@@ -0,0 +1,420 @@
+"""
+歷史資料離線匯入（CSV / gzip CSV）
+================================
+- 目標表：production_log（正崴 DB）、daily_capacity / qr_trace_index / ticket_carton_impact（AAT DB）
+- csv.reader 串流讀取（.gz 自動解壓），依標頭對應欄位，整批依欄轉換型別後以 executemany 分段交易寫入
+- 匯入期間放寬 synchronous / journal_mode，並先移除目標表的一般索引，完成後重建、還原設定
+- 斷點續傳：每段交易提交後寫入 checkpoint（JSON），中斷後以相同指令重跑即從上次位置繼續；
+  移除的索引定義也記在 checkpoint，確保續傳完成後仍會重建
+- 目標表皆有唯一鍵，寫入採 ON CONFLICT DO NOTHING：提交後、寫 checkpoint 前中斷，
+  重跑時該段重複資料直接略過
+- 匯入中途若行程被強制終止（kill -9 / 斷電），因 journal 在記憶體中，DB 可能損毀；大量匯入前請先備份
+"""
+
+import csv
+import gc
+import gzip
+import io
+import itertools
+import json
+import math
+import os
+import re
+import sqlite3
+import time
+
+from zw_ingest import INGEST_SCHEMAS, check_day, parse_timestamp
+
+LOAD_CHUNK_ROWS = int(os.environ.get('LOAD_CHUNK_ROWS', 50000))
+
+# 表 -> (DB：'aat' / 'zw', [(欄位, 型別, 必填)], 唯一鍵)；型別為 str / int / float / 'timestamp' / 'date'
+LOAD_TABLES = {
+    'production_log': ('zw', INGEST_SCHEMAS['production_log'], 'batch_id'),
+    'daily_capacity': ('aat', [
+        ('date', 'date', True),
+        ('line_no', str, True),
+        ('line_type', str, False),
+        ('total_good', int, False),
+        ('total_ng', int, False),
+        ('yield_rate', float, False),
+        ('defect_rate', float, False),
+        ('runtime_hours', float, False),
+        ('hourly_output', int, False),
+    ], 'date, line_no'),
+    'qr_trace_index': ('aat', [
+        ('qr_code', str, True),
+        ('device_count', int, False),
+        ('devices', str, False),
+        ('material_code', str, False),
+        ('record_count', int, False),
+        ('result', str, False),
+    ], 'qr_code'),
+    'ticket_carton_impact': ('aat', [
+        ('ticket_no', str, True),
+        ('carton_count', int, False),
+        ('cartons', str, False),
+        ('create_date', 'date', False),
+    ], 'ticket_no'),
+}
+
+# 匯入期間的 PRAGMA（完成或中斷時還原 synchronous / journal_mode）
+LOAD_PRAGMAS = {
+    'synchronous': 'OFF',
+    'journal_mode': 'MEMORY',
+    'cache_size': '-262144',   # 256 MB
+    'temp_store': 'MEMORY',
+}
+
+_DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}')
+_TS_SPACE_RE = re.compile(r'\d{4}-\d{2}-\d{2} (?:[01]\d|2[0-3]):[0-5]\d:[0-5]\d')
+_CREATE_INDEX_RE = re.compile(r'CREATE\s+(UNIQUE\s+)?INDEX\s+(?:IF\s+NOT\s+EXISTS\s+)?', re.I)
+
+
+class LoadError(ValueError):
+    """來源檔格式錯誤（標頭不符、資料無法轉換）"""
+
+
+def _to_date(value):
+    if _DATE_RE.fullmatch(value) is None:
+        raise ValueError("格式需為 YYYY-MM-DD")
+    check_day(value)
+    return value
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        number = float(value)  # 接受 "12.0"
+        if not number.is_integer():
+            raise ValueError("需為整數")
+        return int(number)
+
+
+def _to_float(value):
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError("需為有限數值")
+    return number
+
+
+_CONVERTERS = {str: str, int: _to_int, float: _to_float, 'timestamp': parse_timestamp, 'date': _to_date}
+
+
+def open_source(path):
+    """文字模式開啟 CSV（.gz 以串流解壓）；支援 UTF-8 BOM"""
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(path, 'rb'), encoding='utf-8-sig', newline='')
+    return open(path, encoding='utf-8-sig', newline='')
+
+
+def row_parser(table, header):
+    """
+    依 CSV 標頭建立列轉換函數：list[str] -> tuple（依表欄位順序）
+    空字串視為 NULL；未知欄位、缺少必填欄位時丟出 LoadError
+    """
+    _, schema, _ = LOAD_TABLES[table]
+    header = [name.strip() for name in header]
+    known = {name for name, _, _ in schema}
+    unknown = [name for name in header if name not in known]
+    if unknown:
+        raise LoadError(f"{table} 無此欄位: {', '.join(unknown)}")
+    position = {name: i for i, name in enumerate(header)}
+    missing = [name for name, _, required in schema if required and name not in position]
+    if missing:
+        raise LoadError(f"缺少必填欄位: {', '.join(missing)}")
+
+    plan = [(name, position.get(name), _CONVERTERS[type_], required) for name, type_, required in schema]
+    width = len(header)
+    derive_rate = table == 'production_log'
+
+    def parse(record):
+        if len(record) != width:
+            raise ValueError(f"欄位數 {len(record)} 與標頭 {width} 不符")
+        values = []
+        for name, index, convert, required in plan:
+            value = record[index] if index is not None else ''
+            if value == '':
+                if required:
+                    raise ValueError(f"{name} 為必填")
+                values.append(None)
+                continue
+            try:
+                values.append(convert(value))
+            except ValueError as e:
+                raise ValueError(f"{name}={value!r} {e}")
+        if derive_rate and values[10] is None and values[8]:
+            # 與 /api/zw_ingest 相同：defect_rate 未提供時由數量計算
+            values[10] = round((values[9] or 0) / values[8], 4)
+        return tuple(values)
+
+    return parse
+
+
+def _convert_column(values, type_, required):
+    """整欄轉換（C 層 map）；有空值或錯誤時回傳 None，由逐列解析處理"""
+    if '' in values:
+        if required:
+            return None
+        if type_ is str:
+            return [v or None for v in values]
+        return None
+    if type_ is str:
+        return values
+    if type_ is int:
+        return list(map(int, values))
+    if type_ is float:
+        converted = list(map(float, values))
+        return converted if all(map(math.isfinite, converted)) else None
+    if type_ == 'timestamp':
+        # 僅標準格式（空白分隔）走整欄路徑；含 T 者由逐列解析轉換
+        if not all(map(_TS_SPACE_RE.fullmatch, values)):
+            return None
+        days = {v[:10] for v in values}
+    else:
+        if not all(map(_DATE_RE.fullmatch, values)):
+            return None
+        days = set(values)
+    try:
+        for day in days:
+            check_day(day)
+    except ValueError:
+        return None
+    return values
+
+
+def batch_parser(table, header):
+    """
+    依欄整批轉換：list[list[str]] -> list[tuple]，比逐列快數倍
+    批次內有任何空值 / 格式錯誤的欄位時，該批改以 row_parser 逐列解析（可回報行號、略過錯誤列）
+    """
+    _, schema, _ = LOAD_TABLES[table]
+    parse_row = row_parser(table, header)
+    position = {name.strip(): i for i, name in enumerate(header)}
+    width = len(header)
+    derive_rate = table == 'production_log'
+
+    def parse(records):
+        if not records or set(map(len, records)) != {width}:
+            return None
+        columns = list(zip(*records))
+        values = []
+        for name, type_, required in schema:
+            index = position.get(name)
+            if index is None:
+                if required:
+                    return None
+                values.append([None] * len(records))
+                continue
+            try:
+                converted = _convert_column(columns[index], type_, required)
+            except ValueError:
+                converted = None
+            if converted is None:
+                return None
+            values.append(converted)
+        if derive_rate and None in values[10]:
+            values[10] = [
+                rate if rate is not None else (round(defect / output, 4) if output else None)
+                for rate, output, defect in zip(values[10], values[8], values[9])
+            ]
+        return list(zip(*values))
+
+    return parse, parse_row
+
+
+def insert_sql(table):
+    _, schema, key = LOAD_TABLES[table]
+    columns = [name for name, _, _ in schema]
+    return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT ({key}) DO NOTHING")
+
+
+# ============================================================
+# Checkpoint
+# ============================================================
+
+def checkpoint_path(db_path, table):
+    return f"{db_path}.{table}.load.json"
+
+
+def _file_id(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime": int(st.st_mtime)}
+
+
+def read_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_checkpoint(path, state):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+# ============================================================
+# 匯入
+# ============================================================
+
+def _secondary_indexes(conn, table):
+    """目標表的一般索引（不含唯一索引：唯一鍵需保留給 ON CONFLICT 去重）"""
+    return [
+        (name, sql) for name, sql in conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+            (table,)
+        )
+        if not _CREATE_INDEX_RE.match(sql).group(1)
+    ]
+
+
+class BulkLoader:
+    """
+    單一表的離線匯入；progress(loader) 於每段提交後呼叫（loader.loaded / loader.started 可計算速度）
+    loader.state 為 checkpoint 內容：{"table", "files": {路徑: {"rows", "loaded", "skipped", "done", ...}}, "indexes"}
+    """
+
+    def __init__(self, db_path, table, checkpoint=None, chunk=LOAD_CHUNK_ROWS,
+                 skip_invalid=False, progress=None):
+        if table not in LOAD_TABLES:
+            raise LoadError(f"table 需為: {', '.join(LOAD_TABLES)}")
+        self.db_path = db_path
+        self.table = table
+        self.checkpoint = checkpoint or checkpoint_path(db_path, table)
+        self.chunk = chunk
+        self.skip_invalid = skip_invalid
+        self.progress = progress
+        self.state = None
+        self.loaded = 0
+        self.started = None
+
+    def _load_state(self, sources):
+        state = read_checkpoint(self.checkpoint)
+        if state is None:
+            state = {"table": self.table, "files": {}, "indexes": []}
+        elif state.get('table') != self.table:
+            raise LoadError(f"checkpoint {self.checkpoint} 屬於 {state.get('table')}，請指定其他 --checkpoint")
+        for path in sources:
+            key = os.path.abspath(path)
+            entry = state['files'].get(key)
+            if entry and (entry['size'], entry['mtime']) != tuple(_file_id(path).values()):
+                raise LoadError(f"{path} 在上次匯入後已變動，請刪除 {self.checkpoint} 後重新匯入")
+            if entry is None:
+                state['files'][key] = dict(_file_id(path), rows=0, loaded=0, skipped=0, done=False)
+        return state
+
+    def run(self, sources):
+        """匯入全部來源檔，回傳統計 dict"""
+        self.state = state = self._load_state(sources)
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        restore = {
+            name: conn.execute(f"PRAGMA {name}").fetchone()[0] for name in ('synchronous', 'journal_mode')
+        }
+        self.started = start = time.perf_counter()
+        loaded = skipped = 0
+        # 大量短生命週期 tuple 會反覆觸發循環 GC；匯入資料不含循環參照，期間暫停
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for name, value in LOAD_PRAGMAS.items():
+                conn.execute(f"PRAGMA {name} = {value}")
+
+            # 延後建立索引：先記錄定義再移除（續傳時沿用 checkpoint 內的定義）
+            dropped = _secondary_indexes(conn, self.table)
+            if dropped:
+                state['indexes'] = [sql for _, sql in dropped] + [
+                    sql for sql in state['indexes'] if sql not in {s for _, s in dropped}
+                ]
+                write_checkpoint(self.checkpoint, state)
+                for name, _ in dropped:
+                    conn.execute(f'DROP INDEX "{name}"')
+
+            sql = insert_sql(self.table)
+            for path in sources:
+                entry = state['files'][os.path.abspath(path)]
+                if entry['done']:
+                    continue
+                file_loaded, file_skipped = self._load_file(conn, sql, path, entry)
+                loaded += file_loaded
+                skipped += file_skipped
+
+            index_start = time.perf_counter()
+            for index_sql in state['indexes']:
+                conn.execute(_CREATE_INDEX_RE.sub('CREATE INDEX IF NOT EXISTS ', index_sql, count=1))
+            index_elapsed = time.perf_counter() - index_start
+        finally:
+            if gc_enabled:
+                gc.enable()
+            for name, value in restore.items():
+                conn.execute(f"PRAGMA {name} = {value}")
+            conn.close()
+
+        # 未寫過 checkpoint（例如空檔且無次要索引）時不需移除
+        if os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+        elapsed = time.perf_counter() - start
+        return {
+            "table": self.table,
+            "files": len(sources),
+            "loaded": loaded,
+            "skipped": skipped,
+            "rows": sum(entry['rows'] for entry in state['files'].values()),
+            "index_seconds": round(index_elapsed, 2),
+            "seconds": round(elapsed, 2),
+            "rows_per_sec": round(loaded / elapsed) if elapsed else None,
+        }
+
+    def _load_file(self, conn, sql, path, entry):
+        loaded = skipped = 0
+        with open_source(path) as f:
+            reader = csv.reader(f)
+            try:
+                parse_batch, parse_row = batch_parser(self.table, next(reader))
+            except StopIteration:
+                entry['done'] = True
+                return 0, 0
+
+            # 續傳：略過已處理的資料列（gzip 無法 seek，逐列略過）
+            line = 1 + entry['rows']
+            for _ in itertools.islice(reader, entry['rows']):
+                pass
+
+            while not entry['done']:
+                records = list(itertools.islice(reader, self.chunk))
+                if len(records) < self.chunk:
+                    entry['done'] = True
+                batch, invalid = parse_batch(records), 0
+                if batch is None:
+                    batch = []
+                    for offset, record in enumerate(records, line + 1):
+                        try:
+                            batch.append(parse_row(record))
+                        except ValueError as e:
+                            if not self.skip_invalid:
+                                raise LoadError(f"{path} 第 {offset} 行: {e}")
+                            invalid += 1
+                line += len(records)
+
+                conn.execute("BEGIN")
+                try:
+                    before = conn.total_changes
+                    conn.executemany(sql, batch)
+                    inserted = conn.total_changes - before
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                entry['rows'] = line - 1
+                entry['loaded'] += inserted
+                entry['skipped'] += invalid
+                loaded += inserted
+                skipped += invalid
+                self.loaded += inserted
+                write_checkpoint(self.checkpoint, self.state)
+                if self.progress:
+                    self.progress(self)
+        return loaded, skipped
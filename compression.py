@@ -0,0 +1,101 @@
+"""
+回應壓縮（gzip / brotli，依 Accept-Encoding 協商）
+==============================================
+- 大於 COMPRESS_MIN_BYTES（預設 1024）的 JSON / MessagePack / 文字回應依 Accept-Encoding 壓縮；
+  brotli 需安裝 brotli 套件（未安裝時只提供 gzip），同品質時優先 br
+- 快取的回應（response_cache.py）由快取層直接取用已壓縮的版本（每種編碼只壓縮一次），
+  其餘回應在 after_request 壓縮；串流回應（/api/zw_export、/api/stream）不處理
+- 壓縮後的 ETag 加上編碼後綴（"<etag>-gzip"），與未壓縮的版本區分；一律加上 Vary: Accept-Encoding
+- COMPRESS_LEVEL（gzip，預設 6）、BROTLI_QUALITY（預設 5，動態內容建議 4~6）；COMPRESS_MIN_BYTES=0 停用
+"""
+
+import gzip
+import os
+import threading
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # 選用
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 5))
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/msgpack', 'text/')
+
+
+def compressible(response):
+    mimetype = response.mimetype or ''
+    return any(mimetype.startswith(t) for t in COMPRESSIBLE_TYPES)
+
+
+class ResponseCompressor:
+    def __init__(self, min_bytes=COMPRESS_MIN_BYTES, level=COMPRESS_LEVEL, brotli_quality=BROTLI_QUALITY):
+        self.min_bytes = min_bytes
+        self.level = level
+        self.brotli_quality = brotli_quality
+        self.encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+        self._lock = threading.Lock()
+        self.bytes_in = {e: 0 for e in self.encodings}
+        self.bytes_out = {e: 0 for e in self.encodings}
+
+    @property
+    def enabled(self):
+        return self.min_bytes > 0
+
+    def init_app(self, app):
+        """需在回應快取之前註冊（after_request 逆序執行，快取先取得未壓縮的內容）"""
+        if self.enabled:
+            app.after_request(self._after_request)
+
+    def negotiate(self, size):
+        """目前請求可接受的編碼（None = 不壓縮）"""
+        if not self.enabled or size < self.min_bytes:
+            return None
+        encoding = request.accept_encodings.best_match(self.encodings)
+        return encoding if encoding in self.encodings else None
+
+    def compress(self, body, encoding):
+        if encoding == 'br':
+            data = brotli.compress(body, quality=self.brotli_quality)
+        else:
+            data = gzip.compress(body, compresslevel=self.level, mtime=0)
+        with self._lock:
+            self.bytes_in[encoding] += len(body)
+            self.bytes_out[encoding] += len(data)
+        return data
+
+    def apply(self, response, encoding, data, etag=None):
+        """以已壓縮的內容取代回應本體"""
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+        if etag:
+            response.set_etag(f"{etag}-{encoding}")
+        return response
+
+    def _after_request(self, response):
+        if not compressible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+                or 'Content-Encoding' in response.headers):
+            return response
+        encoding = self.negotiate(response.content_length or 0)
+        if encoding is None:
+            return response
+        etag, _ = response.get_etag()
+        return self.apply(response, encoding, self.compress(response.get_data(), encoding), etag)
+
+    def stats(self):
+        with self._lock:
+            return {
+                e: {
+                    "bytes_in": self.bytes_in[e],
+                    "bytes_out": self.bytes_out[e],
+                    "ratio": round(self.bytes_out[e] / self.bytes_in[e], 3) if self.bytes_in[e] else None,
+                }
+                for e in self.encodings
+            }
@@ -0,0 +1,118 @@
+"""
+SQLite 連線池（每個 worker 一組）
+================================
+- 以唯讀 URI 模式開啟（mode=ro），並套用 PRAGMA 調校
+- 連線歸還後保留 page cache 與 prepared statement cache
+- gunicorn fork 後自動重建，不共用父行程的連線
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from urllib.request import pathname2url
+
+# 調校參數（可由環境變數覆寫）
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -64 * 1024))  # 負值 = KiB
+SQLITE_STATEMENT_CACHE = int(os.environ.get('SQLITE_STATEMENT_CACHE', 256))
+
+
+class PooledConnection(sqlite3.Connection):
+    """close() 時歸還連線池，而非真正關閉"""
+
+    pool = None
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.release(self)
+
+    def really_close(self):
+        super().close()
+
+
+class ConnectionPool:
+    """單一 DB 檔的唯讀連線池"""
+
+    def __init__(self, path, size=DB_POOL_SIZE, readonly=True, factory=PooledConnection):
+        self.path = path
+        self.size = size
+        self.readonly = readonly
+        self.factory = factory
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue(maxsize=max(self.size, 1))
+        self.created = 0
+        self.reused = 0
+
+    def _connect(self):
+        if self.readonly:
+            uri = f"file:{pathname2url(os.path.abspath(self.path))}?mode=ro"
+        else:
+            uri = f"file:{pathname2url(os.path.abspath(self.path))}"
+        conn = sqlite3.connect(
+            uri,
+            uri=True,
+            factory=self.factory,
+            check_same_thread=False,
+            cached_statements=SQLITE_STATEMENT_CACHE,
+        )
+        conn.row_factory = sqlite3.Row
+        # 連線設定以 sqlite3.Connection.execute 執行：factory 為 InstrumentedConnection 時不計入請求的 SQL
+        setup = [f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}", f"PRAGMA cache_size = {SQLITE_CACHE_SIZE}",
+                 "PRAGMA temp_store = MEMORY"]
+        if self.readonly:
+            setup.append("PRAGMA query_only = ON")
+        for pragma in setup:
+            sqlite3.Connection.execute(conn, pragma)
+        conn.pool = self
+        self.created += 1
+        return conn
+
+    def acquire(self):
+        """取得連線（池內有閒置則重用）"""
+        if self._pid != os.getpid():
+            # fork 後的子行程：丟棄繼承來的連線
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+        self.reused += 1
+        return conn
+
+    def release(self, conn):
+        """歸還連線；池已滿或停用時真正關閉"""
+        if conn.in_transaction:
+            conn.rollback()
+        if self.size <= 0 or self._pid != os.getpid():
+            conn.really_close()
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.really_close()
+
+    def close_all(self):
+        """關閉所有閒置連線"""
+        while True:
+            try:
+                self._idle.get_nowait().really_close()
+            except queue.Empty:
+                break
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "created": self.created,
+            "reused": self.reused,
+        }
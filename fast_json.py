@@ -0,0 +1,44 @@
+"""
+JSON 回應序列化（orjson 選用）
+============================
+- 安裝 orjson 時 jsonify() 改以 orjson 序列化並直接輸出 bytes（不經過 str），未安裝時使用標準庫 json
+- 輸出與 Flask 預設相同：鍵排序、非字串鍵轉為字串、datetime / date 為 HTTP 日期、debug 模式縮排 2 格；
+  差異：非 ASCII 字元直接輸出 UTF-8（不轉為 \\uXXXX）、NaN / Infinity 輸出為 null（標準庫輸出的 NaN 不是合法 JSON）
+- orjson 不支援的值（超過 64 位元的整數等）自動改用標準庫；dumps()（模板 tojson 等）維持 Flask 預設
+"""
+
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # 選用
+    orjson = None
+
+ORJSON_OPTIONS = (
+    orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SERIALIZE_NUMPY
+) if orjson is not None else 0
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify() 以 dumps_bytes() 序列化"""
+
+    def dumps_bytes(self, obj, indent=False):
+        if orjson is not None:
+            option = ORJSON_OPTIONS | (orjson.OPT_INDENT_2 if indent else 0)
+            if not self.sort_keys:
+                option &= ~orjson.OPT_SORT_KEYS
+            try:
+                return orjson.dumps(obj, default=self.default, option=option)
+            except TypeError:  # orjson.JSONEncodeError
+                pass
+        kwargs = {"indent": 2} if indent else {"separators": (",", ":")}
+        return json.dumps(
+            obj, default=self.default, ensure_ascii=self.ensure_ascii, sort_keys=self.sort_keys, **kwargs
+        ).encode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self.dumps_bytes(obj, indent) + b"\n", mimetype=self.mimetype)
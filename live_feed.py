@@ -0,0 +1,206 @@
+"""
+即時資料推送（Server-Sent Events）
+================================
+- 每個 worker 一條廣播執行緒：每 LIVE_POLL 秒檢查 DB 版本，有變動時才計算各來源的增量
+- 增量只計算一次，再推給所有訂閱者（訂閱者數量不影響查詢量）
+- 事件存於環狀緩衝（LIVE_BACKLOG 筆），斷線重連時依 Last-Event-ID 補送
+  （事件 id 含 worker 識別，重連到其他 worker 時改從目前位置開始）
+- 訂閱者閒置時只在 Condition 上等待，每 LIVE_HEARTBEAT 秒送出註解行保持連線；
+  ASGI 模式（asgi.py）的訂閱者改等 asyncio.Event，由廣播執行緒以 call_soon_threadsafe 喚醒
+- 每個訂閱佔住一條執行緒（gthread）或 greenlet（gevent），sync worker 下則佔住整個 worker；
+  LIVE_MAX_SUBSCRIBERS 為每個 worker 的上限，需小於 gthread 的 --threads 以保留一般請求的執行緒
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+LIVE_POLL = float(os.environ.get('LIVE_POLL', 2))
+LIVE_HEARTBEAT = float(os.environ.get('LIVE_HEARTBEAT', 15))
+LIVE_BACKLOG = int(os.environ.get('LIVE_BACKLOG', 200))
+LIVE_MAX_SUBSCRIBERS = int(os.environ.get('LIVE_MAX_SUBSCRIBERS', 200))
+LIVE_RETRY_MS = 5000
+
+log = logging.getLogger(__name__)
+
+
+def format_event(token, seq, event, data):
+    """SSE 訊息格式（data 為已序列化的 JSON，不含換行）"""
+    return f"id: {token}.{seq}\nevent: {event}\ndata: {data}\n\n"
+
+
+class LiveFeed:
+    """
+    DB 變動時廣播增量事件
+    register(name, fn)：fn(state) -> (payload 或 None, new_state)；
+    state 由廣播器保存（首次為 None），payload 為 None 表示此來源無變動
+    """
+
+    def __init__(self, version_fn, poll=LIVE_POLL, heartbeat=LIVE_HEARTBEAT,
+                 backlog=LIVE_BACKLOG, max_subscribers=LIVE_MAX_SUBSCRIBERS):
+        self.version_fn = version_fn
+        self.poll = poll
+        self.heartbeat = heartbeat
+        self.max_subscribers = max_subscribers
+        self.sources = {}
+        self._states = {}
+        self._events = deque(maxlen=backlog)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self._token = None
+        self._version = None
+        self._async_waiters = set()  # {(loop, asyncio.Event)}
+        self.subscribers = 0
+        self.published = 0
+        self.errors = 0
+        self.last_error = None
+
+    def register(self, name, fn):
+        self.sources[name] = fn
+
+    # ------------------------------------------------------------
+    # 廣播端
+    # ------------------------------------------------------------
+
+    def _ensure_thread(self):
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            # fork 後的子行程：父行程的執行緒不存在，重新啟動
+            self._pid = os.getpid()
+            self._token = f"{self._pid:x}{int(time.time()):x}"
+            self._thread = threading.Thread(target=self._loop, name='live-feed', daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                self.errors += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                log.exception("live feed check failed")
+            time.sleep(self.poll)
+
+    def check(self):
+        """DB 版本變動時計算各來源增量並發布；首次呼叫只建立基準狀態"""
+        version, _ = self.version_fn()
+        if version == self._version:
+            return
+        first = self._version is None
+        self._version = version
+        for name, fn in self.sources.items():
+            payload, self._states[name] = fn(self._states.get(name))
+            if payload is not None and not first:
+                self.publish(name, payload)
+
+    def publish(self, event, payload):
+        data = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, event, data))
+            self.published += 1
+            self._cond.notify_all()
+            waiters = list(self._async_waiters)
+        for loop, wake in waiters:
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:  # 事件迴圈已關閉
+                pass
+
+    # ------------------------------------------------------------
+    # 訂閱端
+    # ------------------------------------------------------------
+
+    def full(self):
+        return self.subscribers >= self.max_subscribers
+
+    def _pending(self, after):
+        return [item for item in self._events if item[0] > after]
+
+    def _resume_from(self, last_event_id):
+        """Last-Event-ID（<token>.<seq>）對應的補送起點；無法補送時為 None"""
+        token, _, seq = (last_event_id or '').partition('.')
+        if token != self._token or not seq.isdigit() or not self._events:
+            return None
+        seq = int(seq)
+        if seq < self._events[0][0] - 1 or seq > self._seq:
+            return None
+        return seq
+
+    def subscribe(self, last_event_id=None):
+        """
+        SSE 串流 generator
+        last_event_id 仍在緩衝內時補送其後的事件；否則從目前位置開始
+        """
+        self._ensure_thread()
+        with self._cond:
+            self.subscribers += 1
+            resume = self._resume_from(last_event_id)
+            cursor = self._seq if resume is None else resume
+        try:
+            yield f"retry: {LIVE_RETRY_MS}\n: connected\n\n"
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._seq > cursor, timeout=self.heartbeat)
+                    pending = self._pending(cursor)
+                if not pending:
+                    yield ": ping\n\n"
+                    continue
+                cursor = pending[-1][0]
+                yield ''.join(format_event(self._token, *item) for item in pending)
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+    async def subscribe_async(self, last_event_id=None):
+        """subscribe() 的 asyncio 版本：閒置時不佔執行緒"""
+        self._ensure_thread()
+        wake = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), wake)
+        with self._cond:
+            self.subscribers += 1
+            self._async_waiters.add(waiter)
+            resume = self._resume_from(last_event_id)
+            cursor = self._seq if resume is None else resume
+        try:
+            yield f"retry: {LIVE_RETRY_MS}\n: connected\n\n"
+            while True:
+                try:
+                    await asyncio.wait_for(wake.wait(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    pass
+                wake.clear()
+                with self._cond:
+                    pending = self._pending(cursor)
+                if not pending:
+                    yield ": ping\n\n"
+                    continue
+                cursor = pending[-1][0]
+                yield ''.join(format_event(self._token, *item) for item in pending)
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+                self._async_waiters.discard(waiter)
+
+    def stats(self):
+        return {
+            "subscribers": self.subscribers,
+            "max_subscribers": self.max_subscribers,
+            "poll": self.poll,
+            "last_event_id": self._seq,
+            "published": self.published,
+            "backlog": len(self._events),
+            "sources": list(self.sources),
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
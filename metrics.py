@@ -0,0 +1,304 @@
+"""
+請求層級 SQL 計量與 Prometheus /metrics
+======================================
+- 連線池的連線改用 InstrumentedConnection：每個 execute / fetch 累計到目前請求的 RequestStats
+  （SQL 數、SQL 時間、讀取筆數）；請求以 ContextVar 傳遞，QueryExecutor 的平行查詢同樣計入
+- JSON 序列化時間由 TimedJSONProvider 計入；請求結束時依路由記錄到直方圖
+- 每個回應帶 Server-Timing（db / json / total），瀏覽器 DevTools 的 Timing 分頁可直接看到；
+  db 為各查詢時間的加總，平行查詢時可能大於 total
+- /metrics 輸出 Prometheus 文字格式；每個 worker 各自累計，樣本帶 worker（pid）標籤
+- 每個 SQL 只多兩次 perf_counter 與一次 ContextVar 讀取；請求外（背景執行緒）的查詢不計量
+- METRICS_ENABLED=0 停用（連線池改回一般連線，不註冊 /metrics、不加 Server-Timing）
+- 串流回應（/api/zw_export、/api/stream）只計入回應開始前的查詢
+- 慢查詢紀錄（slow_query.py）共用同一組計時
+"""
+
+import bisect
+import os
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+
+from flask import Response, g, request
+
+from db_pool import PooledConnection
+from fast_json import FastJSONProvider
+from slow_query import SlowQueryLog
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+
+# 直方圖分界
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+ROWS_BUCKETS = (0, 10, 100, 1000, 10000, 100000, 1000000)
+
+_current = ContextVar('request_stats', default=None)
+
+# 慢查詢紀錄（SLOW_QUERY_MS 未設定時停用）
+slow_log = SlowQueryLog()
+
+
+class RequestStats:
+    """單一請求的累計值（平行查詢會由多條執行緒同時累加）"""
+
+    __slots__ = ('route', 'statements', 'sql_time', 'rows', 'serialize_time', '_lock')
+
+    def __init__(self, route=None):
+        self.route = route
+        self.statements = 0
+        self.sql_time = 0.0
+        self.rows = 0
+        self.serialize_time = 0.0
+        self._lock = threading.Lock()
+
+    def add_sql(self, elapsed, statements=0, rows=0):
+        with self._lock:
+            self.statements += statements
+            self.sql_time += elapsed
+            self.rows += rows
+
+
+def current_stats():
+    """目前請求的 RequestStats（請求外為 None）"""
+    return _current.get()
+
+
+# ============================================================
+# 連線計量
+# ============================================================
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    execute / fetch 的時間與筆數計入目前請求；啟用慢查詢紀錄時，
+    同一 SQL 的 execute + fetch 累計超過門檻即記錄（請求外的背景查詢同樣記錄）
+    """
+
+    _slow = None  # [sql, params, 累計秒數]；已記錄後為 None
+
+    def _observe(self, elapsed, statements=0, rows=0):
+        stats = _current.get()
+        if stats is not None:
+            stats.add_sql(elapsed, statements, rows)
+        slow = self._slow
+        if slow is not None:
+            slow[2] += elapsed
+            if slow[2] >= slow_log.threshold:
+                self._slow = None
+                slow_log.record(self.connection, slow[0], slow[1], slow[2], stats.route if stats else None)
+
+    def execute(self, sql, parameters=()):
+        if _current.get() is None and not slow_log.enabled:
+            return super().execute(sql, parameters)
+        self._slow = [sql, parameters, 0.0] if slow_log.enabled else None
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._observe(time.perf_counter() - start, statements=1)
+
+    def executemany(self, sql, seq_of_parameters):
+        if _current.get() is None:
+            return super().executemany(sql, seq_of_parameters)
+        self._slow = None
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._observe(time.perf_counter() - start, statements=1)
+
+    def fetchone(self):
+        if _current.get() is None and self._slow is None:
+            return super().fetchone()
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._observe(time.perf_counter() - start, rows=row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        if _current.get() is None and self._slow is None:
+            return super().fetchmany(size)
+        start = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._observe(time.perf_counter() - start, rows=len(rows))
+        return rows
+
+    def fetchall(self):
+        if _current.get() is None and self._slow is None:
+            return super().fetchall()
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._observe(time.perf_counter() - start, rows=len(rows))
+        return rows
+
+
+class InstrumentedConnection(PooledConnection):
+    """cursor() / execute() 一律使用 InstrumentedCursor"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+# 連線池使用的連線類別
+connection_factory = InstrumentedConnection if METRICS_ENABLED or slow_log.enabled else PooledConnection
+
+
+class TimedJSONProvider(FastJSONProvider):
+    """jsonify() 的序列化時間計入目前請求"""
+
+    def dumps_bytes(self, obj, indent=False):
+        stats = _current.get()
+        if stats is None:
+            return super().dumps_bytes(obj, indent)
+        start = time.perf_counter()
+        try:
+            return super().dumps_bytes(obj, indent)
+        finally:
+            stats.serialize_time += time.perf_counter() - start
+
+
+# ============================================================
+# 直方圖與 Prometheus 文字格式
+# ============================================================
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(pairs):
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}' if pairs else ''
+
+
+class Histogram:
+    def __init__(self, name, help_, buckets, labelnames):
+        self.name = name
+        self.help = help_
+        self.buckets = buckets
+        self.labelnames = labelnames
+        self._series = {}  # labels -> [各分界計數..., +Inf 計數, sum]
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self, const):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            pairs = list(zip(self.labelnames, labels)) + const
+            total = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                total += count
+                lines.append(f"{self.name}_bucket{_labels(pairs + [('le', bound)])} {total}")
+            lines.append(f"{self.name}_sum{_labels(pairs)} {series[-1]:.6g}")
+            lines.append(f"{self.name}_count{_labels(pairs)} {total}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_, labelnames):
+        self.name = name
+        self.help = help_
+        self.labelnames = labelnames
+        self._values = {}
+
+    def inc(self, labels, value=1):
+        self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self, const):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(list(zip(self.labelnames, labels)) + const)} {value}")
+        return lines
+
+
+class Metrics:
+    """各路由的請求計量；gauge() 另外登記狀態值（連線池、快取等）"""
+
+    def __init__(self, prefix='aat'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.requests = Counter(f'{prefix}_http_requests_total', '請求數', ('route', 'method', 'status'))
+        self.histograms = {
+            'total': Histogram(f'{prefix}_http_request_duration_seconds', '請求處理時間（不含串流本體）',
+                               SECONDS_BUCKETS, ('route',)),
+            'sql_time': Histogram(f'{prefix}_sql_duration_seconds', '每個請求的 SQL 累計時間',
+                                  SECONDS_BUCKETS, ('route',)),
+            'statements': Histogram(f'{prefix}_sql_statements', '每個請求執行的 SQL 數', COUNT_BUCKETS, ('route',)),
+            'rows': Histogram(f'{prefix}_sql_rows', '每個請求讀取的資料列數', ROWS_BUCKETS, ('route',)),
+            'serialize': Histogram(f'{prefix}_json_serialize_seconds', '每個請求的 JSON 序列化時間',
+                                   SECONDS_BUCKETS, ('route',)),
+        }
+        self._gauges = []
+
+    def gauge(self, name, help_, fn, kind='gauge'):
+        """fn() 回傳數值，或 [(labels dict, 數值)]；kind='counter' 用於只增不減的累計值"""
+        self._gauges.append((f'{self.prefix}_{name}', help_, fn, kind))
+
+    def init_app(self, app):
+        """需在其他 before_request（如回應快取）之前註冊，才涵蓋快取命中的請求"""
+        if not METRICS_ENABLED:
+            return
+        app.json = TimedJSONProvider(app)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule('/metrics', 'metrics', self.view)
+
+    def _before_request(self):
+        stats = RequestStats(request.url_rule.rule if request.url_rule else None)
+        g._metrics = (_current.set(stats), stats, time.perf_counter())
+
+    def _after_request(self, response):
+        state = g.get('_metrics')
+        if state is None:
+            return response
+        _, stats, start = state
+        total = time.perf_counter() - start
+        route = stats.route or '<unmatched>'
+        labels = (route,)
+        with self._lock:
+            self.requests.inc((route, request.method, str(response.status_code)))
+            self.histograms['total'].observe(labels, total)
+            self.histograms['sql_time'].observe(labels, stats.sql_time)
+            self.histograms['statements'].observe(labels, stats.statements)
+            self.histograms['rows'].observe(labels, stats.rows)
+            self.histograms['serialize'].observe(labels, stats.serialize_time)
+        response.headers['Server-Timing'] = (
+            f'db;dur={stats.sql_time * 1000:.2f};desc="{stats.statements} queries, {stats.rows} rows", '
+            f'json;dur={stats.serialize_time * 1000:.2f}, '
+            f'total;dur={total * 1000:.2f}'
+        )
+        return response
+
+    def _teardown_request(self, exc):
+        state = g.pop('_metrics', None)
+        if state is not None:
+            _current.reset(state[0])
+
+    def render(self):
+        const = [('worker', os.getpid())]
+        lines = []
+        with self._lock:
+            lines.extend(self.requests.render(const))
+            for histogram in self.histograms.values():
+                lines.extend(histogram.render(const))
+        for name, help_, fn, kind in self._gauges:
+            lines += [f"# HELP {name} {help_}", f"# TYPE {name} {kind}"]
+            value = fn()
+            samples = value if isinstance(value, list) else [({}, value)]
+            for labels, v in samples:
+                lines.append(f"{name}{_labels(list(labels.items()) + const)} {v}")
+        return '\n'.join(lines) + '\n'
+
+    def view(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,164 @@
+"""
+背景預先計算（stale-while-revalidate）
+=====================================
+- 註冊耗時的 payload（如成本分析、供應商評分卡），由背景執行緒定期重算
+- 觸發條件：距上次計算超過 interval 秒，或 DB 版本變動
+- 請求一律立即取得最近一次成功的結果；過期時回應標示 stale，同時喚醒背景重算
+- 尚無結果時（剛啟動）等待第一次計算完成，計算本身仍在背景執行緒
+- 每個 worker 一組（fork 後自動重建執行緒）；PRECOMPUTE_INTERVAL=0 停用
+"""
+
+import logging
+import os
+import threading
+import time
+
+PRECOMPUTE_INTERVAL = float(os.environ.get('PRECOMPUTE_INTERVAL', 300))
+PRECOMPUTE_TICK = float(os.environ.get('PRECOMPUTE_TICK', 1))
+PRECOMPUTE_WAIT = float(os.environ.get('PRECOMPUTE_WAIT', 30))
+
+log = logging.getLogger(__name__)
+
+
+def _iso(ts):
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(ts)) if ts else None
+
+
+class PrecomputeJob:
+    def __init__(self, name, fn, interval):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.payload = None
+        self.version = None       # payload 對應的 DB 版本
+        self.computed_at = None   # payload 計算時間（time.time()）
+        self.tried_version = None
+        self.last_run = None      # 最近一次執行（含失敗）
+        self.duration = None      # 秒
+        self.runs = 0
+        self.errors = 0
+        self.last_error = None
+        self.ready = threading.Event()  # 第一次執行完成（不論成敗）
+
+    def due(self, version, now):
+        """是否需要重算（失敗後同樣等到版本變動或 interval 才重試）"""
+        if self.last_run is None:
+            return True
+        return version != self.tried_version or now - self.last_run >= self.interval
+
+    def stale(self, version, now):
+        """目前結果是否過期"""
+        if self.payload is None:
+            return True
+        return version != self.version or now - self.computed_at >= self.interval
+
+    def run(self, version):
+        self.last_run = time.time()
+        self.tried_version = version
+        start = time.perf_counter()
+        try:
+            payload = self.fn()
+        except Exception as e:  # 保留上次成功結果
+            self.errors += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            log.exception("precompute job %s failed", self.name)
+            return
+        finally:
+            self.duration = time.perf_counter() - start
+            self.runs += 1
+            self.ready.set()
+        self.payload = payload
+        self.version = version
+        self.computed_at = time.time()
+        self.last_error = None
+
+
+class Precomputer:
+    """背景預先計算排程；version_fn() 回傳 (version, last_modified)"""
+
+    def __init__(self, version_fn, interval=PRECOMPUTE_INTERVAL, tick=PRECOMPUTE_TICK):
+        self.version_fn = version_fn
+        self.interval = interval
+        self.tick = tick
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.interval > 0
+
+    def register(self, name, fn, interval=None):
+        self.jobs[name] = PrecomputeJob(name, fn, interval or self.interval)
+
+    def _ensure_thread(self):
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            # fork 後的子行程：父行程的執行緒不存在，重新啟動
+            self._pid = os.getpid()
+            self._wake = threading.Event()
+            self._thread = threading.Thread(target=self._loop, name='precompute', daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            version, _ = self.version_fn()
+            for job in list(self.jobs.values()):
+                if job.due(version, time.time()):
+                    job.run(version)
+            self._wake.wait(self.tick)
+            self._wake.clear()
+
+    def start(self):
+        if self.enabled:
+            self._ensure_thread()
+
+    def get(self, name):
+        """
+        回傳 (payload, info)；info = {"age", "stale", "computed_at"}
+        尚無結果且等待逾時則回傳 (None, None)，由呼叫端自行計算
+        """
+        job = self.jobs[name]
+        self._ensure_thread()
+        if job.payload is None:
+            self._wake.set()
+            job.ready.wait(PRECOMPUTE_WAIT)
+            if job.payload is None:
+                return None, None
+        version, _ = self.version_fn()
+        now = time.time()
+        stale = job.stale(version, now)
+        if stale:
+            self._wake.set()
+        return job.payload, {
+            "age": now - job.computed_at,
+            "stale": stale,
+            "computed_at": job.computed_at,
+        }
+
+    def stats(self):
+        now = time.time()
+        version, _ = self.version_fn()
+        return {
+            "enabled": self.enabled,
+            "interval": self.interval,
+            "jobs": {
+                name: {
+                    "interval": job.interval,
+                    "runs": job.runs,
+                    "errors": job.errors,
+                    "last_error": job.last_error,
+                    "last_run": _iso(job.last_run),
+                    "last_success": _iso(job.computed_at),
+                    "duration_ms": round(job.duration * 1000, 1) if job.duration is not None else None,
+                    "age": round(now - job.computed_at, 1) if job.computed_at else None,
+                    "stale": job.stale(version, now),
+                }
+                for name, job in self.jobs.items()
+            },
+        }
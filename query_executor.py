@@ -0,0 +1,74 @@
+"""
+請求內查詢平行化
+==============
+- 同一請求中互不相依的查詢分派到執行緒池，各自使用連線池中的另一條唯讀連線，
+  端點延遲趨近最慢的一個查詢，而非全部相加
+- 每個請求的平行度上限 QUERY_PARALLELISM（含請求執行緒本身）；預設 1 = 依序執行（部署目標為單核心主機，
+  平行反而較慢且每個請求占用多條連線），多核心主機再設為 2~4
+- 執行緒池 QUERY_THREADS 條（每個 worker 共用）；SQLite 執行查詢時釋放 GIL，多核心時可同時運算
+- 請求執行緒也參與執行：執行緒池被其他請求占滿時，尚未開始的分派直接取消，由請求執行緒做完，
+  不會因等待執行緒池而卡住
+- 執行緒池內的工作在呼叫端 contextvars 的複本中執行（請求層級的 SQL 計量照常累計）
+"""
+
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+QUERY_PARALLELISM = int(os.environ.get('QUERY_PARALLELISM', 1))
+QUERY_THREADS = int(os.environ.get('QUERY_THREADS', 8))
+
+
+class QueryExecutor:
+    def __init__(self, threads=QUERY_THREADS, parallelism=QUERY_PARALLELISM):
+        self.threads = threads
+        self.parallelism = parallelism
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        # fork 後的子行程：父行程的執行緒不存在，重新建立
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix='query')
+                    self._pid = os.getpid()
+        return self._executor
+
+    def map(self, calls, parallelism=None):
+        """
+        執行無參數 callable，回傳結果 list（順序同 calls）
+        任一個丟出例外時，其餘未開始的不再執行，例外原樣拋出
+        """
+        calls = list(calls)
+        limit = min(parallelism or self.parallelism, len(calls), self.threads + 1)
+        if limit <= 1:
+            return [call() for call in calls]
+
+        results = [None] * len(calls)
+        errors = []
+        lock = threading.Lock()
+        pending = iter(range(len(calls)))
+
+        def worker():
+            while not errors:
+                with lock:
+                    i = next(pending, None)
+                if i is None:
+                    return
+                try:
+                    results[i] = calls[i]()
+                except BaseException as e:
+                    errors.append(e)
+
+        futures = [self.executor.submit(contextvars.copy_context().run, worker) for _ in range(limit - 1)]
+        worker()
+        for future in futures:
+            if not future.cancel():
+                future.result()
+        if errors:
+            raise errors[0]
+        return results
@@ -0,0 +1,193 @@
+"""
+/api/* 回應快取（依 DB 版本自動失效）
+====================================
+- 鍵：路徑 + 排序後的查詢參數（+ variant_fn() 的協商結果，例如依 Accept 選擇的格式）
+- LRU 上限：RESPONSE_CACHE_SIZE（0 = 停用）
+- DB 版本：DB 檔與 -wal 檔的 mtime/size；任一變動即整批失效
+- 回應帶 ETag / Last-Modified，瀏覽器重新整理可得 304
+- 指定 compressor（compression.py）時，各編碼的壓縮結果隨快取項目保存，命中時不再重複壓縮
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from flask import Response, g, request
+
+from compression import compressible
+
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 256))
+
+
+def file_version(*paths):
+    """
+    以檔案 mtime/size 組成版本字串
+    回傳 (version, last_modified)；last_modified 為最新的 mtime（秒）
+    """
+    parts = []
+    last_modified = 0
+    for path in paths:
+        for p in (path, path + '-wal'):
+            try:
+                st = os.stat(p)
+            except OSError:
+                parts.append('-')
+                continue
+            parts.append(f"{st.st_mtime_ns:x}.{st.st_size:x}")
+            last_modified = max(last_modified, st.st_mtime)
+    return '/'.join(parts), last_modified
+
+
+class CacheEntry:
+    __slots__ = ('body', 'mimetype', 'etag', 'headers', 'encoded')
+
+    def __init__(self, body, mimetype, etag, headers):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = etag
+        self.headers = headers
+        self.encoded = {}  # encoding -> 壓縮後的 body
+
+
+class ResponseCache:
+    """LRU 回應快取；version_fn() 回傳 (version, last_modified)"""
+
+    skip_prefixes = ('/api/_debug/',)
+
+    def __init__(self, version_fn, maxsize=RESPONSE_CACHE_SIZE, compressor=None, variant_fn=None):
+        self.version_fn = version_fn
+        self.variant_fn = variant_fn
+        self.maxsize = maxsize
+        self.compressor = compressor
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _cacheable(self):
+        if self.maxsize <= 0 or request.method not in ('GET', 'HEAD'):
+            return False
+        path = request.path
+        return path.startswith('/api/') and not path.startswith(self.skip_prefixes)
+
+    def _key(self):
+        args = sorted(request.args.items(multi=True))
+        key = f"{request.path}?{urlencode(args)}" if args else request.path
+        variant = self.variant_fn() if self.variant_fn else ''
+        return f"{key}#{variant}" if variant else key
+
+    def _lookup(self, key, version):
+        with self._lock:
+            if version != self._version:
+                # DB 已變動：整批失效
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._version = version
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def _store(self, key, version, entry):
+        with self._lock:
+            if version != self._version:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _encode(self, response, entry):
+        """依 Accept-Encoding 改用快取項目的壓縮版本（首次使用時壓縮並保存）"""
+        if self.compressor is None or not compressible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self.compressor.negotiate(len(entry.body))
+        if encoding is None:
+            return response
+        data = entry.encoded.get(encoding)
+        if data is None:
+            data = entry.encoded[encoding] = self.compressor.compress(entry.body, encoding)
+        return self.compressor.apply(response, encoding, data, entry.etag)
+
+    def _finish(self, response, last_modified):
+        response.headers['Cache-Control'] = 'no-cache'
+        if last_modified:
+            response.last_modified = last_modified
+        response = response.make_conditional(request)
+        if response.status_code == 304:
+            with self._lock:
+                self.not_modified += 1
+        return response
+
+    def _before_request(self):
+        if not self._cacheable():
+            return None
+        version, last_modified = self.version_fn()
+        key = self._key()
+        entry = self._lookup(key, version)
+        if entry is None:
+            g._response_cache = (key, version, last_modified)
+            return None
+
+        response = Response(entry.body, mimetype=entry.mimetype)
+        for name, value in entry.headers:
+            response.headers[name] = value
+        response.set_etag(entry.etag)
+        response.headers['X-Cache'] = 'HIT'
+        return self._finish(self._encode(response, entry), last_modified)
+
+    def skip(self):
+        """本次回應不寫入快取（例如背景預先計算的過期結果）"""
+        g._response_cache_skip = True
+
+    def _after_request(self, response):
+        pending = g.pop('_response_cache', None)
+        if pending is None or g.pop('_response_cache_skip', False):
+            return response
+        key, version, last_modified = pending
+        if response.status_code != 200 or response.is_streamed or response.direct_passthrough:
+            return response
+
+        response.add_etag()
+        etag, _ = response.get_etag()
+        headers = [
+            (name, value) for name, value in response.headers.items()
+            if name not in ('Content-Type', 'Content-Length', 'ETag', 'Date')
+        ]
+        entry = CacheEntry(response.get_data(), response.mimetype, etag, headers)
+        self._store(key, version, entry)
+        response.headers['X-Cache'] = 'MISS'
+        return self._finish(self._encode(response, entry), last_modified)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total * 100, 1) if total else 0,
+                "not_modified": self.not_modified,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
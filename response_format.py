@@ -0,0 +1,92 @@
+"""
+欄式 / MessagePack 回應格式（選用）
+================================
+- ?format=json（預設，原本的列式 JSON）| columnar | msgpack
+- columnar：鍵相同的 dict 陣列（xbar_data、hourly、factor_matrix…）轉為 {欄位: [值...]}，
+  欄位名稱只出現一次；鍵不一致或空的陣列維持原樣，其餘結構不變
+- msgpack：欄式資料以 MessagePack 編碼（application/msgpack，需安裝 msgpack 套件）；
+  未指定 format 時 Accept: application/msgpack 同樣回應 msgpack（回應帶 Vary: Accept）
+- 轉換與編碼時間計入 Server-Timing 的 json
+"""
+
+import time
+
+from flask import current_app, jsonify, request
+
+from metrics import current_stats
+
+try:
+    import msgpack
+except ImportError:  # 選用
+    msgpack = None
+
+RESPONSE_FORMATS = ('json', 'columnar', 'msgpack')
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+
+
+class FormatError(ValueError):
+    pass
+
+
+def requested_format():
+    """?format= 優先，其次 Accept；格式不支援時 FormatError"""
+    fmt = request.args.get('format')
+    if fmt is None:
+        return accept_variant() or 'json'
+    if fmt not in RESPONSE_FORMATS:
+        raise FormatError(f"format 需為: {', '.join(RESPONSE_FORMATS)}")
+    if fmt == 'msgpack' and msgpack is None:
+        raise FormatError("format=msgpack 需安裝 msgpack 套件")
+    return fmt
+
+
+def accept_variant():
+    """依 Accept 協商的格式（'msgpack' 或 ''）；回應快取以此區分同一網址的不同回應"""
+    if msgpack is None or 'format' in request.args:
+        return ''
+    best = request.accept_mimetypes.best_match(('application/json',) + MSGPACK_MIMETYPES)
+    return 'msgpack' if best in MSGPACK_MIMETYPES else ''
+
+
+def to_columnar(obj):
+    """列式 → 欄式（遞迴）"""
+    if isinstance(obj, dict):
+        return {k: to_columnar(v) for k, v in obj.items()}
+    if not isinstance(obj, list) or not obj:
+        return obj
+    first = obj[0]
+    if isinstance(first, dict) and first:
+        keys = first.keys()
+        if all(isinstance(row, dict) and row.keys() == keys for row in obj):
+            return {k: _column([row[k] for row in obj]) for k in first}
+    return _column(obj)
+
+
+def _column(values):
+    if any(isinstance(v, (dict, list)) for v in values):
+        return [to_columnar(v) for v in values]
+    return values
+
+
+def _msgpack_default(o):
+    if hasattr(o, 'tolist'):  # numpy 純量 / 陣列
+        return o.tolist()
+    return current_app.json.default(o)
+
+
+def render(payload, fmt='json'):
+    """依格式產生回應"""
+    if fmt != 'json':
+        stats = current_stats()
+        start = time.perf_counter()
+        payload = to_columnar(payload)
+        body = msgpack.packb(payload, default=_msgpack_default, use_bin_type=True) if fmt == 'msgpack' else None
+        if stats is not None:
+            stats.serialize_time += time.perf_counter() - start
+    if fmt == 'msgpack':
+        response = current_app.response_class(body, mimetype=MSGPACK_MIMETYPES[0])
+    else:
+        response = jsonify(payload)
+    if msgpack is not None and 'format' not in request.args:
+        response.vary.add('Accept')
+    return response
@@ -0,0 +1,114 @@
+"""
+原始資料分頁瀏覽（Keyset / Seek 分頁）
+====================================
+- 排序鍵：(時間欄位, rowid)，下一頁以 WHERE (ts, rowid) > (?, ?) 接續，
+  不使用 OFFSET：任何深度的分頁成本都與第一頁相同（走時間欄位索引）
+- cursor 為不透明字串（base64 JSON），綁定表與排序方向
+- 支援等值篩選、日期區間與欄位投影
+"""
+
+import base64
+import json
+
+from zw_filter import check_date
+
+PAGE_LIMIT_DEFAULT = 100
+PAGE_LIMIT_MAX = 1000
+
+# 表 -> (時間欄位, 日期區間是否以 timestamp 比較, 可用的等值篩選欄位)
+PAGE_TABLES = {
+    # 正崴 DB
+    'production_log': ('timestamp', True,
+                       ('line_id', 'machine_id', 'operator_id', 'supplier_id', 'product_id', 'shift')),
+    'machine_status': ('timestamp', True, ('machine_id',)),
+    'maintenance_log': ('timestamp', True, ('machine_id', 'maintenance_type')),
+    # AAT DB
+    'daily_capacity': ('date', False, ('line_no', 'line_type')),
+}
+
+
+def encode_cursor(table, descending, sort_value, rowid):
+    raw = json.dumps([table, int(descending), sort_value, rowid], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, table, descending):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cur_table, cur_desc, sort_value, rowid = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("cursor 無效")
+    # 值會直接綁定到 SQL：排序鍵只能是純量，rowid 為整數
+    if (sort_value is not None and type(sort_value) not in (str, int, float)) or type(rowid) is not int:
+        raise ValueError("cursor 無效")
+    if cur_table != table or bool(cur_desc) != descending:
+        raise ValueError("cursor 與 table / order 不符")
+    return sort_value, rowid
+
+
+def fetch_page(conn, table, columns=None, filters=None, start=None, end=None,
+               cursor=None, limit=PAGE_LIMIT_DEFAULT, descending=False):
+    """
+    取得一頁資料
+    回傳 {"table", "columns", "rows", "limit", "next_cursor"}；最後一頁 next_cursor 為 None
+    """
+    if table not in PAGE_TABLES:
+        raise ValueError(f"table 需為: {', '.join(PAGE_TABLES)}")
+    sort_col, ts_range, filterable = PAGE_TABLES[table]
+
+    existing = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    if not existing:
+        raise ValueError(f"{table} 不存在")
+    if columns:
+        unknown = [c for c in columns if c not in existing]
+        if unknown:
+            raise ValueError(f"未知欄位: {', '.join(unknown)}")
+    else:
+        columns = existing
+    if not 1 <= limit <= PAGE_LIMIT_MAX:
+        raise ValueError(f"limit 需為 1-{PAGE_LIMIT_MAX}")
+
+    where, params = [], []
+    for name, value in (filters or {}).items():
+        if value is None:
+            continue
+        if name not in filterable:
+            raise ValueError(f"{table} 不支援 {name} 篩選")
+        where.append(f"{name} = ?")
+        params.append(value)
+    # 日期區間直接比較排序欄位，與 keyset 條件共用同一個索引範圍
+    if start:
+        where.append(f"{sort_col} >= ?")
+        params.append(check_date('start', start))
+    if end:
+        if ts_range:
+            where.append(f"{sort_col} < DATE(?, '+1 day')")
+        else:
+            where.append(f"{sort_col} <= ?")
+        params.append(check_date('end', end))
+    if cursor:
+        where.append(f"({sort_col}, rowid) {'<' if descending else '>'} (?, ?)")
+        params.extend(decode_cursor(cursor, table, descending))
+
+    direction = 'DESC' if descending else 'ASC'
+    sql = f"SELECT {', '.join(columns)}, {sort_col} AS _sort, rowid AS _rowid FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {sort_col} {direction}, rowid {direction} LIMIT ?"
+    params.append(limit + 1)
+
+    rows = conn.execute(sql, params).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(table, descending, last[-2], last[-1])
+
+    return {
+        "table": table,
+        "columns": columns,
+        "rows": [dict(zip(columns, row[:-2])) for row in rows],
+        "limit": limit,
+        "next_cursor": next_cursor,
+    }
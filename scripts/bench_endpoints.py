@@ -0,0 +1,246 @@
+"""
+端點基準測試：所有 /api/* 的延遲與記憶體
+======================================
+用法：python scripts/bench_endpoints.py [--zw PATH] [--aat PATH] [--rounds 20] [--out result.json] [--baseline base.json]
+
+- 以 Flask test client 逐一呼叫所有 GET /api/* 路由（略過 /api/stream、/api/_debug/*、寫入端點），
+  需要參數的路由使用 ROUTE_ARGS
+- 預設關閉回應快取與背景預先計算（RESPONSE_CACHE_SIZE=0、PRECOMPUTE_INTERVAL=0），每次呼叫都實際計算；
+  --cache 保留快取，量測命中後的延遲
+- 每個路由記錄 p50 / p95 / 最大延遲、傳輸大小（--accept-encoding 指定壓縮時為壓縮後大小）、
+  JSON 序列化時間（取自 Server-Timing），以及該路由執行期間的峰值 RSS
+  （Linux 以 /proc/self/clear_refs 逐路由重設峰值，仍包含先前路由留下的常駐記憶體，如 SQLite 頁快取；
+   其他平台為整個行程的峰值；需要單一路由的絕對值時以 --routes 單獨執行）
+- --out 存成 JSON（含資料規模、CPU、git commit）；--baseline 與先前的 JSON 比較，
+  p50 或峰值 RSS 超過容忍範圍時列出並以 exit code 1 結束
+- 大規模資料集以 scripts/gen_fake_data.py 產生，例如：
+  python scripts/gen_fake_data.py --days 1095 --machines 500 --zw /tmp/zw_3y.db --aat /tmp/aat_3y.db
+  python scripts/bench_endpoints.py --zw /tmp/zw_3y.db --aat /tmp/aat_3y.db --out bench_3y.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import resource
+import sqlite3
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 必要參數（沒有參數時回 400 的路由）
+ROUTE_ARGS = {
+    '/api/zw_histogram': 'column=temperature&edges=60,62,64,66,68,70',
+    '/api/zw_machine_health': 'machine_id=M01',
+}
+# 單次耗時與資料量成正比的路由，減少呼叫次數
+ROUTE_ROUNDS = {
+    '/api/zw_export': 3,
+}
+SKIP_ROUTES = {'/api/stream'}
+
+_JSON_TIMING_RE = re.compile(r'(?:^|,)\s*json;dur=([\d.]+)')
+
+# 比較基準時低於此差距視為雜訊
+MIN_DELTA_MS = 5
+MIN_DELTA_RSS_MB = 20
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def reset_peak_rss():
+    """重設行程的峰值 RSS（Linux 4.0+）；不支援時回傳 False"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def process_peak_rss_mb():
+    """整個行程的峰值 RSS（不受 clear_refs 影響）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def peak_rss_mb():
+    """上次重設以來的峰值 RSS"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return process_peak_rss_mb()
+
+
+def dataset_info(zw_path, aat_path):
+    info = {}
+    for name, path, tables in [
+        ('zw', zw_path, ['production_log', 'machine_status', 'maintenance_log']),
+        ('aat', aat_path, ['daily_capacity', 'qr_trace_index']),
+    ]:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            info[name] = {
+                "path": path,
+                "size_mb": round(os.path.getsize(path) / 1024 / 1024, 1),
+                "rows": {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in tables},
+            }
+            if name == 'zw':
+                info[name]["days"] = conn.execute("SELECT COUNT(DISTINCT DATE(timestamp)) FROM machine_status").fetchone()[0]
+                info[name]["machines"] = conn.execute("SELECT COUNT(DISTINCT machine_id) FROM machine_status").fetchone()[0]
+        finally:
+            conn.close()
+    return info
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def bench(app, routes, rounds, warmup, accept_encoding=None):
+    client = app.test_client()
+    headers = {'Accept-Encoding': accept_encoding} if accept_encoding else {}
+    per_route_rss = reset_peak_rss()
+    results = {}
+    for route in routes:
+        url = f"{route}?{ROUTE_ARGS[route]}" if route in ROUTE_ARGS else route
+        n = min(rounds, ROUTE_ROUNDS.get(route, rounds))
+        if per_route_rss:
+            reset_peak_rss()
+        status, size, encoding = None, 0, None
+        for _ in range(warmup):
+            client.get(url, headers=headers).close()
+        latencies, serialize = [], []
+        for _ in range(n):
+            start = time.perf_counter()
+            resp = client.get(url, headers=headers)
+            size = len(resp.get_data())
+            latencies.append((time.perf_counter() - start) * 1000)
+            status = resp.status_code
+            encoding = resp.headers.get('Content-Encoding')
+            m = _JSON_TIMING_RE.search(resp.headers.get('Server-Timing', ''))
+            if m:
+                serialize.append(float(m.group(1)))
+            resp.close()
+        results[route] = {
+            "status": status,
+            "rounds": n,
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "max_ms": round(max(latencies), 2),
+            "bytes": size,
+            "encoding": encoding,
+            "json_ms": round(percentile(serialize, 50), 3) if serialize else None,
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        }
+        r = results[route]
+        print(f"{route:<36} {status:>4} {r['p50_ms']:>9} {r['p95_ms']:>9} {str(r['json_ms']):>8} "
+              f"{r['peak_rss_mb']:>8} {size:>10} {encoding or '':>5}", flush=True)
+    return results, per_route_rss
+
+
+def compare(results, baseline, tolerance):
+    """回傳超出容忍範圍的 [(route, 指標, 基準, 本次)]"""
+    regressions = []
+    for route, r in results.items():
+        base = baseline.get(route)
+        if not base:
+            continue
+        if r['p50_ms'] > base['p50_ms'] * (1 + tolerance) and r['p50_ms'] - base['p50_ms'] > MIN_DELTA_MS:
+            regressions.append((route, 'p50_ms', base['p50_ms'], r['p50_ms']))
+        if (r['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance)
+                and r['peak_rss_mb'] - base['peak_rss_mb'] > MIN_DELTA_RSS_MB):
+            regressions.append((route, 'peak_rss_mb', base['peak_rss_mb'], r['peak_rss_mb']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--zw', help='正崴 DB（預設 data/zw_poc_fake_60d.db）')
+    parser.add_argument('--aat', help='AAT DB（預設 data/aat_poc_v2.db）')
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--routes', nargs='+', help='只測包含這些字串的路由')
+    parser.add_argument('--cache', action='store_true', help='保留回應快取')
+    parser.add_argument('--accept-encoding', help='請求帶 Accept-Encoding（例如 "gzip, br"），量測壓縮後大小')
+    parser.add_argument('--out', help='結果存成 JSON')
+    parser.add_argument('--baseline', help='與先前的結果 JSON 比較')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='容許的增加比例（預設 0.2 = 20%%）')
+    args = parser.parse_args()
+
+    # app 於 import 時讀取設定，需先設定環境變數
+    if args.zw:
+        os.environ['ZW_DB_PATH'] = os.path.abspath(args.zw)
+    if args.aat:
+        os.environ['AAT_DB_PATH'] = os.path.abspath(args.aat)
+    if not args.cache:
+        os.environ['RESPONSE_CACHE_SIZE'] = '0'
+    os.environ['PRECOMPUTE_INTERVAL'] = '0'
+    sys.path.insert(0, ROOT)
+    import app as dashboard
+
+    routes = sorted(
+        r.rule for r in dashboard.app.url_map.iter_rules()
+        if r.rule.startswith('/api/') and not r.rule.startswith('/api/_debug/')
+        and 'GET' in r.methods and '<' not in r.rule and r.rule not in SKIP_ROUTES
+    )
+    if args.routes:
+        routes = [r for r in routes if any(s in r for s in args.routes)]
+
+    meta = {
+        "created_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "cpu_count": os.cpu_count(),
+        "engine": dashboard.ZW_ENGINE,
+        "cache": args.cache,
+        "accept_encoding": args.accept_encoding,
+        "rounds": args.rounds,
+        "dataset": dataset_info(dashboard.ZW_DB_PATH, dashboard.DB_PATH),
+    }
+    zw = meta['dataset']['zw']
+    print(f"正崴 DB: {zw['path']}（{zw['size_mb']} MB，production_log {zw['rows']['production_log']:,} 筆，"
+          f"{zw['days']} 天 × {zw['machines']} 台）")
+    print(f"{'route':<36} {'code':>4} {'p50 ms':>9} {'p95 ms':>9} {'json ms':>8} {'RSS MB':>8} {'bytes':>10} {'enc':>5}")
+    results, per_route_rss = bench(dashboard.app, routes, args.rounds, args.warmup, args.accept_encoding)
+    meta["per_route_rss"] = per_route_rss
+    meta["peak_rss_mb"] = round(process_peak_rss_mb(), 1)
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({"meta": meta, "routes": results}, f, ensure_ascii=False, indent=1)
+
+    failed = [route for route, r in results.items() if r['status'] != 200]
+    if failed:
+        print(f"\n非 200 回應：{', '.join(failed)}")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['routes'], args.tolerance)
+        print(f"\n與基準比較（{args.baseline}，commit {baseline['meta'].get('commit')}，"
+              f"容忍 +{args.tolerance:.0%}）：{'無退步' if not regressions else f'{len(regressions)} 項退步'}")
+        for route, metric, before, after in regressions:
+            print(f"  {route:<36} {metric:<12} {before:>9} -> {after:>9}")
+        if regressions:
+            sys.exit(1)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
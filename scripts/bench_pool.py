@@ -0,0 +1,69 @@
+"""
+連線池基準測試：/api/zw_* 每秒請求數（無池 vs 連線池）
+===================================================
+用法：python scripts/bench_pool.py [--rounds 20]
+
+以 Flask test client 逐一呼叫所有 /api/zw_* 端點，
+分別在 DB_POOL_SIZE=0（每次請求開關連線）與預設連線池下執行。
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(rounds):
+    sys.path.insert(0, ROOT)
+    from app import app
+
+    client = app.test_client()
+    routes = sorted(
+        r.rule for r in app.url_map.iter_rules()
+        if r.rule.startswith('/api/zw_') and 'GET' in r.methods and '<' not in r.rule
+    )
+    # 暖機
+    for route in routes:
+        client.get(route)
+
+    result = {}
+    for route in routes:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            client.get(route)
+        elapsed = time.perf_counter() - start
+        result[route] = rounds / elapsed
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run(args.rounds)))
+        return
+
+    results = {}
+    for label, size in (('direct', '0'), ('pooled', os.environ.get('DB_POOL_SIZE', '8'))):
+        env = dict(os.environ, DB_POOL_SIZE=size, RESPONSE_CACHE_SIZE='0')
+        out = subprocess.check_output(
+            [sys.executable, __file__, '--child', '--rounds', str(args.rounds)], env=env
+        )
+        results[label] = json.loads(out)
+
+    print(f"{'route':<40}{'direct req/s':>14}{'pooled req/s':>14}{'speedup':>10}")
+    for route in sorted(results['direct']):
+        before = results['direct'][route]
+        after = results['pooled'][route]
+        print(f"{route:<40}{before:>14.1f}{after:>14.1f}{after / before:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+服務模式比較：gunicorn sync / gunicorn gthread / uvicorn ASGI
+==========================================================
+用法：python scripts/bench_serving.py [--clients 50 200] [--duration 15] [--workers 2] [--modes sync gthread asgi]
+
+- 依序啟動各模式的伺服器（相同 worker 數），以 asyncio 壓測程式維持固定併發連線數
+- 關閉回應快取（RESPONSE_CACHE_SIZE=0）與背景預先計算，每個請求都實際查詢 SQLite
+- 請求組合：篩選後的總覽 / 良率趨勢 / SPC 違規（較重）/ AAT 總覽，篩選值隨機
+- 輸出每個模式 × 併發數的 req/s、延遲 p50 / p95 / p99 與錯誤數；--out 另存 JSON
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    'sync': lambda port, workers: ['gunicorn', 'app:app', '-w', str(workers), '-b', f'127.0.0.1:{port}',
+                                   '--backlog', '2048', '--timeout', '120'],
+    'gthread': lambda port, workers: ['gunicorn', 'app:app', '-w', str(workers), '-k', 'gthread',
+                                      '--threads', '32', '-b', f'127.0.0.1:{port}', '--backlog', '2048'],
+    'asgi': lambda port, workers: ['uvicorn', 'asgi:app', '--workers', str(workers), '--port', str(port),
+                                   '--log-level', 'warning', '--backlog', '2048'],
+}
+
+
+def request_path(rng):
+    line = f"L{rng.randint(1, 4):02d}"
+    start = f"2024-01-{rng.randint(1, 28):02d}"
+    return rng.choice([
+        f"/api/zw_stats?line_id={line}&start={start}",
+        f"/api/zw_yield_trend?start={start}",
+        f"/api/zw_spc_violations?by=line&start={start}",
+        "/api/stats",
+    ])
+
+
+async def fetch(port, path):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        data = await reader.read()
+    finally:
+        writer.close()
+    return int(data[9:12]) if data[:5] == b'HTTP/' else 0
+
+
+async def run_load(port, clients, duration, seed):
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def client(i):
+        nonlocal errors
+        rng = random.Random(seed * 1000 + i)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status = await fetch(port, request_path(rng))
+            except OSError:
+                status = 0
+            if status == 200:
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * p / 100))], 1) if values else None
+
+
+def wait_ready(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=1)
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    parser.add_argument('--clients', nargs='+', type=int, default=[50, 200])
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--port', type=int, default=5090)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--out', help='結果另存 JSON')
+    args = parser.parse_args()
+
+    env = dict(os.environ, RESPONSE_CACHE_SIZE='0', PRECOMPUTE_INTERVAL='0')
+    results = []
+    for mode in args.modes:
+        proc = subprocess.Popen(MODES[mode](args.port, args.workers), cwd=ROOT, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_ready(args.port):
+                print(f"{mode}: 伺服器未啟動（是否已安裝 gunicorn / uvicorn？）", file=sys.stderr)
+                continue
+            asyncio.run(run_load(args.port, 4, 2, args.seed))  # 暖機
+            for clients in args.clients:
+                latencies, errors, elapsed = asyncio.run(run_load(args.port, clients, args.duration, args.seed))
+                results.append({
+                    "mode": mode,
+                    "clients": clients,
+                    "workers": args.workers,
+                    "requests": len(latencies),
+                    "errors": errors,
+                    "rps": round(len(latencies) / elapsed, 1),
+                    "p50_ms": percentile(latencies, 50),
+                    "p95_ms": percentile(latencies, 95),
+                    "p99_ms": percentile(latencies, 99),
+                })
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    print(f"CPU: {os.cpu_count()}  workers: {args.workers}  duration: {args.duration}s")
+    print(f"{'mode':<8} {'clients':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for r in results:
+        print(f"{r['mode']:<8} {r['clients']:>7} {r['rps']:>8} {r['p50_ms']:>8} {r['p95_ms']:>8} "
+              f"{r['p99_ms']:>8} {r['errors']:>6}")
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,354 @@
+"""
+合成資料產生器：正崴 zw DB 與 AAT DB
+==================================
+用法：python scripts/gen_fake_data.py [--days 60] [--machines 20] [--seed 7] [--zw PATH] [--aat PATH]
+
+- 預設參數產生 data/zw_poc_fake_60d.db（60 天、20 台機台、4 條產線）
+- 同一組參數與 seed 產生的內容完全相同（單一亂數序列、固定的產生順序），可作為效能比較的固定資料集
+- 規模：--days 60 ~ 1095（3 年）、--machines 10 ~ 500；production_log 約 days × 24 × machines × --density 筆，
+  machine_status 同數量（每批一筆狀態），500 台 × 3 年約各 650 萬筆
+- 數值關聯：溫度 / 振動 / 累計運行時數越高不良率越高；運行時數超過 450h 或隨機故障時寫入維護紀錄並歸零，
+  深度分析各區塊（維護效果、預測分數、SPC、多因子）都有可觀察的差異
+- 寫入期間關閉 journal / synchronous、逐日 executemany；完成後套用 zw_schema 遷移（時間欄位與索引）
+  並建立 production_rollup，與正式環境啟動後的狀態相同（--no-rollup 略過）
+- --aat 另產生 AAT DB（daily_capacity 為產線 × 天數，其餘表依天數縮放），搭配 AAT_DB_PATH 使用
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 大量寫入期間的設定（完成後還原為 DELETE journal；中斷時直接刪檔重跑）
+FAST_PRAGMAS = [
+    "PRAGMA journal_mode = OFF",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA cache_size = -262144",
+    "PRAGMA temp_store = MEMORY",
+]
+
+ZW_DDL = """
+CREATE TABLE production_log (batch_id TEXT PRIMARY KEY, timestamp TEXT, line_id TEXT, machine_id TEXT, operator_id TEXT,
+ supplier_id TEXT, product_id TEXT, shift TEXT, output_qty INTEGER, defect_qty INTEGER, defect_rate REAL, cycle_time REAL,
+ temperature REAL, vibration REAL, runtime_hours REAL);
+CREATE TABLE machine_status (id INTEGER PRIMARY KEY, timestamp TEXT, machine_id TEXT, runtime_hours REAL, temperature REAL, vibration REAL, maintenance_flag INTEGER);
+CREATE TABLE maintenance_log (id INTEGER PRIMARY KEY, timestamp TEXT, machine_id TEXT, maintenance_type TEXT, duration_hours REAL);
+CREATE TABLE supplier_master (supplier_id TEXT PRIMARY KEY, supplier_name TEXT, quality_z REAL, cost_multiplier REAL);
+CREATE TABLE cost_table (product_id TEXT PRIMARY KEY, unit_price REAL, unit_cost REAL, scrap_cost REAL);
+"""
+
+AAT_DDL = """
+CREATE TABLE _meta_config (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            data_type TEXT,
+            description TEXT
+        );
+CREATE TABLE _table_catalog (
+            table_id INTEGER PRIMARY KEY,
+            table_name TEXT NOT NULL,
+            category TEXT NOT NULL,
+            row_count INTEGER NOT NULL,
+            description TEXT,
+            key_field TEXT
+        );
+CREATE TABLE _join_relations (
+            relation_id INTEGER PRIMARY KEY,
+            source_table TEXT,
+            target_table TEXT,
+            source_key TEXT,
+            target_key TEXT,
+            join_type TEXT DEFAULT 'LEFT JOIN',
+            purpose TEXT
+        );
+CREATE TABLE daily_capacity (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            line_no TEXT NOT NULL,
+            line_type TEXT,
+            total_good INTEGER,
+            total_ng INTEGER,
+            yield_rate REAL,
+            defect_rate REAL,
+            runtime_hours REAL,
+            hourly_output INTEGER,
+            UNIQUE(date, line_no)
+        );
+CREATE INDEX idx_daily_date ON daily_capacity(date);
+CREATE TABLE scan_continuous_summary (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT,
+            line_no TEXT,
+            material_code TEXT,
+            start_time TEXT,
+            end_time TEXT,
+            scan_count INTEGER,
+            interval_seconds INTEGER,
+            UNIQUE(date, line_no, material_code, start_time)
+        );
+CREATE TABLE ticket_carton_impact (
+            ticket_no TEXT PRIMARY KEY,
+            carton_count INTEGER,
+            cartons TEXT,
+            create_date TEXT
+        );
+CREATE TABLE qr_trace_index (
+            qr_code TEXT PRIMARY KEY,
+            device_count INTEGER,
+            devices TEXT,
+            material_code TEXT,
+            record_count INTEGER,
+            result TEXT
+        );
+"""
+
+AAT_MATERIALS = ['8196-3528-S671', 'EE0C442301376', 'EE0C490501489', 'EE0C491101462']
+AAT_CATALOG_TABLES = 52
+
+
+def _shift(hour):
+    return 'A' if 8 <= hour < 16 else 'B' if 16 <= hour < 24 else 'C'
+
+
+def _open(path):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path, isolation_level=None)
+    for pragma in FAST_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def _finish(conn):
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.close()
+
+
+def generate_zw(path, days=60, machines=20, lines=4, operators=30, suppliers=5, products=4,
+                density=0.5, seed=7, start='2024-01-01', progress=None):
+    """產生正崴 DB（不含遷移與 rollup），回傳各表筆數"""
+    r = random.Random(seed)
+    conn = _open(path)
+    conn.executescript(ZW_DDL)
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO supplier_master VALUES (?, ?, ?, ?)", [
+        (f"S{i:02d}", f"Supplier {i}", r.uniform(-1, 1), r.uniform(0.95, 1.1))
+        for i in range(1, suppliers + 1)
+    ])
+    conn.executemany("INSERT INTO cost_table VALUES (?, ?, ?, ?)", [
+        (f"P{i:02d}", 10 + i, 6 + i, 3 + i * 0.5) for i in range(1, products + 1)
+    ])
+    conn.execute("COMMIT")
+
+    width = max(2, len(str(machines)))
+    fleet = [(f"M{i:0{width}d}", f"L{i % lines + 1:02d}") for i in range(1, machines + 1)]
+    runtime = {m: r.uniform(0, 300) for m, _ in fleet}
+    skip = 1 - density
+    first = date.fromisoformat(start)
+    counts = {'production_log': 0, 'machine_status': 0, 'maintenance_log': 0}
+    n = 0
+
+    for d in range(days):
+        day = (first + timedelta(days=d)).isoformat()
+        production, status, maintenance = [], [], []
+        for h in range(24):
+            shift = _shift(h)
+            prefix = f"{day} {h:02d}:"
+            for m, line in fleet:
+                if r.random() < skip:
+                    continue
+                ts = f"{prefix}{r.randint(0, 59):02d}:00"
+                rt = runtime[m] + 1
+                if rt > 450 or r.random() < 0.002:
+                    maintenance.append((ts, m, r.choice(['PM', 'BD']), r.uniform(1, 5)))
+                    rt = 0
+                runtime[m] = rt
+                temp = r.gauss(64, 3)
+                vib = r.gauss(1.8, 0.5) + rt / 400
+                out = r.randint(200, 600)
+                rate = min(0.5, max(0, 0.02 + (temp > 66) * 0.05 + (vib > 2.5) * 0.08
+                                    + (rt > 300) * 0.06 + r.gauss(0, 0.01)))
+                defect = int(out * rate)
+                n += 1
+                production.append((
+                    f"B{n:08d}", ts, line, m,
+                    f"OP{r.randint(1, operators):03d}",
+                    f"S{r.randint(1, suppliers):02d}",
+                    f"P{r.randint(1, products):02d}",
+                    shift, out, defect, round(defect / out, 4), round(r.uniform(0.85, 1.05), 3),
+                    round(temp, 2), round(vib, 3), round(rt, 1)
+                ))
+                status.append((ts, m, rt, temp, vib, int(rt > 300)))
+
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO production_log VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", production)
+        conn.executemany(
+            "INSERT INTO machine_status (timestamp, machine_id, runtime_hours, temperature, vibration, "
+            "maintenance_flag) VALUES (?, ?, ?, ?, ?, ?)", status)
+        conn.executemany(
+            "INSERT INTO maintenance_log (timestamp, machine_id, maintenance_type, duration_hours) "
+            "VALUES (?, ?, ?, ?)", maintenance)
+        conn.execute("COMMIT")
+        counts['production_log'] += len(production)
+        counts['machine_status'] += len(status)
+        counts['maintenance_log'] += len(maintenance)
+        if progress:
+            progress(d + 1, days, counts['production_log'])
+
+    _finish(conn)
+    return counts
+
+
+def generate_aat(path, days=183, lines=4, seed=7, start='2024-04-01'):
+    """產生 AAT DB，回傳各表筆數"""
+    r = random.Random(seed)
+    conn = _open(path)
+    conn.executescript(AAT_DDL)
+    first = date.fromisoformat(start)
+    dates = [(first + timedelta(days=d)).isoformat() for d in range(days)]
+    line_nos = [str(906 + i) for i in range(lines)]
+    line_config = {
+        line: {"type": '成型段' if i % 4 == 3 else '組裝段', "base_yield": round(r.uniform(95.5, 96.9), 2)}
+        for i, line in enumerate(line_nos)
+    }
+
+    capacity = []
+    for day in dates:
+        for line in line_nos:
+            config = line_config[line]
+            total = r.randint(1_000_000, 8_800_000)
+            yield_rate = round(min(99.5, max(86.0, r.gauss(config['base_yield'], 0.9))), 2)
+            good = int(total * yield_rate / 100)
+            runtime_hours = round(r.uniform(8, 22), 1)
+            capacity.append((day, line, config['type'], good, total - good, yield_rate,
+                             round(100 - yield_rate, 2), runtime_hours, int(total / runtime_hours)))
+
+    scans = []
+    for _ in range(max(1, days * lines // 20)):
+        begin = r.randint(0, 86399 - 60)
+        interval = r.randint(12, 57)
+        scans.append((
+            r.choice(dates), r.choice(line_nos), r.choice(AAT_MATERIALS),
+            f"{begin // 3600:02d}:{begin // 60 % 60:02d}:{begin % 60:02d}",
+            f"{(begin + interval) // 3600:02d}:{(begin + interval) // 60 % 60:02d}:{(begin + interval) % 60:02d}",
+            r.randint(2, 5), interval
+        ))
+
+    tickets = []
+    for i in range(max(1, days * 55 // 100)):
+        cartons = [f"CN0A244{r.randint(0, 9999999):07d}" for _ in range(r.randint(1, 5))]
+        tickets.append((f"JN0A244{i:07d}", len(cartons), json.dumps(cartons), r.choice(dates)))
+
+    devices = [f"Device_{n}" for n in (10, 11, 12, 13, 15, 16)]
+    traces = []
+    for i in range(days * 27 // 10):
+        count = r.randint(4, 6)
+        traces.append((f"ZB2H7Q0S5MA{i:07d}", count, json.dumps(devices[:count]),
+                       r.choice(AAT_MATERIALS[:3]), r.randint(20, 100), 'NG' if r.random() < 0.22 else 'OK'))
+
+    # 原始 IoT 表不存於 DB，只記錄名稱與筆數（/api/stats 的表數量與總筆數）
+    catalog = [
+        (i, f"{'iot' if i <= 42 else 'bom' if i <= 51 else 'derived'}_table_{i:02d}",
+         'iot' if i <= 42 else 'bom' if i <= 51 else 'derived',
+         r.randint(1_000, 30_000_000) * days // 183, '', 'code5')
+        for i in range(1, AAT_CATALOG_TABLES + 1)
+    ]
+    meta = [
+        ('version', '2.0', 'str', '合成資料'),
+        ('start_date', dates[0], 'date', '數據起始'),
+        ('end_date', dates[-1], 'date', '數據結束'),
+        ('total_days', str(days), 'int', '總天數'),
+        ('total_tables', str(len(catalog)), 'int', '總表數'),
+        ('total_rows', str(sum(row[3] for row in catalog)), 'int', '總筆數'),
+        ('lines', json.dumps(line_nos), 'json', '產線'),
+        ('line_config', json.dumps(line_config), 'json', '產線配置'),
+        ('actual_rows', str(len(capacity) + len(scans) + len(tickets) + len(traces)), 'int', '實際存儲'),
+    ]
+
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO _meta_config VALUES (?, ?, ?, ?)", meta)
+    conn.executemany("INSERT INTO _table_catalog VALUES (?, ?, ?, ?, ?, ?)", catalog)
+    conn.executemany(
+        "INSERT INTO daily_capacity (date, line_no, line_type, total_good, total_ng, yield_rate, defect_rate, "
+        "runtime_hours, hourly_output) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", capacity)
+    conn.executemany(
+        "INSERT OR IGNORE INTO scan_continuous_summary (date, line_no, material_code, start_time, end_time, "
+        "scan_count, interval_seconds) VALUES (?, ?, ?, ?, ?, ?, ?)", scans)
+    conn.executemany("INSERT INTO ticket_carton_impact VALUES (?, ?, ?, ?)", tickets)
+    conn.executemany("INSERT INTO qr_trace_index VALUES (?, ?, ?, ?, ?, ?)", traces)
+    conn.execute("COMMIT")
+    conn.execute("ANALYZE")
+    _finish(conn)
+    return {
+        'daily_capacity': len(capacity),
+        'scan_continuous_summary': len(scans),
+        'ticket_carton_impact': len(tickets),
+        'qr_trace_index': len(traces),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=60, help='天數（60 ~ 1095）')
+    parser.add_argument('--machines', type=int, default=20, help='機台數（10 ~ 500）')
+    parser.add_argument('--lines', type=int, default=4)
+    parser.add_argument('--operators', type=int, default=30)
+    parser.add_argument('--suppliers', type=int, default=5)
+    parser.add_argument('--products', type=int, default=4)
+    parser.add_argument('--density', type=float, default=0.5, help='每台機台每小時有生產批次的機率')
+    parser.add_argument('--start', default='2024-01-01', help='起始日期')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--zw', default=os.path.join(ROOT, 'data', 'zw_poc_fake_60d.db'), help='正崴 DB 輸出路徑')
+    parser.add_argument('--aat', help='另產生 AAT DB 到此路徑')
+    parser.add_argument('--aat-days', type=int, help='AAT 天數（預設同 --days）')
+    parser.add_argument('--aat-lines', type=int, default=4)
+    parser.add_argument('--no-rollup', action='store_true', help='不建立 production_rollup')
+    parser.add_argument('--force', action='store_true', help='覆蓋已存在的檔案')
+    args = parser.parse_args()
+
+    if args.days < 1 or args.machines < 1 or args.lines < 1 or not 0 < args.density <= 1:
+        parser.error("--days / --machines / --lines 需大於 0，--density 需在 (0, 1]")
+    for path in filter(None, [args.zw, args.aat]):
+        if os.path.exists(path) and not args.force:
+            parser.error(f"{path} 已存在（加 --force 覆蓋）")
+
+    sys.path.insert(0, ROOT)
+    from zw_rollup import refresh_rollups
+    from zw_schema import migrate
+
+    started = time.time()
+
+    def progress(done, total, rows):
+        if done == total or done % 30 == 0:
+            elapsed = time.time() - started
+            print(f"\r  {done}/{total} 天  production_log {rows:,} 筆  {rows / max(elapsed, 1e-9):,.0f} 筆/秒",
+                  end='', file=sys.stderr, flush=True)
+
+    print(f"正崴 DB: {args.zw}（{args.days} 天 × {args.machines} 台，seed={args.seed}）")
+    counts = generate_zw(args.zw, days=args.days, machines=args.machines, lines=args.lines,
+                         operators=args.operators, suppliers=args.suppliers, products=args.products,
+                         density=args.density, seed=args.seed, start=args.start, progress=progress)
+    print(file=sys.stderr)
+    for table, count in counts.items():
+        print(f"  {table}: {count:,}")
+    migrate(args.zw)
+    print(f"  遷移完成（{time.time() - started:.1f}s）")
+    if not args.no_rollup:
+        print(f"  production_rollup：彙總 {refresh_rollups(args.zw):,} 筆（{time.time() - started:.1f}s）")
+
+    if args.aat:
+        days = args.aat_days or args.days
+        print(f"AAT DB: {args.aat}（{days} 天 × {args.aat_lines} 條產線）")
+        for table, count in generate_aat(args.aat, days=days, lines=args.aat_lines, seed=args.seed).items():
+            print(f"  {table}: {count:,}")
+    print(f"完成（{time.time() - started:.1f}s）")
+
+
+if __name__ == '__main__':
+    main()
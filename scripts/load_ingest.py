@@ -0,0 +1,137 @@
+"""
+寫入壓力測試：POST /api/zw_ingest 持續寫入 + 同時查詢
+==================================================
+用法：python scripts/load_ingest.py [--rows 200000] [--batch 5000] [--db PATH] [--target 10000]
+
+- 複製正崴 DB 至暫存目錄後寫入（不動原檔；--db 指定時直接使用該檔）
+- 以 Flask test client 在同一行程內送出 JSON 批次（含 JSON 編碼 / 驗證 / rollup 更新）
+- 另一執行緒持續查詢帶篩選的 /api/zw_stats，量測寫入期間的讀取延遲
+- 持續寫入速度低於 --target rows/s 時以 exit code 1 結束
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_rows(start_index, count, rng, base_time):
+    rows = []
+    for i in range(start_index, start_index + count):
+        ts = base_time + timedelta(seconds=i * 3)
+        machine = rng.randint(1, 20)
+        output = rng.randint(200, 600)
+        defect = int(output * max(0.0, rng.gauss(0.05, 0.02)))
+        rows.append({
+            "batch_id": f"LOAD{i:010d}",
+            "timestamp": ts.strftime('%Y-%m-%d %H:%M:%S'),
+            "line_id": f"L{machine % 4 + 1:02d}",
+            "machine_id": f"M{machine:02d}",
+            "operator_id": f"OP{rng.randint(1, 30):03d}",
+            "supplier_id": f"S{rng.randint(1, 5):02d}",
+            "product_id": f"P{rng.randint(1, 4):02d}",
+            "shift": 'A' if 8 <= ts.hour < 16 else 'B' if ts.hour >= 16 else 'C',
+            "output_qty": output,
+            "defect_qty": defect,
+            "cycle_time": round(rng.uniform(0.85, 1.05), 3),
+            "temperature": round(rng.gauss(64, 3), 2),
+            "vibration": round(rng.gauss(1.8, 0.5), 3),
+            "runtime_hours": round(rng.uniform(0, 450), 1),
+        })
+    return rows
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--batch', type=int, default=5000)
+    parser.add_argument('--db', help='直接寫入此 DB（預設複製 data/zw_poc_fake_60d.db）')
+    parser.add_argument('--target', type=float, default=10000, help='最低持續寫入 rows/s')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    tmpdir = None
+    if args.db:
+        db = args.db
+    else:
+        tmpdir = tempfile.mkdtemp(prefix='zw_ingest_')
+        db = os.path.join(tmpdir, 'zw.db')
+        shutil.copy(os.path.join(ROOT, 'data', 'zw_poc_fake_60d.db'), db)
+    os.environ['ZW_DB_PATH'] = db
+    os.environ.setdefault('PRECOMPUTE_INTERVAL', '0')
+    os.environ.setdefault('ZW_INGEST_TOKEN', 'load-test')
+    sys.path.insert(0, ROOT)
+    from app import app
+
+    rng = random.Random(args.seed)
+    base_time = datetime(2030, 1, 1)
+    batches = [
+        json.dumps(make_rows(i, min(args.batch, args.rows - i), rng, base_time))
+        for i in range(0, args.rows, args.batch)
+    ]
+
+    # 寫入期間持續讀取
+    stop = threading.Event()
+    read_latency = []
+
+    def reader():
+        client = app.test_client()
+        lines = ['L01', 'L02', 'L03', 'L04']
+        n = 0
+        while not stop.is_set():
+            start = time.perf_counter()
+            resp = client.get(f'/api/zw_stats?line_id={lines[n % 4]}&start=2024-02-01')
+            read_latency.append((time.perf_counter() - start) * 1000)
+            assert resp.status_code == 200, resp.data
+            n += 1
+
+    client = app.test_client()
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+
+    write_latency = []
+    inserted = 0
+    start = time.perf_counter()
+    for i, body in enumerate(batches):
+        t0 = time.perf_counter()
+        resp = client.post(f'/api/zw_ingest?batch_key=load-{args.seed}-{i}', data=body,
+                           content_type='application/json',
+                           headers={'Authorization': f"Bearer {os.environ['ZW_INGEST_TOKEN']}"})
+        write_latency.append((time.perf_counter() - t0) * 1000)
+        assert resp.status_code in (200, 201), resp.data
+        inserted += resp.get_json()['inserted']
+    elapsed = time.perf_counter() - start
+    stop.set()
+    thread.join()
+
+    rate = args.rows / elapsed
+    print(f"DB: {db}")
+    print(f"寫入: {args.rows:,} 筆 / {len(batches)} 批，實際新增 {inserted:,} 筆，{elapsed:.2f}s")
+    print(f"持續寫入: {rate:,.0f} rows/s（目標 {args.target:,.0f}）")
+    print(f"每批延遲: p50 {percentile(write_latency, 50):.1f}ms  p95 {percentile(write_latency, 95):.1f}ms")
+    print(f"寫入期間讀取: {len(read_latency)} 次  p50 {percentile(read_latency, 50):.1f}ms  "
+          f"p95 {percentile(read_latency, 95):.1f}ms  max {max(read_latency):.1f}ms")
+
+    if tmpdir:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    if rate < args.target:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+慢查詢紀錄（選用）
+================
+- SLOW_QUERY_MS 設定門檻（毫秒，未設定或 0 = 停用）；連線池連線的單一 SQL（execute + fetch）超過門檻時記錄
+- 每筆紀錄：SQL、綁定參數、耗時、路由（請求外為執行緒名稱）、EXPLAIN QUERY PLAN
+- 標記全表掃描（SCAN 未使用索引，不含 CTE / 子查詢的中間結果）與 GROUP BY / ORDER BY / DISTINCT 的暫存 B-tree
+- 最近 SLOW_QUERY_BUFFER 筆保留於記憶體（/api/_debug/slow_queries），
+  並逐行寫入 JSONL（SLOW_QUERY_FILE，超過 SLOW_QUERY_FILE_BYTES 輪替，保留 SLOW_QUERY_FILE_BACKUPS 份）
+- 同一 SQL 的查詢計畫只 EXPLAIN 一次（快取 PLAN_CACHE_SIZE 筆）；門檻以下的查詢只多一次比較
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 0))
+SLOW_QUERY_BUFFER = int(os.environ.get('SLOW_QUERY_BUFFER', 200))
+SLOW_QUERY_FILE = os.environ.get(
+    'SLOW_QUERY_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'slow_queries.jsonl'))
+SLOW_QUERY_FILE_BYTES = int(os.environ.get('SLOW_QUERY_FILE_BYTES', 10 * 1024 * 1024))
+SLOW_QUERY_FILE_BACKUPS = int(os.environ.get('SLOW_QUERY_FILE_BACKUPS', 3))
+PLAN_CACHE_SIZE = 256
+
+log = logging.getLogger(__name__)
+
+_SCAN_RE = re.compile(r'^SCAN (\S+)(.*)$')
+_INTERMEDIATE_RE = re.compile(r'^(?:MATERIALIZE|CO-ROUTINE) (\S+)')
+_TEMP_BTREE_RE = re.compile(r'^USE TEMP B-TREE FOR (.+)$')
+
+
+def explain(conn, sql, params):
+    """
+    EXPLAIN QUERY PLAN：回傳 (依層級縮排的計畫, 全表掃描的表/別名, 暫存 B-tree 用途)
+    以 sqlite3.Connection.execute 執行，不計入請求計量
+    """
+    rows = sqlite3.Connection.execute(conn, f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    depth = {0: -1}
+    plan, scans, btrees, intermediate = [], [], [], set()
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        plan.append('  ' * depth[node] + detail)
+        m = _INTERMEDIATE_RE.match(detail)
+        if m:
+            intermediate.add(m.group(1))
+            continue
+        m = _SCAN_RE.match(detail)
+        if m and 'USING' not in m.group(2) and m.group(1) not in intermediate and m.group(1) != 'CONSTANT':
+            scans.append(m.group(1))
+            continue
+        m = _TEMP_BTREE_RE.match(detail)
+        if m:
+            btrees.append(m.group(1))
+    return plan, scans, btrees
+
+
+def _jsonable(params):
+    if isinstance(params, dict):
+        return {k: _jsonable(v) for k, v in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [_jsonable(v) for v in params]
+    if isinstance(params, (bytes, bytearray, memoryview)):
+        return f"<{len(params)} bytes>"
+    return params
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms=SLOW_QUERY_MS, buffer=SLOW_QUERY_BUFFER, path=SLOW_QUERY_FILE,
+                 max_bytes=SLOW_QUERY_FILE_BYTES, backups=SLOW_QUERY_FILE_BACKUPS):
+        self.threshold = threshold_ms / 1000
+        self.enabled = threshold_ms > 0
+        self.path = path if self.enabled else None
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._entries = deque(maxlen=buffer)
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+        self._writer = None
+        self.recorded = 0
+        self.explain_errors = 0
+
+    def _file_logger(self):
+        """JSONL 輪替檔（首次寫入時開啟；目錄無法寫入時只保留記憶體內紀錄）"""
+        if self._writer is not None or not self.path:
+            return self._writer
+        with self._lock:
+            if self._writer is None and self.path:
+                try:
+                    os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                    handler = logging.handlers.RotatingFileHandler(
+                        self.path, maxBytes=self.max_bytes, backupCount=self.backups, encoding='utf-8')
+                except OSError as e:
+                    log.warning("slow query file disabled: %s", e)
+                    self.path = None
+                    return None
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                writer = logging.getLogger(f"{__name__}.file")
+                writer.propagate = False
+                writer.setLevel(logging.INFO)
+                writer.addHandler(handler)
+                self._writer = writer
+        return self._writer
+
+    def _plan(self, conn, sql, params):
+        with self._lock:
+            cached = self._plans.get(sql)
+            if cached is not None:
+                self._plans.move_to_end(sql)
+                return cached
+        try:
+            result = explain(conn, sql, params)
+        except sqlite3.Error as e:
+            self.explain_errors += 1
+            return [f"EXPLAIN 失敗：{e}"], [], []
+        with self._lock:
+            self._plans[sql] = result
+            while len(self._plans) > PLAN_CACHE_SIZE:
+                self._plans.popitem(last=False)
+        return result
+
+    def record(self, conn, sql, params, elapsed, route):
+        """（查詢所在執行緒）記錄一筆慢查詢"""
+        plan, scans, btrees = self._plan(conn, sql, params)
+        entry = {
+            "time": datetime.now().isoformat(timespec='milliseconds'),
+            "duration_ms": round(elapsed * 1000, 2),
+            "route": route or threading.current_thread().name,
+            "sql": ' '.join(sql.split()),
+            "params": _jsonable(params),
+            "plan": plan,
+            "full_scans": scans,
+            "temp_btrees": btrees,
+        }
+        with self._lock:
+            self._entries.append(entry)
+            self.recorded += 1
+        writer = self._file_logger()
+        if writer is not None:
+            writer.info(json.dumps(entry, ensure_ascii=False, default=str))
+
+    def recent(self, limit=None, flagged=False):
+        """最近的紀錄（新到舊）；flagged=True 只回傳有全表掃描或暫存 B-tree 的紀錄"""
+        with self._lock:
+            entries = list(self._entries)
+        entries.reverse()
+        if flagged:
+            entries = [e for e in entries if e['full_scans'] or e['temp_btrees']]
+        return entries[:limit] if limit else entries
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "threshold_ms": self.threshold * 1000,
+            "recorded": self.recorded,
+            "buffered": len(self._entries),
+            "file": self.path,
+            "explain_errors": self.explain_errors,
+        }
@@ -0,0 +1,44 @@
+"""
+bulk_load：空的來源檔
+====================
+- 空檔（無標題列）載入無次要索引的表時不會寫入 checkpoint，完成後不得因移除 checkpoint 失敗
+"""
+
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bulk_load import BulkLoader  # noqa: E402
+
+QR_TRACE_INDEX_DDL = """
+CREATE TABLE qr_trace_index (
+    qr_code TEXT PRIMARY KEY, device_count INTEGER, devices TEXT,
+    material_code TEXT, record_count INTEGER, result TEXT
+)
+"""
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "aat.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute(QR_TRACE_INDEX_DDL)
+    return path
+
+
+@pytest.mark.parametrize("content", ["", "qr_code,device_count,devices,material_code,record_count,result\n"])
+def test_empty_source_without_secondary_indexes(db, tmp_path, content):
+    source = tmp_path / "empty.csv"
+    source.write_text(content, encoding='utf-8')
+    loader = BulkLoader(db, 'qr_trace_index')
+
+    result = loader.run([str(source)])
+
+    assert result["loaded"] == 0
+    assert result["rows"] == 0
+    assert not os.path.exists(loader.checkpoint)
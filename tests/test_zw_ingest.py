@@ -0,0 +1,93 @@
+"""
+zw_ingest：batch_key 冪等
+========================
+- 中途失敗的 batch 整批回滾，以同一 batch_key 重送不會重複寫入
+- 兩個 Ingestor（模擬兩個 worker）同時送出同一 batch_key 只寫入一次
+"""
+
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from zw_ingest import Ingestor  # noqa: E402
+
+MACHINE_STATUS_DDL = """
+CREATE TABLE machine_status (
+    id INTEGER PRIMARY KEY, timestamp TEXT, machine_id TEXT,
+    runtime_hours REAL, temperature REAL, vibration REAL, maintenance_flag INTEGER
+)
+"""
+
+
+def _rows(n, boom_at=None):
+    return [
+        {
+            "timestamp": f"2026-01-01 00:{i:02d}:00",
+            "machine_id": "BOOM" if i == boom_at else f"M{i % 3:02d}",
+            "temperature": 65.0,
+            "vibration": 1.2,
+        }
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "ingest.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute(MACHINE_STATUS_DDL)
+    return path
+
+
+def _count(path, sql="SELECT COUNT(*) FROM machine_status"):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(sql).fetchone()[0]
+
+
+def test_batch_failed_midway_is_rolled_back_and_retry_writes_once(db):
+    with sqlite3.connect(db) as conn:
+        conn.execute("CREATE TRIGGER boom BEFORE INSERT ON machine_status "
+                     "WHEN NEW.machine_id = 'BOOM' BEGIN SELECT RAISE(ABORT, 'boom'); END")
+    ingestor = Ingestor(db, chunk=2)
+
+    # 第 3 段失敗：前兩段不得留下
+    with pytest.raises(sqlite3.IntegrityError):
+        ingestor.ingest('machine_status', _rows(7, boom_at=5), batch_key='k1', refresh=False)
+    assert _count(db) == 0
+    assert _count(db, "SELECT COUNT(*) FROM _ingest_batches") == 0
+
+    with sqlite3.connect(db) as conn:
+        conn.execute("DROP TRIGGER boom")
+    result = ingestor.ingest('machine_status', _rows(7), batch_key='k1', refresh=False)
+    assert result["replayed"] is False
+    assert result["inserted"] == 7
+    assert _count(db) == 7
+
+    replay = ingestor.ingest('machine_status', _rows(7), batch_key='k1', refresh=False)
+    assert replay["replayed"] is True
+    assert replay["inserted"] == 7
+    assert _count(db) == 7
+
+
+def test_same_batch_key_from_two_workers_writes_once(db):
+    ingestors = [Ingestor(db, chunk=2), Ingestor(db, chunk=2)]
+    barrier = threading.Barrier(len(ingestors))
+    results = []
+
+    def send(ingestor):
+        barrier.wait()
+        results.append(ingestor.ingest('machine_status', _rows(9), batch_key='k2', refresh=False))
+
+    threads = [threading.Thread(target=send, args=(ingestor,)) for ingestor in ingestors]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(result["replayed"] for result in results) == [False, True]
+    assert _count(db) == 9
@@ -0,0 +1,126 @@
+"""
+zw_spc：管制界限與 Nelson 規則
+============================
+- 子群組大小固定為 4、R = 2·d2(4)：σ = 2、σ/√n = 1，z 即為與中心線的差
+- 各規則以短序列驗證觸發的索引（偏差總和為 0，中心線固定為 10）
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from zw_spc import analyze, d2  # noqa: E402
+
+N = 4
+BASE = 10.0
+
+
+def _points(devs, n=N, defect=5, output=100):
+    assert abs(sum(devs)) < 1e-9, "偏差總和需為 0（中心線 = BASE）"
+    return [
+        {"date": f"2026-01-{i + 1:02d}", "n": n, "xbar": BASE + d, "r": 2 * d2(n),
+         "defect": defect, "output": output}
+        for i, d in enumerate(devs)
+    ]
+
+
+def _flagged(devs, rule):
+    detail = analyze(_points(devs), include_points=True)['detail']
+    return [i for i, point in enumerate(detail) if rule in point['rules']]
+
+
+@pytest.mark.parametrize("rule, devs, expected", [
+    # 1：超出 3σ（兩側）
+    (1, [0, 0, 3.5, 0, -3.5, 0], [2, 4]),
+    # 2：連續 9 點同側
+    (2, [0.5] * 10 + [-5.0], [8, 9]),
+    # 3：連續 6 點遞增（5 次上升）
+    (3, [-0.5, -0.3, -0.1, 0.1, 0.3, 0.5, 0.0], [5]),
+    # 4：連續 14 點交替升降
+    (4, [0.5, -0.5] * 8, [13, 14, 15]),
+    # 5：3 點中 2 點超出 2σ（同側）
+    (5, [0, 2.5, 0, 2.5, 0, -5.0], [3]),
+    # 6：5 點中 4 點超出 1σ（同側）
+    (6, [1.5, 1.5, 0, 1.5, 1.5, -6.0], [4]),
+    # 7：連續 15 點在 1σ 內
+    (7, [0.5, -0.5] * 8, [14, 15]),
+    # 8：連續 8 點在 1σ 外且兩側都有
+    (8, [1.5, -1.5] * 4, [7]),
+    # 8：同側 8 點不觸發
+    (8, [1.5] * 8 + [0, -12.0], []),
+])
+def test_nelson_rules(rule, devs, expected):
+    assert _flagged(devs, rule) == expected
+
+
+def test_rule_counts_and_out_of_control():
+    result = analyze(_points([0, 0, 3.5, 0, -3.5, 0]), recent=1)
+    assert result['violations'] == {"1": 2}
+    assert result['out_of_control'] is False
+    # recent：最後 2 個子群組內有訊號即為失控
+    result = analyze(_points([0, 0, 3.5, 0, -3.5, 0]), recent=2)
+    assert result['out_of_control'] is True
+    assert result['recent_signals'] == [{"date": "2026-01-05", "signals": ["rule1"]}]
+
+
+def test_xbar_and_r_limits():
+    points = _points([1.0, -1.0, 0.0, 0.5, -0.5])
+    points[2]['n'] = 9
+    points[2]['r'] = 2 * d2(9)
+    result = analyze(points, include_points=True)
+    first, wide = result['detail'][0], result['detail'][2]
+
+    assert result['sigma'] == pytest.approx(2.0)
+    assert first['ucl'] == pytest.approx(13.0)
+    assert first['lcl'] == pytest.approx(7.0)
+    # n = 9：σ/√n = 2/3
+    assert wide['ucl'] - result['center'] == pytest.approx(2.0, abs=1e-3)
+    assert first['r_center'] == pytest.approx(2.059 * 2, abs=1e-3)
+    assert first['r_ucl'] == pytest.approx((2.059 + 3 * 0.880) * 2, abs=1e-3)
+    assert first['r_lcl'] == 0.0
+
+
+def test_individuals_sigma_from_moving_range():
+    points = [{"date": f"d{i}", "n": 1, "xbar": x, "r": None, "defect": 0, "output": 0}
+              for i, x in enumerate([10.0, 12.0, 10.0, 12.0])]
+    assert analyze(points)['sigma'] == pytest.approx(2 / 1.128, abs=1e-3)
+
+
+def test_p_chart_limits():
+    detail = analyze(_points([0.5, -0.5]), include_points=True)['detail']
+    p_sigma = (0.05 * 0.95 / 100) ** 0.5
+    assert detail[0]['p'] == pytest.approx(5.0)
+    assert detail[0]['p_ucl'] == pytest.approx((0.05 + 3 * p_sigma) * 100, abs=1e-3)
+    assert detail[0]['p_lcl'] == 0.0
+
+
+def test_ewma_limits_widen_to_steady_state():
+    detail = analyze(_points([0.5, -0.5] * 20), include_points=True)['detail']
+    # λ = 0.2、L = 3、σ/√n̄ = 1：第一點 3·√(λ/(2-λ)·(1-(1-λ)²)) = 0.6，穩態 3·√(λ/(2-λ)) = 1
+    assert detail[0]['ewma_ucl'] - BASE == pytest.approx(0.6, abs=1e-3)
+    assert detail[-1]['ewma_ucl'] - BASE == pytest.approx(1.0, abs=1e-3)
+    assert detail[0]['ewma'] == pytest.approx(BASE + 0.2 * 0.5, abs=1e-3)
+
+
+def test_cusum_accumulates_and_signals():
+    result = analyze(_points([1.5] * 6 + [-9.0]), include_points=True)
+    # k = 0.5：每點累積 1.0，第 6 點超過 h = 5
+    assert [p['cusum_pos'] for p in result['detail'][:6]] == pytest.approx([1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
+    assert result['detail'][6]['cusum_pos'] == 0.0
+    assert result['detail'][6]['cusum_neg'] == pytest.approx(8.5)
+    assert result['signals']['cusum'] == 2
+
+
+def test_constant_series_in_control():
+    # σ > 0：全部落在 1σ 內，第 15 點起觸發規則 7
+    assert _flagged([0.0] * 20, 7) == [14, 15, 16, 17, 18, 19]
+    # σ = 0（全距皆為 0）：不判定任何規則
+    points = _points([0.0] * 20)
+    for p in points:
+        p['r'] = 0.0
+    result = analyze(points)
+    assert result['violations'] == {}
+    assert result['signals'] == {}
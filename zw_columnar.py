@@ -0,0 +1,373 @@
+"""
+production_log 欄式快照（NumPy 向量化引擎，選用）
+================================================
+- 類別欄位（line / machine / operator / supplier / shift / product）存為整數代碼 + 字典
+- 數值欄位存為 float64 / int 陣列
+- 持久化為 .npy，以 mmap 載入，gunicorn 各 worker 共用同一份 page cache
+- 以 production_log 最大 rowid（加上格式版本）作為版本；有新資料時只讀取上一版之後的列附加在後
+  （production_log 只新增不修改，字典代碼沿用），MAX(rowid) 變小（DB 被置換）時才整份重建
+- 附加的版本只保留於記憶體，累積超過 ZW_COLUMNAR_PERSIST_ROWS（預設 100000）列時再寫回磁碟；
+  新啟動的 worker 載入最近一份磁碟快照後附加其後的列
+- 分段統計以 digitize + bincount 一次完成，取代逐列 CASE WHEN 掃描
+
+未安裝 numpy 時 available() 為 False，端點維持 SQLite 查詢。
+"""
+
+import json
+import os
+import shutil
+import threading
+from decimal import Decimal, ROUND_HALF_UP
+
+try:
+    import numpy as np
+except ImportError:  # 選用依賴
+    np = None
+
+CATEGORY_COLUMNS = ('line_id', 'machine_id', 'operator_id', 'supplier_id', 'shift', 'product_id')
+FLOAT_COLUMNS = ('temperature', 'vibration', 'runtime_hours', 'defect_rate', 'cycle_time')
+INT_COLUMNS = ('output_qty', 'defect_qty', 'day', 'hour')
+
+# day 以 1970-01-01 起算的天數存放
+_SELECT = f"""
+    SELECT {', '.join(CATEGORY_COLUMNS)}, {', '.join(FLOAT_COLUMNS)},
+           output_qty, defect_qty,
+           CAST(julianday(DATE(timestamp)) - 2440587.5 AS INTEGER),
+           CAST(strftime('%H', timestamp) AS INTEGER)
+    FROM production_log
+    WHERE rowid > ? AND rowid <= ?
+    ORDER BY rowid
+"""
+
+CHUNK_ROWS = 65536
+COLUMNAR_PERSIST_ROWS = int(os.environ.get('ZW_COLUMNAR_PERSIST_ROWS', 100000))
+
+# 欄位組成變動時遞增，舊格式快照目錄會被視為不存在並清除
+FORMAT_VERSION = 2
+
+
+def _snapshot_name(version):
+    return f"snapshot-v{FORMAT_VERSION}-{version}"
+
+
+def available():
+    return np is not None
+
+
+class ColumnarSnapshot:
+    """production_log 的欄式快照"""
+
+    def __init__(self, version, columns, vocab, saved_version=None):
+        self.version = version
+        self.columns = columns
+        self.vocab = vocab
+        self.size = len(columns['defect_rate'])
+        self.saved_version = saved_version   # 已寫入磁碟的版本（附加的列尚未寫入）
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    # ----------------------------------------------------------
+    # 建立 / 持久化
+    # ----------------------------------------------------------
+
+    @classmethod
+    def build(cls, conn, version, after=0, vocab=None):
+        """
+        自 SQLite 分批讀取 rowid 介於 (after, version] 的列建立快照（不一次 fetchall）
+        vocab 為既有字典時沿用其代碼，新值接在後面
+        """
+        from array import array
+
+        codes = {name: array('i') for name in CATEGORY_COLUMNS}
+        lookup = {
+            name: {value: i for i, value in enumerate(vocab[name])} if vocab else {}
+            for name in CATEGORY_COLUMNS
+        }
+        floats = {name: array('d') for name in FLOAT_COLUMNS}
+        ints = {name: array('q') for name in INT_COLUMNS}
+        nan = float('nan')
+
+        cursor = conn.execute(_SELECT, (after, version))
+        n_cat = len(CATEGORY_COLUMNS)
+        n_float = len(FLOAT_COLUMNS)
+        while True:
+            rows = cursor.fetchmany(CHUNK_ROWS)
+            if not rows:
+                break
+            for i, name in enumerate(CATEGORY_COLUMNS):
+                table = lookup[name]
+                codes[name].extend(table.setdefault(row[i], len(table)) for row in rows)
+            for i, name in enumerate(FLOAT_COLUMNS, n_cat):
+                floats[name].extend(nan if row[i] is None else row[i] for row in rows)
+            for i, name in enumerate(INT_COLUMNS, n_cat + n_float):
+                ints[name].extend(row[i] or 0 for row in rows)
+
+        columns = {}
+        for name in CATEGORY_COLUMNS:
+            columns[name] = np.frombuffer(codes[name], dtype=np.int32).copy()
+        for name in FLOAT_COLUMNS:
+            columns[name] = np.frombuffer(floats[name], dtype=np.float64).copy()
+        for name in INT_COLUMNS:
+            columns[name] = np.frombuffer(ints[name], dtype=np.int64).copy()
+        vocab = {
+            name: [value for value, _ in sorted(lookup[name].items(), key=lambda kv: kv[1])]
+            for name in CATEGORY_COLUMNS
+        }
+        return cls(version, columns, vocab)
+
+    def append(self, conn, version):
+        """附加 rowid 介於 (self.version, version] 的新列，回傳新快照（本身不變，讀取中的請求不受影響）"""
+        part = ColumnarSnapshot.build(conn, version, after=self.version, vocab=self.vocab)
+        columns = {
+            name: np.concatenate((np.asarray(values), part.columns[name]))
+            for name, values in self.columns.items()
+        }
+        return ColumnarSnapshot(version, columns, part.vocab, self.saved_version)
+
+    def save(self, directory):
+        """寫入暫存目錄後 rename，確保其他 worker 不會讀到半成品"""
+        final = os.path.join(directory, _snapshot_name(self.version))
+        if os.path.isdir(final):
+            return final
+        tmp = f"{final}.tmp-{os.getpid()}"
+        os.makedirs(tmp, exist_ok=True)
+        for name, values in self.columns.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), values)
+        with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({"version": self.version, "size": self.size, "vocab": self.vocab},
+                      f, ensure_ascii=False)
+        try:
+            os.rename(tmp, final)
+        except OSError:
+            # 其他 worker 已先完成
+            shutil.rmtree(tmp, ignore_errors=True)
+        return final
+
+    @classmethod
+    def load(cls, directory, version):
+        path = os.path.join(directory, _snapshot_name(version))
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        columns = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+            for name in CATEGORY_COLUMNS + FLOAT_COLUMNS + INT_COLUMNS
+        }
+        return cls(meta['version'], columns, meta['vocab'], meta['version'])
+
+    # ----------------------------------------------------------
+    # 向量化聚合
+    # ----------------------------------------------------------
+
+    def cells(self, keys):
+        """
+        多維分組：keys 為 [(codes, 組數)]
+        回傳 (cell 代碼, cell 總數)；cell = k1 * n2 * n3 + k2 * n3 + k3
+        """
+        cell = np.zeros(self.size, dtype=np.int64)
+        total = 1
+        for codes, n in keys:
+            cell = cell * n + codes
+            total *= n
+        return cell, total
+
+    def cell_stats(self, cell, total, mask=None):
+        """每個 cell 的筆數、平均不良率、不良數合計"""
+        dr = np.asarray(self['defect_rate'])
+        valid = ~np.isnan(dr)
+        if mask is not None:
+            cell = cell[mask]
+            dr = dr[mask]
+            valid = valid[mask]
+            defect = np.asarray(self['defect_qty'])[mask]
+        else:
+            defect = np.asarray(self['defect_qty'])
+        count = np.bincount(cell, minlength=total)
+        dr_sum = np.bincount(cell, weights=np.where(valid, dr, 0.0), minlength=total)
+        dr_n = np.bincount(cell, weights=valid, minlength=total)
+        defect_sum = np.bincount(cell, weights=defect, minlength=total)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            dr_avg = dr_sum / dr_n
+        return count, dr_avg, defect_sum
+
+    def bucket(self, column, edges, right=False):
+        """
+        依 edges 分段：x < e0 → 0，e0 <= x < e1 → 1，…，其餘（含 NaN）→ len(edges)
+        right=True 時為右閉區間（x <= e0 → 0）
+        """
+        return np.digitize(np.asarray(self[column]), edges, right=right), len(edges) + 1
+
+    def cell_minmax(self, cell, total, column, mask=None):
+        """每個 cell 的最小 / 最大值（忽略 NaN；空 cell 為 NaN）"""
+        values = np.asarray(self[column])
+        if mask is not None:
+            cell = cell[mask]
+            values = values[mask]
+        mins = np.full(total, np.inf)
+        maxs = np.full(total, -np.inf)
+        np.fmin.at(mins, cell, values)
+        np.fmax.at(maxs, cell, values)
+        mins[np.isinf(mins)] = np.nan
+        maxs[np.isinf(maxs)] = np.nan
+        return mins, maxs
+
+
+def sql_round(value, digits):
+    """與 SQLite ROUND() 一致：以 15 位有效數字四捨五入（Python round() 為銀行家捨入）"""
+    return float(Decimal(f"{value:.15g}").quantize(Decimal(1).scaleb(-digits), ROUND_HALF_UP))
+
+
+def _pct(value, digits=2):
+    return None if value is None or value != value else sql_round(float(value) * 100, digits)
+
+
+# ============================================================
+# 端點格式（與 SQLite 版輸出相同結構）
+# ============================================================
+
+def bin_cells(snap, column, edges, right=False, by=None, by_edges=None, by_right=False, mask=None):
+    """
+    通用分段統計（與 app.zw_bin_cells 的 SQLite 版輸出相同）
+    by 為數值欄位時以 by_edges 分段，類別欄位則以字典代碼分組
+    mask 為篩選條件（zw_filter.ZwFilter.mask）
+    """
+    codes, n = snap.bucket(column, edges, right)
+    keys = [(codes, n)]
+    by_values = None
+    if by is not None:
+        if by_edges is None:
+            by_values = snap.vocab[by]
+            keys.append((np.asarray(snap[by]).astype(np.int64), len(by_values)))
+        else:
+            keys.append(snap.bucket(by, by_edges, by_right))
+    cell, total = snap.cells(keys)
+    count, dr_avg, defect_sum = snap.cell_stats(cell, total, mask)
+    mins, maxs = snap.cell_minmax(cell, total, 'defect_rate', mask)
+    n_by = keys[1][1] if by is not None else 1
+
+    rows = []
+    for c in range(total):
+        if not count[c]:
+            continue
+        item = {"bin": c // n_by}
+        if by is not None:
+            item["by_value"] = c % n_by if by_values is None else by_values[c % n_by]
+        item.update({
+            "batch_count": int(count[c]),
+            "defect_pct": _pct(dr_avg[c]),
+            "total_defect": int(defect_sum[c]),
+            "min_defect": _pct(mins[c]),
+            "max_defect": _pct(maxs[c]),
+        })
+        rows.append(item)
+    if by_values is not None:
+        # 與 SQLite ORDER BY 一致：NULL 在前
+        rows.sort(key=lambda r: (r['bin'], r['by_value'] is not None, r['by_value'] or ''))
+    return rows
+
+
+def factor_matrix(snap, factors, mask=None):
+    """
+    二元因子交互：factors 為 [(欄位, 門檻, 高標籤, 正常標籤, 鍵名)]
+    條件為 value > 門檻；依標籤字串排序分組後，以不良率由高到低排序
+    """
+    keys = []
+    for column, threshold, _, _, _ in factors:
+        keys.append(((np.asarray(snap[column]) > threshold).astype(np.int64), 2))
+    cell, total = snap.cells(keys)
+    count, dr_avg, defect_sum = snap.cell_stats(cell, total, mask)
+
+    rows = []
+    for c in range(total):
+        if not count[c]:
+            continue
+        item = {}
+        rest = c
+        for i in range(len(factors) - 1, -1, -1):
+            _, _, high, normal, key = factors[i]
+            item[key] = high if rest % 2 else normal
+            rest //= 2
+        item.update({
+            "batch_count": int(count[c]),
+            "defect_pct": _pct(dr_avg[c]),
+            "total_defect": int(defect_sum[c]),
+        })
+        rows.append(item)
+    rows.sort(key=lambda x: tuple(x[f[4]] for f in factors))
+    rows.sort(key=lambda x: -(x['defect_pct'] or 0))
+    return rows
+
+
+# ============================================================
+# 快照快取（每個 worker 一份，mmap 共用 page cache）
+# ============================================================
+
+_lock = threading.Lock()
+_current = {}
+
+
+def get_snapshot(conn, directory):
+    """取得與 production_log 同版本的快照；必要時載入、附加新列或重建"""
+    version = conn.execute("SELECT MAX(rowid) FROM production_log").fetchone()[0] or 0
+    snap = _current.get(directory)
+    if snap is not None and snap.version == version:
+        return snap
+
+    with _lock:
+        snap = _current.get(directory)
+        if snap is not None and snap.version == version:
+            return snap
+        snap = _refresh(conn, directory, snap, version)
+        _current[directory] = snap
+        return snap
+
+
+def _refresh(conn, directory, snap, version):
+    try:
+        return ColumnarSnapshot.load(directory, version)
+    except (OSError, ValueError):
+        pass
+    if snap is None:
+        snap = _load_latest(directory, version)
+    if snap is not None and snap.version < version:
+        snap = snap.append(conn, version)
+        if snap.saved_version is not None and version - snap.saved_version < COLUMNAR_PERSIST_ROWS:
+            return snap
+    else:
+        snap = ColumnarSnapshot.build(conn, version)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        snap.save(directory)
+        snap = ColumnarSnapshot.load(directory, version)
+        _prune(directory, version)
+    except OSError:
+        pass  # 無法寫入：僅保留於記憶體
+    return snap
+
+
+def _load_latest(directory, version):
+    """磁碟上不超過 version 的最新快照；無則 None"""
+    prefix = _snapshot_name('')
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return None
+    saved = [
+        int(name[len(prefix):]) for name in names
+        if name.startswith(prefix) and name[len(prefix):].isdigit()
+    ]
+    saved = [v for v in saved if v <= version]
+    if not saved:
+        return None
+    try:
+        return ColumnarSnapshot.load(directory, max(saved))
+    except (OSError, ValueError):
+        return None
+
+
+def _prune(directory, keep_version):
+    """移除舊版本快照（已 mmap 的 worker 仍可讀，檔案於關閉後釋放）"""
+    keep = _snapshot_name(keep_version)
+    for name in os.listdir(directory):
+        if name.startswith('snapshot-') and name != keep and '.tmp-' not in name:
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
@@ -0,0 +1,125 @@
+"""
+正崴原始資料串流匯出（CSV / NDJSON）
+==================================
+- production_log / machine_status / maintenance_log
+- 篩選：日期區間（start / end）、line_id、machine_id、shift
+- 以 fetchmany 分批讀取並逐批輸出，記憶體用量與結果筆數無關
+- 不加 ORDER BY（避免 SQLite 以暫存 B-tree 先排序整個結果）；
+  有日期篩選時依 day 索引輸出，大致為時間順序
+- 可選 gzip：以 zlib 串流壓縮，不需先產生完整檔案
+"""
+
+import csv
+import io
+import json
+import os
+import zlib
+
+from zw_filter import check_date
+from zw_schema import table_columns, time_columns
+
+EXPORT_CHUNK_ROWS = int(os.environ.get('ZW_EXPORT_CHUNK_ROWS', 5000))
+
+# 表 -> 可用的等值篩選欄位
+EXPORT_TABLES = {
+    'production_log': ('line_id', 'machine_id', 'shift'),
+    'machine_status': ('machine_id',),
+    'maintenance_log': ('machine_id',),
+}
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+
+def export_query(conn, table, start=None, end=None, **filters):
+    """
+    回傳 (sql, params, columns)
+    columns 為實體欄位（不含 day / hour / weekday 生成欄位）
+    """
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"table 需為: {', '.join(EXPORT_TABLES)}")
+
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    if not columns:
+        raise ValueError(f"{table} 不存在")
+
+    where, params = [], []
+    day = time_columns(conn, table)['day']
+    if start:
+        where.append(f"{day} >= ?")
+        params.append(check_date('start', start))
+    if end:
+        where.append(f"{day} <= ?")
+        params.append(check_date('end', end))
+    existing = table_columns(conn, table)
+    for name, value in filters.items():
+        if value is None:
+            continue
+        if name not in EXPORT_TABLES[table] or name not in existing:
+            raise ValueError(f"{table} 不支援 {name} 篩選")
+        where.append(f"{name} = ?")
+        params.append(value)
+
+    sql = f"SELECT {', '.join(columns)} FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return sql, params, columns
+
+
+def _batches(conn, sql, params):
+    cursor = conn.cursor()
+    cursor.row_factory = None  # tuple 即可，省去 sqlite3.Row 建構
+    cursor.execute(sql, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+
+
+def iter_csv(conn, sql, params, columns):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    for rows in _batches(conn, sql, params):
+        writer.writerows(rows)
+        yield buf.getvalue().encode('utf-8')
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode('utf-8')
+
+
+def iter_ndjson(conn, sql, params, columns):
+    for rows in _batches(conn, sql, params):
+        yield ''.join(
+            json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n' for row in rows
+        ).encode('utf-8')
+
+
+def gzip_stream(chunks, level=6):
+    """串流 gzip 壓縮"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(conn, fmt, sql, params, columns, compress=False):
+    """
+    匯出 generator
+    不負責歸還連線：回應可能從未被讀取（HEAD、客戶端提早離線），generator 不會開始執行，
+    呼叫端以 response.call_on_close 歸還
+    """
+    writer = iter_csv if fmt == 'csv' else iter_ndjson
+    chunks = writer(conn, sql, params, columns)
+    if compress:
+        chunks = gzip_stream(chunks)
+    yield from chunks
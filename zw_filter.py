@@ -0,0 +1,132 @@
+"""
+正崴端點共用篩選條件
+==================
+- ?start=YYYY-MM-DD &end=YYYY-MM-DD &line_id= &machine_id= &shift= &supplier_id= &product_id=
+- 轉為參數化 SQL 條件，下推至 rollup / production_log / machine_status / maintenance_log
+- machine_status / maintenance_log 只能套用日期、line_id、machine_id；使用這兩張表的區塊回傳 filters
+  （applied / ignored），不默默回傳未篩選的資料
+- 篩選欄位皆為 rollup 鍵，rollup 可直接套用，不需退回原始表
+- 回應快取的鍵包含查詢參數，篩選條件不同即為不同的快取項目
+"""
+
+from datetime import date, datetime
+
+FILTER_COLUMNS = ('line_id', 'machine_id', 'shift', 'supplier_id', 'product_id')
+# machine_status / maintenance_log 可套用的篩選（line_id 以該產線的機台套用）
+MACHINE_FILTER_COLUMNS = ('line_id', 'machine_id')
+
+_EPOCH = date(1970, 1, 1)
+
+
+def check_date(name, value):
+    """YYYY-MM-DD（補零）驗證，回傳原值；篩選、匯出、分頁共用"""
+    try:
+        # strptime 接受 2024-1-1，需再比對格式（字串比較依賴補零）
+        valid = datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d') == value
+    except ValueError:
+        valid = False
+    if not valid:
+        raise ValueError(f"{name} 需為 YYYY-MM-DD")
+    return value
+
+
+class ZwFilter:
+    """篩選條件（空值代表不篩選）"""
+
+    def __init__(self, start=None, end=None, **values):
+        self.start = start
+        self.end = end
+        self.values = {name: values[name] for name in FILTER_COLUMNS if values.get(name)}
+
+    @classmethod
+    def from_args(cls, args):
+        start = args.get('start') or None
+        end = args.get('end') or None
+        if start:
+            check_date('start', start)
+        if end:
+            check_date('end', end)
+        if start and end and start > end:
+            raise ValueError("start 不可晚於 end")
+        return cls(start, end, **{name: args.get(name) for name in FILTER_COLUMNS})
+
+    def __bool__(self):
+        return bool(self.start or self.end or self.values)
+
+    def as_dict(self):
+        """回應中回報實際套用的篩選"""
+        result = dict(self.values)
+        if self.start:
+            result['start'] = self.start
+        if self.end:
+            result['end'] = self.end
+        return result
+
+    def report(self, columns):
+        """
+        回應中回報篩選：applied 為實際套用，ignored 為該表沒有、因而略過的欄位
+        （例如 machine_status 無 shift / supplier_id / product_id）
+        """
+        applied = self.as_dict()
+        ignored = [name for name in self.values if name not in columns]
+        for name in ignored:
+            del applied[name]
+        return {"applied": applied, "ignored": ignored}
+
+    def conditions(self, date_expr, columns=FILTER_COLUMNS, alias=None,
+                   line_machines=None, pad_days=0):
+        """
+        回傳 (條件 list, 參數 list)
+        date_expr: 日期欄位或運算式（YYYY-MM-DD）；欄位名稱會加上 alias
+        columns: 該表具備的篩選欄位；不在其中的篩選略過（以 report() 回報）
+        line_machines: 表無 line_id 時，以「產線 → 機台」子查詢套用 line_id（參數為 line_id）
+        pad_days: 日期區間前後放寬天數（前後比較的視窗）
+        """
+        prefix = f"{alias}." if alias else ''
+        if date_expr.isidentifier():
+            date_expr = prefix + date_expr
+        conds, params = [], []
+        if self.start:
+            if pad_days:
+                conds.append(f"{date_expr} >= DATE(?, '-{pad_days} days')")
+            else:
+                conds.append(f"{date_expr} >= ?")
+            params.append(self.start)
+        if self.end:
+            if pad_days:
+                conds.append(f"{date_expr} <= DATE(?, '+{pad_days} days')")
+            else:
+                conds.append(f"{date_expr} <= ?")
+            params.append(self.end)
+        for name, value in self.values.items():
+            if name in columns:
+                conds.append(f"{prefix}{name} = ?")
+                params.append(value)
+            elif name == 'line_id' and line_machines:
+                conds.append(f"{prefix}machine_id IN ({line_machines})")
+                params.append(value)
+        return conds, params
+
+    # ----------------------------------------------------------
+    # 欄式快照（NumPy 引擎）
+    # ----------------------------------------------------------
+
+    def mask(self, snap):
+        """快照的布林遮罩；無篩選時為 None"""
+        if not self:
+            return None
+        import numpy as np
+
+        mask = np.ones(snap.size, dtype=bool)
+        day = np.asarray(snap['day'])
+        if self.start:
+            mask &= day >= (date.fromisoformat(self.start) - _EPOCH).days
+        if self.end:
+            mask &= day <= (date.fromisoformat(self.end) - _EPOCH).days
+        for name, value in self.values.items():
+            vocab = snap.vocab[name]
+            if value not in vocab:
+                mask[:] = False
+                break
+            mask &= np.asarray(snap[name]) == vocab.index(value)
+        return mask
@@ -0,0 +1,272 @@
+"""
+機台健康狀態（增量 EWMA）
+======================
+- 每台機台保存：溫度 / 振動的時間加權 EWMA（半衰期 ZW_HEALTH_HALFLIFE_HOURS，預設 24 小時）、
+  最新 runtime_hours、最近一次保養、每小時的健康分數歷史（最近 ZW_HEALTH_HISTORY 點）
+- EWMA 以 (加權和, 權重) 保存並依時間差衰減：每筆 machine_status O(1) 更新，
+  時間較舊的晚到資料依其時間加權，結果與資料到達順序無關
+- 首次載入只以 SQL 彙總最近 ZW_HEALTH_WARMUP_DAYS 天（每機台每小時一列，更早的權重可忽略）；
+  之後以 rowid 水位線只讀取新增的列，不重新掃描整張表；
+  一次新增超過 ZW_HEALTH_REBUILD_ROWS 列（例如歷史匯入）時改為重新載入
+- 每個 worker 各自維護；refresh() 只多兩次 MAX(rowid) 查詢
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from zw_schema import time_columns
+
+HEALTH_HALFLIFE_HOURS = float(os.environ.get('ZW_HEALTH_HALFLIFE_HOURS', 24))
+HEALTH_WARMUP_DAYS = int(os.environ.get('ZW_HEALTH_WARMUP_DAYS', 14))
+HEALTH_HISTORY = int(os.environ.get('ZW_HEALTH_HISTORY', 168))
+HEALTH_REBUILD_ROWS = int(os.environ.get('ZW_HEALTH_REBUILD_ROWS', 200000))
+HEALTH_FETCH_ROWS = 5000
+
+# 健康分數權重（%）
+HEALTH_WEIGHTS = {"runtime": 50, "temperature": 30, "vibration": 20}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _hours(value):
+    """timestamp 字串 → 1970 起的小時數；格式不符時為 None"""
+    try:
+        return (datetime.fromisoformat(value) - _EPOCH).total_seconds() / 3600
+    except (TypeError, ValueError):
+        return None
+
+
+def _format_hour(bucket):
+    return (_EPOCH + timedelta(hours=bucket)).strftime('%Y-%m-%d %H:00')
+
+
+def health_score(runtime_hours, temperature, vibration):
+    """
+    健康分數（100 分制，越低越需要維護）與風險等級
+    500h / 80°C / 振動 3.0 分別為該項 0 分
+    """
+    runtime_score = max(0, 100 - (runtime_hours / 5))
+    temp_score = max(0, 100 - (temperature - 60) * 5)
+    vibration_score = max(0, 100 - (vibration - 1) * 50)
+    score = (runtime_score * HEALTH_WEIGHTS['runtime'] + temp_score * HEALTH_WEIGHTS['temperature']
+             + vibration_score * HEALTH_WEIGHTS['vibration']) / 100
+    risk_level = 'CRITICAL' if score < 30 else 'HIGH' if score < 50 else 'MEDIUM' if score < 70 else 'LOW'
+    return score, risk_level
+
+
+class _Ewma:
+    """時間衰減加權平均：value = Σ x·2^(-(t_ref - t)/h) / Σ 2^(-(t_ref - t)/h)"""
+
+    __slots__ = ('total', 'weight')
+
+    def __init__(self):
+        self.total = 0.0
+        self.weight = 0.0
+
+    def add(self, value, weight):
+        self.total += value * weight
+        self.weight += weight
+
+    def decay(self, factor):
+        self.total *= factor
+        self.weight *= factor
+
+    @property
+    def value(self):
+        return self.total / self.weight if self.weight else None
+
+
+class MachineHealth:
+    __slots__ = ('t_ref', 'temperature', 'vibration', 'runtime_hours', 'last_seen',
+                 'last_maintenance', 'last_maintenance_type', 'history')
+
+    def __init__(self, history_size):
+        self.t_ref = None
+        self.temperature = _Ewma()
+        self.vibration = _Ewma()
+        self.runtime_hours = None
+        self.last_seen = None
+        self.last_maintenance = None
+        self.last_maintenance_type = None
+        self.history = deque(maxlen=history_size)  # [(小時序號, 分數)]
+
+    def score(self):
+        temperature, vibration = self.temperature.value, self.vibration.value
+        if self.runtime_hours is None or temperature is None or vibration is None:
+            return None
+        return health_score(self.runtime_hours, temperature, vibration)
+
+    def observe(self, t, temperature_sum, temperature_n, vibration_sum, vibration_n,
+                runtime_hours, timestamp, halflife):
+        """加入時間 t（小時）的量測（單筆或同一小時的彙總）"""
+        if self.t_ref is None or t >= self.t_ref:
+            if self.t_ref is not None:
+                factor = 0.5 ** ((t - self.t_ref) / halflife)
+                self.temperature.decay(factor)
+                self.vibration.decay(factor)
+            self.t_ref = t
+            weight = 1.0
+        else:
+            weight = 0.5 ** ((self.t_ref - t) / halflife)
+        if temperature_n:
+            self.temperature.add(temperature_sum / temperature_n, temperature_n * weight)
+        if vibration_n:
+            self.vibration.add(vibration_sum / vibration_n, vibration_n * weight)
+        if runtime_hours is not None and (self.last_seen is None or timestamp >= self.last_seen):
+            self.runtime_hours = runtime_hours
+            self.last_seen = timestamp
+
+        # 每小時一點：同一小時覆寫，晚到的舊資料不改寫歷史
+        bucket = int(t)
+        if self.history and bucket < self.history[-1][0]:
+            return
+        scored = self.score()
+        if scored is None:
+            return
+        if self.history and self.history[-1][0] == bucket:
+            self.history[-1] = (bucket, scored[0])
+        else:
+            self.history.append((bucket, scored[0]))
+
+    def maintained(self, timestamp, maintenance_type):
+        if self.last_maintenance is None or timestamp >= self.last_maintenance:
+            self.last_maintenance = timestamp
+            self.last_maintenance_type = maintenance_type
+
+
+class HealthStore:
+    def __init__(self, halflife_hours=HEALTH_HALFLIFE_HOURS, warmup_days=HEALTH_WARMUP_DAYS,
+                 history_size=HEALTH_HISTORY, rebuild_rows=HEALTH_REBUILD_ROWS):
+        self.halflife = halflife_hours
+        self.warmup_days = warmup_days
+        self.history_size = history_size
+        self.rebuild_rows = rebuild_rows
+        self.machines = {}
+        self._status_mark = None     # machine_status 已處理的最大 rowid
+        self._maintenance_mark = 0
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.rows_applied = 0
+        self.last_load_seconds = None
+
+    def _machine(self, machine_id):
+        state = self.machines.get(machine_id)
+        if state is None:
+            state = self.machines[machine_id] = MachineHealth(self.history_size)
+        return state
+
+    def refresh(self, conn):
+        """套用新增的 machine_status / maintenance_log；首次或落後太多時重新載入"""
+        status_max = conn.execute("SELECT MAX(rowid) FROM machine_status").fetchone()[0] or 0
+        maintenance_max = conn.execute("SELECT MAX(rowid) FROM maintenance_log").fetchone()[0] or 0
+        if status_max == self._status_mark and maintenance_max == self._maintenance_mark:
+            return
+        with self._lock:
+            if (self._status_mark is None or status_max < self._status_mark
+                    or status_max - self._status_mark > self.rebuild_rows):
+                self._load(conn, status_max)
+            elif status_max > self._status_mark:
+                self._apply_status(conn, status_max)
+            if maintenance_max != self._maintenance_mark:
+                self._apply_maintenance(conn, maintenance_max)
+
+    def _load(self, conn, status_max):
+        """最近 warmup_days 天以每機台每小時彙總載入"""
+        start = time.perf_counter()
+        t = time_columns(conn, 'machine_status')
+        max_day = conn.execute(f"SELECT MAX({t['day']}) FROM machine_status").fetchone()[0]
+        self.machines = {}
+        self._maintenance_mark = 0
+        rows = conn.execute(f"""
+            SELECT machine_id, {t['day']} as day, {t['hour']} as hour,
+                   SUM(temperature), COUNT(temperature), SUM(vibration), COUNT(vibration),
+                   MAX(timestamp) as last_ts, runtime_hours
+            FROM machine_status
+            WHERE rowid <= ? AND {t['day']} >= DATE(?, '-{self.warmup_days} days')
+            GROUP BY machine_id, day, hour
+            ORDER BY day, hour
+        """, (status_max, max_day))
+        for machine_id, day, hour, t_sum, t_n, v_sum, v_n, last_ts, runtime_hours in rows:
+            hours = _hours(day)
+            if hours is None:
+                continue
+            self._machine(machine_id).observe(
+                hours + int(hour) + 0.5, t_sum, t_n, v_sum, v_n, runtime_hours, last_ts, self.halflife)
+        self._status_mark = status_max
+        self.loads += 1
+        self.last_load_seconds = round(time.perf_counter() - start, 3)
+
+    def _apply_status(self, conn, status_max):
+        cursor = conn.execute("""
+            SELECT machine_id, timestamp, temperature, vibration, runtime_hours
+            FROM machine_status WHERE rowid > ? AND rowid <= ?
+            ORDER BY rowid
+        """, (self._status_mark, status_max))
+        while True:
+            rows = cursor.fetchmany(HEALTH_FETCH_ROWS)
+            if not rows:
+                break
+            for machine_id, timestamp, temperature, vibration, runtime_hours in rows:
+                hours = _hours(timestamp)
+                if hours is None:
+                    continue
+                self._machine(machine_id).observe(
+                    hours, temperature or 0.0, temperature is not None, vibration or 0.0, vibration is not None,
+                    runtime_hours, timestamp, self.halflife)
+            self.rows_applied += len(rows)
+        self._status_mark = status_max
+
+    def _apply_maintenance(self, conn, maintenance_max):
+        rows = conn.execute("""
+            SELECT machine_id, timestamp, maintenance_type FROM maintenance_log
+            WHERE rowid > ? AND rowid <= ?
+        """, (self._maintenance_mark, maintenance_max))
+        for machine_id, timestamp, maintenance_type in rows:
+            self._machine(machine_id).maintained(timestamp, maintenance_type)
+        self._maintenance_mark = maintenance_max
+
+    def scores(self, machine_ids=None):
+        """各機台目前的健康狀態；machine_ids 指定時只回傳這些機台"""
+        with self._lock:
+            items = self.machines.items() if machine_ids is None else (
+                (m, self.machines[m]) for m in machine_ids if m in self.machines)
+            result = []
+            for machine_id, state in items:
+                scored = state.score()
+                if scored is None:
+                    continue
+                result.append({
+                    "machine_id": machine_id,
+                    "runtime_hours": state.runtime_hours,
+                    "avg_temp": state.temperature.value,
+                    "avg_vibration": state.vibration.value,
+                    "health_score": scored[0],
+                    "risk_level": scored[1],
+                    "last_seen": state.last_seen,
+                    "last_maintenance": state.last_maintenance,
+                    "last_maintenance_type": state.last_maintenance_type,
+                })
+            return result
+
+    def history(self, machine_id):
+        """每小時的健康分數歷史（舊到新）；無此機台時為 None"""
+        with self._lock:
+            state = self.machines.get(machine_id)
+            if state is None:
+                return None
+            return [{"time": _format_hour(bucket), "health_score": round(score, 1)} for bucket, score in state.history]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "machines": len(self.machines),
+                "status_rowid": self._status_mark,
+                "maintenance_rowid": self._maintenance_mark,
+                "loads": self.loads,
+                "last_load_seconds": self.last_load_seconds,
+                "rows_applied": self.rows_applied,
+                "halflife_hours": self.halflife,
+            }
@@ -0,0 +1,299 @@
+"""
+正崴 DB 批次寫入（MES 資料持續匯入）
+================================
+- 支援 production_log / machine_status / maintenance_log
+- 先驗證整批資料（欄位型別、必填、時間格式），通過後再寫入
+- 以 executemany 分段交易寫入（ZW_INGEST_CHUNK 筆一段），DB 為 WAL 模式，
+  寫入期間唯讀連線照常查詢，不互相阻塞
+- 冪等：
+  * production_log 以 batch_id 去重（重複的批次略過）
+  * 整次請求可帶 batch_key（Idempotency-Key），已處理過的 batch_key 直接回傳上次結果；
+    帶 batch_key 時整批（含 batch_key 紀錄）為單一交易，中途失敗後重送或多個 worker 同時收到也不會重複寫入
+- 寫入後增量更新 rollup；回應快取 / 預先計算 / 欄式快照依 DB 版本自動失效
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+
+from zw_rollup import refresh_rollups
+
+ZW_INGEST_CHUNK = int(os.environ.get('ZW_INGEST_CHUNK', 5000))
+ZW_INGEST_MAX_ROWS = int(os.environ.get('ZW_INGEST_MAX_ROWS', 200000))
+MAX_ERRORS = 20
+
+# 表 -> [(欄位, 型別, 必填)]；型別為 str / int / float / 'timestamp'
+INGEST_SCHEMAS = {
+    'production_log': [
+        ('batch_id', str, True),
+        ('timestamp', 'timestamp', True),
+        ('line_id', str, True),
+        ('machine_id', str, True),
+        ('operator_id', str, False),
+        ('supplier_id', str, False),
+        ('product_id', str, False),
+        ('shift', str, False),
+        ('output_qty', int, True),
+        ('defect_qty', int, True),
+        ('defect_rate', float, False),
+        ('cycle_time', float, False),
+        ('temperature', float, False),
+        ('vibration', float, False),
+        ('runtime_hours', float, False),
+    ],
+    'machine_status': [
+        ('timestamp', 'timestamp', True),
+        ('machine_id', str, True),
+        ('runtime_hours', float, False),
+        ('temperature', float, False),
+        ('vibration', float, False),
+        ('maintenance_flag', int, False),
+    ],
+    'maintenance_log': [
+        ('timestamp', 'timestamp', True),
+        ('machine_id', str, True),
+        ('maintenance_type', str, True),
+        ('duration_hours', float, False),
+    ],
+}
+
+# 以唯一鍵去重的表（INSERT ... ON CONFLICT DO NOTHING）
+INGEST_CONFLICT_KEYS = {'production_log': 'batch_id'}
+
+INGEST_DDL = """
+CREATE TABLE IF NOT EXISTS _ingest_batches (
+    batch_key TEXT PRIMARY KEY,
+    table_name TEXT NOT NULL,
+    received INTEGER NOT NULL,
+    inserted INTEGER NOT NULL,
+    ingested_at TEXT
+);
+"""
+
+
+class IngestError(ValueError):
+    """資料驗證失敗；errors 為 [(列號, 訊息)]"""
+
+    def __init__(self, message, errors=()):
+        super().__init__(message)
+        self.errors = list(errors)
+
+
+_TS_RE = re.compile(r'(\d{4}-\d{2}-\d{2})[ T](?:[01]\d|2[0-3]):[0-5]\d:[0-5]\d')
+_valid_dates = {}
+
+
+def check_day(day):
+    """YYYY-MM-DD 是否為有效日期（結果快取；離線匯入共用）"""
+    valid = _valid_dates.get(day)
+    if valid is None:
+        try:
+            valid = date.fromisoformat(day).isoformat() == day
+        except ValueError:
+            valid = False
+        if len(_valid_dates) < 100000:
+            _valid_dates[day] = valid
+    if not valid:
+        raise ValueError("日期無效")
+
+
+def parse_timestamp(value):
+    # 僅接受 YYYY-MM-DD HH:MM:SS（字串比較與 DATE() 依賴固定格式）
+    match = _TS_RE.fullmatch(value) if isinstance(value, str) else None
+    if match is None:
+        raise ValueError("格式需為 YYYY-MM-DD HH:MM:SS")
+    check_day(match.group(1))
+    return value if value[10] == ' ' else value.replace('T', ' ')
+
+
+def _to_str(value):
+    if type(value) is str:
+        return value
+    if isinstance(value, (dict, list, bool)):
+        raise ValueError("需為字串")
+    return str(value)
+
+
+def _to_int(value):
+    if type(value) is int:
+        return value
+    if isinstance(value, (bool, dict, list, str)):
+        raise ValueError("需為整數")
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError("需為整數")
+    return int(value)
+
+
+def _to_float(value):
+    if type(value) is float:
+        if value != value or value in (_INF, -_INF):
+            raise ValueError("需為有限數值")
+        return value
+    if type(value) is int:
+        return float(value)
+    raise ValueError("需為數值")
+
+
+_INF = float('inf')
+_CONVERTERS = {str: _to_str, int: _to_int, float: _to_float, 'timestamp': parse_timestamp}
+
+
+def validate_rows(table, rows):
+    """
+    驗證並轉為 executemany 參數 tuple
+    全部通過才回傳；否則丟出 IngestError（最多列出 MAX_ERRORS 筆）
+    """
+    if table not in INGEST_SCHEMAS:
+        raise IngestError(f"table 需為: {', '.join(INGEST_SCHEMAS)}")
+    if not isinstance(rows, list):
+        raise IngestError("資料需為陣列")
+    if not rows:
+        raise IngestError("資料為空")
+    if len(rows) > ZW_INGEST_MAX_ROWS:
+        raise IngestError(f"單次最多 {ZW_INGEST_MAX_ROWS:,} 筆")
+
+    schema = [(name, _CONVERTERS[type_], required) for name, type_, required in INGEST_SCHEMAS[table]]
+    known = {name for name, _, _ in schema}
+    derive_rate = table == 'production_log'
+    params, errors = [], []
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors.append((i, "需為物件"))
+        else:
+            values = []
+            try:
+                for name, convert, required in schema:
+                    value = row.get(name)
+                    if value is None or value == '':
+                        if required:
+                            raise ValueError(f"{name} 為必填")
+                        values.append(None)
+                        continue
+                    try:
+                        values.append(convert(value))
+                    except (TypeError, ValueError) as e:
+                        raise ValueError(f"{name} {e}")
+                if not row.keys() <= known:
+                    raise ValueError(f"未知欄位: {', '.join(sorted(row.keys() - known))}")
+                if derive_rate:
+                    # defect_rate 未提供時由數量計算（index 8/9/10 = output/defect/rate）
+                    if values[8] < 0 or values[9] < 0 or values[9] > values[8]:
+                        raise ValueError("defect_qty 需介於 0 與 output_qty 之間")
+                    if values[10] is None and values[8]:
+                        values[10] = round(values[9] / values[8], 4)
+                params.append(tuple(values))
+            except ValueError as e:
+                errors.append((i, str(e)))
+        if len(errors) >= MAX_ERRORS:
+            break
+    if errors:
+        raise IngestError(f"{len(errors)}{'+' if len(errors) >= MAX_ERRORS else ''} 筆資料驗證失敗", errors)
+    return params
+
+
+class Ingestor:
+    """單一 DB 的寫入器（每個 worker 一條寫入連線，以 lock 串行化）"""
+
+    def __init__(self, path, chunk=ZW_INGEST_CHUNK):
+        self.path = path
+        self.chunk = chunk
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.executescript(INGEST_DDL)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _insert_sql(self, table):
+        columns = [name for name, _, _ in INGEST_SCHEMAS[table]]
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        key = INGEST_CONFLICT_KEYS.get(table)
+        if key:
+            sql += f" ON CONFLICT ({key}) DO NOTHING"
+        return sql
+
+    def _write(self, conn, sql, chunks):
+        """（交易內）逐段 executemany，回傳實際寫入筆數"""
+        before = conn.total_changes
+        for chunk in chunks:
+            conn.executemany(sql, chunk)
+        return conn.total_changes - before
+
+    def ingest(self, table, rows, batch_key=None, refresh=True):
+        """
+        驗證並寫入，回傳統計 dict
+        batch_key 已處理過時不寫入，回傳上次結果（replayed=True）
+        """
+        params = validate_rows(table, rows)
+        start = time.perf_counter()
+
+        with self._lock:
+            conn = self._connection()
+            sql = self._insert_sql(table)
+            chunks = [params[offset:offset + self.chunk] for offset in range(0, len(params), self.chunk)]
+            if batch_key:
+                # 查詢 batch_key、全部資料與 batch_key 紀錄為同一交易：中途失敗整批回滾，重送不會重複；
+                # BEGIN IMMEDIATE 跨行程互斥，其他 worker 同時收到同一 batch_key 時等待後回傳本次結果
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    row = conn.execute(
+                        "SELECT table_name, received, inserted, ingested_at FROM _ingest_batches WHERE batch_key = ?",
+                        (batch_key,)
+                    ).fetchone()
+                    if row is None:
+                        inserted = self._write(conn, sql, chunks)
+                        conn.execute(
+                            "INSERT INTO _ingest_batches (batch_key, table_name, received, inserted, ingested_at) "
+                            "VALUES (?, ?, ?, ?, ?)",
+                            (batch_key, table, len(params), inserted, datetime.now().isoformat())
+                        )
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                if row is not None:
+                    return {
+                        "table": row[0], "received": row[1], "inserted": row[2],
+                        "duplicates": row[1] - row[2], "batch_key": batch_key,
+                        "ingested_at": row[3], "replayed": True,
+                    }
+            else:
+                # 無 batch_key：每段各自一個交易（production_log 仍以 batch_id 去重）
+                inserted = 0
+                for chunk in chunks:
+                    conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        inserted += self._write(conn, sql, [chunk])
+                        conn.execute("COMMIT")
+                    except BaseException:
+                        conn.execute("ROLLBACK")
+                        raise
+            write_elapsed = time.perf_counter() - start
+
+            rolled_up = 0
+            if refresh and table == 'production_log' and inserted:
+                rolled_up = refresh_rollups(self.path)
+
+        elapsed = time.perf_counter() - start
+        return {
+            "table": table,
+            "received": len(params),
+            "inserted": inserted,
+            "duplicates": len(params) - inserted,
+            "batch_key": batch_key,
+            "replayed": False,
+            "rolled_up": rolled_up,
+            "write_ms": round(write_elapsed * 1000, 1),
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "rows_per_sec": round(len(params) / elapsed) if elapsed else None,
+        }
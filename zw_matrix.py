@@ -0,0 +1,194 @@
+"""
+操作員 × 機台良率矩陣（稀疏）
+==========================
+- production_log 依 (operator_id, machine_id) 聚合一次，存成稀疏矩陣：
+  只保存有生產紀錄的配對，各欄位為 array（每個配對約 40 bytes）
+- 依操作員排序（CSR），另存依機台排序的索引；查詢單一操作員 / 機台的整列不需掃描全部配對
+- 最佳 / 最差 k 組以 heapq 取出：O(n log k)，不排序全部配對；門檻（最少批次數）於查詢時套用
+- PairMatrixCache 依篩選條件保留最近的矩陣，production_log 的 MAX(rowid) 變動時重建
+"""
+
+import heapq
+import math
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+MATRIX_MIN_BATCHES = int(os.environ.get('ZW_MATRIX_MIN_BATCHES', 10))
+MATRIX_CACHE_SIZE = int(os.environ.get('ZW_MATRIX_CACHE_SIZE', 8))
+
+
+class PairMatrix:
+    """
+    rows：(operator_id, machine_id, batch_count, output_sum, defect_sum, yield_rate)，
+    依 (operator_id, machine_id) 排序；yield_rate 為 NULL（產量 0）的配對不列入排名
+    """
+
+    def __init__(self, rows):
+        self.operators = []
+        self.machines = sorted({row[1] for row in rows})
+        machine_index = {m: i for i, m in enumerate(self.machines)}
+
+        self.operator_starts = array('l')   # 操作員 i 的配對為 [starts[i], starts[i + 1])
+        self.machine_idx = array('l')
+        self.batches = array('q')
+        self.output = array('q')
+        self.defects = array('q')
+        self.yields = array('d')
+        for operator_id, machine_id, batch_count, output_sum, defect_sum, yield_rate in rows:
+            if not self.operators or self.operators[-1] != operator_id:
+                self.operators.append(operator_id)
+                self.operator_starts.append(len(self.batches))
+            self.machine_idx.append(machine_index[machine_id])
+            self.batches.append(batch_count)
+            self.output.append(int(output_sum or 0))
+            self.defects.append(int(defect_sum or 0))
+            self.yields.append(math.nan if yield_rate is None else yield_rate)
+        self.operator_starts.append(len(self.batches))
+
+        # 配對的操作員序號；依機台排序的配對索引（CSC）
+        self.operator_idx = array('l', [0]) * len(self.batches)
+        for i in range(len(self.operators)):
+            for p in range(self.operator_starts[i], self.operator_starts[i + 1]):
+                self.operator_idx[p] = i
+        by_machine = sorted(range(len(self.batches)), key=self.machine_idx.__getitem__)
+        self.machine_pairs = array('l', by_machine)
+        self.machine_starts = array('l', [0]) * (len(self.machines) + 1)
+        for p in by_machine:
+            self.machine_starts[self.machine_idx[p] + 1] += 1
+        for i in range(len(self.machines)):
+            self.machine_starts[i + 1] += self.machine_starts[i]
+
+    def __len__(self):
+        return len(self.batches)
+
+    @property
+    def nbytes(self):
+        arrays = (self.operator_starts, self.machine_idx, self.batches, self.output, self.defects,
+                  self.yields, self.operator_idx, self.machine_pairs, self.machine_starts)
+        return sum(a.itemsize * len(a) for a in arrays)
+
+    def pair(self, p):
+        return {
+            "operator_id": self.operators[self.operator_idx[p]],
+            "machine_id": self.machines[self.machine_idx[p]],
+            "batch_count": self.batches[p],
+            "yield_rate": None if math.isnan(self.yields[p]) else self.yields[p],
+        }
+
+    def _ranked(self, pairs, min_batches):
+        batches, yields = self.batches, self.yields
+        return (p for p in pairs if batches[p] >= min_batches and not math.isnan(yields[p]))
+
+    def best(self, k, min_batches=MATRIX_MIN_BATCHES):
+        """良率最高的 k 組（同良率依操作員、機台順序）"""
+        top = heapq.nlargest(k, self._ranked(range(len(self)), min_batches), key=self.yields.__getitem__)
+        return [self.pair(p) for p in top]
+
+    def worst(self, k, min_batches=MATRIX_MIN_BATCHES):
+        """良率最低的 k 組"""
+        bottom = heapq.nsmallest(k, self._ranked(range(len(self)), min_batches), key=self.yields.__getitem__)
+        return [self.pair(p) for p in bottom]
+
+    def _lookup(self, names, value):
+        i = bisect_left(names, value)
+        return i if i < len(names) and names[i] == value else None
+
+    def operator_row(self, operator_id, min_batches=MATRIX_MIN_BATCHES):
+        """單一操作員在各機台的配對（良率高到低）；無此操作員時為 None"""
+        i = self._lookup(self.operators, operator_id)
+        if i is None:
+            return None
+        pairs = range(self.operator_starts[i], self.operator_starts[i + 1])
+        return [self.pair(p) for p in sorted(self._ranked(pairs, min_batches), key=self.yields.__getitem__, reverse=True)]
+
+    def machine_row(self, machine_id, min_batches=MATRIX_MIN_BATCHES):
+        """單一機台的各操作員配對（良率高到低）；無此機台時為 None"""
+        i = self._lookup(self.machines, machine_id)
+        if i is None:
+            return None
+        pairs = self.machine_pairs[self.machine_starts[i]:self.machine_starts[i + 1]]
+        return [self.pair(p) for p in sorted(self._ranked(pairs, min_batches), key=self.yields.__getitem__, reverse=True)]
+
+    def grid(self, min_batches=1):
+        """稀疏格式（COO）：operators / machines 名稱表與各配對的序號、批次數、良率"""
+        pairs = list(self._ranked(range(len(self)), min_batches))
+        return {
+            "operators": self.operators,
+            "machines": self.machines,
+            "operator_idx": [self.operator_idx[p] for p in pairs],
+            "machine_idx": [self.machine_idx[p] for p in pairs],
+            "batch_count": [self.batches[p] for p in pairs],
+            "yield_rate": [self.yields[p] for p in pairs],
+        }
+
+    def stats(self):
+        cells = len(self.operators) * len(self.machines)
+        return {
+            "operators": len(self.operators),
+            "machines": len(self.machines),
+            "pairs": len(self),
+            "density": round(len(self) / cells, 4) if cells else 0,
+            "bytes": self.nbytes,
+        }
+
+
+class PairMatrixCache:
+    """依篩選條件保留最近 maxsize 份矩陣；版本（production_log MAX(rowid)）不同時重建"""
+
+    def __init__(self, maxsize=MATRIX_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()   # key -> (version, PairMatrix)
+        self._lock = threading.Lock()
+        self._building = {}             # key -> 建立中的 Lock（同一鍵只建立一次）
+        self.builds = 0
+        self.hits = 0
+
+    def _cached(self, key, version):
+        """（持有 _lock）版本相符的快取矩陣；無則 None"""
+        cached = self._entries.get(key)
+        if cached is not None and cached[0] == version:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return cached[1]
+        return None
+
+    def get(self, key, version, build):
+        """
+        build() 回傳 PairMatrix；同一鍵同時只建立一次
+        建立時不持有整個快取的 lock：其他鍵的命中與 stats() 不需等待
+        """
+        with self._lock:
+            matrix = self._cached(key, version)
+            if matrix is not None:
+                return matrix
+            key_lock = self._building.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                matrix = self._cached(key, version)
+            if matrix is not None:
+                return matrix
+            try:
+                matrix = build()
+                with self._lock:
+                    self.builds += 1
+                    self._entries[key] = (version, matrix)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+            finally:
+                with self._lock:
+                    if self._building.get(key) is key_lock:
+                        del self._building[key]
+            return matrix
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "builds": self.builds,
+                "hits": self.hits,
+                "bytes": sum(matrix.nbytes for _, matrix in self._entries.values()),
+            }
@@ -0,0 +1,158 @@
+"""
+production_log 預聚合（Rollup）層
+================================
+- 鍵：date × hour × line_id × machine_id × shift × supplier_id × product_id
+- 值：batch_count 與各量測欄位的 sum / min / max
+- 以 production_log.rowid 作為水位線，新資料進來時只聚合增量
+- 無法寫入（唯讀部署）時，rollup_source() 退回等價的原始表子查詢，
+  端點 SQL 不需分兩套
+- 日期/小時優先使用 zw_schema 的生成欄位 day / hour
+- 鍵涵蓋 zw_filter 的全部篩選欄位；(line_id, date)、(machine_id, date) 索引供篩選查詢使用
+"""
+
+import sqlite3
+import threading
+from datetime import datetime
+
+from zw_schema import time_columns
+
+ROLLUP_TABLE = 'production_rollup'
+
+# (欄位, 原始表運算式)；day / hour 依 time_columns() 代換
+ROLLUP_KEYS = [
+    ('date', 'day'),
+    ('hour', 'hour'),
+    ('line_id', 'line_id'),
+    ('machine_id', 'machine_id'),
+    ('shift', 'shift'),
+    ('supplier_id', 'supplier_id'),
+    ('product_id', 'product_id'),
+]
+
+# (欄位, 原始表運算式, 聚合函數)
+ROLLUP_MEASURES = [
+    ('batch_count', '1', 'SUM'),
+    ('output_sum', 'output_qty', 'SUM'),
+    ('defect_sum', 'defect_qty', 'SUM'),
+    ('defect_rate_sum', 'defect_rate', 'SUM'),
+    ('defect_rate_min', 'defect_rate', 'MIN'),
+    ('defect_rate_max', 'defect_rate', 'MAX'),
+    ('cycle_time_sum', 'cycle_time', 'SUM'),
+    ('temperature_sum', 'temperature', 'SUM'),
+    ('temperature_min', 'temperature', 'MIN'),
+    ('temperature_max', 'temperature', 'MAX'),
+    ('vibration_sum', 'vibration', 'SUM'),
+    ('vibration_min', 'vibration', 'MIN'),
+    ('vibration_max', 'vibration', 'MAX'),
+    ('runtime_min', 'runtime_hours', 'MIN'),
+    ('runtime_max', 'runtime_hours', 'MAX'),
+]
+
+
+def _key_exprs(conn):
+    t = time_columns(conn, 'production_log')
+    return [(col, t.get(expr, expr)) for col, expr in ROLLUP_KEYS]
+
+
+def raw_source(conn):
+    """每筆原始資料視為 batch_count=1 的 rollup 列（退回用）"""
+    return "(SELECT {} FROM production_log)".format(', '.join(
+        [f"{expr} AS {col}" for col, expr in _key_exprs(conn)]
+        + [f"{expr} AS {col}" for col, expr, _ in ROLLUP_MEASURES]
+    ))
+
+
+_key_cols = ', '.join(col for col, _ in ROLLUP_KEYS)
+
+ROLLUP_DDL = f"""
+CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+    date TEXT, hour TEXT, line_id TEXT, machine_id TEXT,
+    shift TEXT, supplier_id TEXT, product_id TEXT,
+    {', '.join(f"{col} {'INTEGER' if col in ('batch_count', 'output_sum', 'defect_sum') else 'REAL'}" for col, _, _ in ROLLUP_MEASURES)},
+    UNIQUE ({_key_cols})
+);
+CREATE INDEX IF NOT EXISTS idx_{ROLLUP_TABLE}_line ON {ROLLUP_TABLE} (line_id, date);
+CREATE INDEX IF NOT EXISTS idx_{ROLLUP_TABLE}_machine ON {ROLLUP_TABLE} (machine_id, date);
+CREATE TABLE IF NOT EXISTS _rollup_state (
+    name TEXT PRIMARY KEY,
+    last_rowid INTEGER NOT NULL,
+    refreshed_at TEXT
+);
+"""
+
+
+def _merge_expr(col, agg):
+    if agg == 'SUM':
+        return f"{col} = COALESCE({col}, 0) + COALESCE(excluded.{col}, 0)"
+    return f"{col} = COALESCE({agg}({col}, excluded.{col}), {col}, excluded.{col})"
+
+
+def _increment_sql(conn):
+    keys = ', '.join(expr for _, expr in _key_exprs(conn))
+    return f"""
+        INSERT INTO {ROLLUP_TABLE} ({_key_cols}, {', '.join(col for col, _, _ in ROLLUP_MEASURES)})
+        SELECT {keys},
+               {', '.join(f"{agg}({expr})" for _, expr, agg in ROLLUP_MEASURES)}
+        FROM production_log
+        WHERE rowid > ? AND rowid <= ?
+        GROUP BY {keys}
+        ON CONFLICT ({_key_cols}) DO UPDATE SET
+            {', '.join(_merge_expr(col, agg) for col, _, agg in ROLLUP_MEASURES)}
+    """
+
+
+_lock = threading.Lock()
+# path -> 最近一次無法寫入時的 rowid（避免每次請求重試）
+_unwritable = {}
+
+
+def refresh_rollups(path, rebuild=False):
+    """增量更新 rollup；rebuild=True 時清空重建。回傳新增聚合的原始筆數"""
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        conn.executescript(ROLLUP_DDL)
+        conn.execute("BEGIN IMMEDIATE")
+        if rebuild:
+            conn.execute(f"DELETE FROM {ROLLUP_TABLE}")
+            conn.execute("DELETE FROM _rollup_state WHERE name = ?", (ROLLUP_TABLE,))
+        row = conn.execute(
+            "SELECT last_rowid FROM _rollup_state WHERE name = ?", (ROLLUP_TABLE,)
+        ).fetchone()
+        last_rowid = row[0] if row else 0
+        max_rowid = conn.execute("SELECT MAX(rowid) FROM production_log").fetchone()[0] or 0
+        if max_rowid > last_rowid:
+            conn.execute(_increment_sql(conn), (last_rowid, max_rowid))
+        conn.execute(
+            "INSERT OR REPLACE INTO _rollup_state (name, last_rowid, refreshed_at) VALUES (?, ?, ?)",
+            (ROLLUP_TABLE, max_rowid, datetime.now().isoformat()),
+        )
+        conn.commit()
+        return max_rowid - last_rowid
+    finally:
+        conn.close()
+
+
+def rollup_source(conn, path):
+    """
+    回傳端點應使用的來源表運算式：
+    rollup 為最新則用 rollup；落後則先增量更新；無法寫入則退回原始表
+    """
+    max_rowid = conn.execute("SELECT MAX(rowid) FROM production_log").fetchone()[0] or 0
+    try:
+        row = conn.execute(
+            "SELECT last_rowid FROM _rollup_state WHERE name = ?", (ROLLUP_TABLE,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    if row and row[0] >= max_rowid:
+        return ROLLUP_TABLE
+    if _unwritable.get(path) == max_rowid:
+        return raw_source(conn)
+
+    with _lock:
+        try:
+            refresh_rollups(path)
+        except sqlite3.OperationalError:
+            _unwritable[path] = max_rowid
+            return raw_source(conn)
+    return ROLLUP_TABLE
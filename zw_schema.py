@@ -0,0 +1,145 @@
+"""
+正崴 DB 結構遷移：時間衍生欄位 + 覆蓋索引
+========================================
+- production_log / machine_status 新增虛擬生成欄位 day / hour / weekday，
+  取代查詢中逐列解析的 DATE(timestamp) / strftime(...)
+- 建立 (machine_id, day)、(line_id, day) 覆蓋索引與 (day)、(timestamp) 索引，並 ANALYZE
+- 尚未遷移（或唯讀無法遷移）時，time_columns() 回傳原始運算式，查詢照常可用
+- explain_checks() 以 EXPLAIN QUERY PLAN 驗證時間窗查詢確實走索引
+"""
+
+import sqlite3
+
+# (欄位, 型別, 運算式)
+TIME_COLUMNS = [
+    ('day', 'TEXT', "DATE(timestamp)"),
+    ('hour', 'TEXT', "strftime('%H', timestamp)"),
+    ('weekday', 'INTEGER', "CAST(strftime('%w', timestamp) AS INTEGER)"),
+]
+TIME_COLUMN_TABLES = ('production_log', 'machine_status')
+
+# (索引, 表, 欄位)；表中缺少任一欄位則略過
+INDEXES = [
+    ('idx_production_log_day', 'production_log', ('day',)),
+    ('idx_production_log_timestamp', 'production_log', ('timestamp',)),
+    ('idx_production_log_machine_day', 'production_log',
+     ('machine_id', 'day', 'runtime_hours', 'defect_rate', 'vibration')),
+    ('idx_production_log_line_day', 'production_log',
+     ('line_id', 'day', 'shift', 'output_qty', 'defect_qty', 'defect_rate')),
+    ('idx_machine_status_day', 'machine_status', ('day',)),
+    ('idx_machine_status_timestamp', 'machine_status', ('timestamp',)),
+    ('idx_machine_status_machine_day', 'machine_status',
+     ('machine_id', 'day', 'runtime_hours', 'temperature', 'vibration', 'maintenance_flag')),
+    ('idx_machine_status_line_day', 'machine_status', ('line_id', 'day')),
+    ('idx_maintenance_log_machine', 'maintenance_log', ('machine_id', 'timestamp')),
+]
+
+_time_cache = {}
+
+
+def table_columns(conn, table):
+    """表的欄位集合（含生成欄位）；表不存在時為空集合"""
+    return {row[1] for row in conn.execute(f"PRAGMA table_xinfo({table})")}
+
+
+def time_columns(conn, table):
+    """
+    回傳 {'day': ..., 'hour': ..., 'weekday': ...}
+    已遷移時為欄位名稱，否則為等價的 timestamp 運算式
+    """
+    version = conn.execute("PRAGMA schema_version").fetchone()[0]
+    key = (table, version, conn.execute("PRAGMA database_list").fetchone()[2])
+    cols = _time_cache.get(key)
+    if cols is None:
+        existing = table_columns(conn, table)
+        cols = {name: name if name in existing else expr for name, _, expr in TIME_COLUMNS}
+        _time_cache[key] = cols
+    return cols
+
+
+def migrate(path):
+    """套用遷移（冪等），回傳本次新增的欄位與索引"""
+    conn = sqlite3.connect(path, timeout=30)
+    applied = []
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        for table in TIME_COLUMN_TABLES:
+            existing = table_columns(conn, table)
+            if not existing:
+                continue
+            for name, type_, expr in TIME_COLUMNS:
+                if name not in existing:
+                    conn.execute(
+                        f"ALTER TABLE {table} ADD COLUMN {name} {type_} "
+                        f"GENERATED ALWAYS AS ({expr}) VIRTUAL"
+                    )
+                    applied.append(f"{table}.{name}")
+
+        for name, table, columns in INDEXES:
+            if not set(columns) <= table_columns(conn, table):
+                continue
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)
+            ).fetchone()
+            if not exists:
+                conn.execute(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})")
+                applied.append(name)
+        conn.commit()
+
+        if applied:
+            conn.execute("ANALYZE")
+            conn.commit()
+    finally:
+        conn.close()
+    return applied
+
+
+# (名稱, SQL, 參數)：應走索引的代表性查詢
+EXPLAIN_QUERIES = [
+    ("production_log 最大日期",
+     "SELECT MAX(day) FROM production_log", ()),
+    ("production_log 機台最近7天",
+     """SELECT machine_id, MAX(runtime_hours), AVG(defect_rate), AVG(vibration)
+        FROM production_log WHERE day >= DATE(?, '-7 days') GROUP BY machine_id""",
+     ('2000-01-01',)),
+    ("production_log 單一產線時間窗",
+     """SELECT day, SUM(output_qty), SUM(defect_qty)
+        FROM production_log WHERE line_id = ? AND day BETWEEN ? AND ? GROUP BY day""",
+     ('', '2000-01-01', '2000-01-07')),
+    ("production_log 單一機台時間窗",
+     """SELECT AVG(defect_rate), AVG(vibration)
+        FROM production_log WHERE machine_id = ? AND day BETWEEN ? AND ?""",
+     ('', '2000-01-01', '2000-01-07')),
+    ("production_log 分頁（keyset）",
+     """SELECT batch_id, timestamp, rowid FROM production_log
+        WHERE (timestamp, rowid) > (?, ?) ORDER BY timestamp, rowid LIMIT 101""",
+     ('2000-01-01 00:00:00', 0)),
+    ("machine_status 最大日期",
+     "SELECT MAX(day) FROM machine_status", ()),
+    ("machine_status 機台最近7天",
+     """SELECT machine_id, MAX(runtime_hours), AVG(temperature), AVG(vibration), MAX(maintenance_flag)
+        FROM machine_status WHERE day >= DATE(?, '-7 days') GROUP BY machine_id""",
+     ('2000-01-01',)),
+]
+
+
+def explain_checks(conn):
+    """
+    回傳 [(名稱, 查詢計畫, 問題)]
+    問題：全表 SCAN、或 GROUP BY / ORDER BY 使用暫存 B-tree
+    """
+    results = []
+    for name, sql, params in EXPLAIN_QUERIES:
+        try:
+            plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        except sqlite3.OperationalError as e:
+            results.append((name, [], [f"無法分析: {e}"]))
+            continue
+        issues = []
+        for detail in plan:
+            if detail.startswith('SCAN '):
+                issues.append(f"全表掃描: {detail}")
+            if 'TEMP B-TREE' in detail:
+                issues.append(f"暫存 B-tree: {detail}")
+        results.append((name, plan, issues))
+    return results
@@ -0,0 +1,256 @@
+"""
+SPC 控制圖引擎（每條產線 / 每台機台）
+==================================
+- 子群組：單一序列（產線或機台）一天的批次
+- X-bar / R 圖：σ 以 R̄/d2 估計（子群組大小不一時逐點計算管制界限）
+- p 圖：defect_qty / output_qty
+- EWMA（λ=0.2, L=3）與表格式 CUSUM（k=0.5, h=5），以 σ/√n̄ 標準化
+- Western Electric / Nelson 八大規則
+- 每個序列先累計中心線與 σ，再單次線性掃描完成所有圖與規則判定：O(n)
+"""
+
+import math
+from collections import deque
+from statistics import NormalDist
+
+EWMA_LAMBDA = 0.2
+EWMA_L = 3.0
+CUSUM_K = 0.5
+CUSUM_H = 5.0
+
+NELSON_RULES = {
+    1: "1點超出 3σ",
+    2: "連續9點在中線同側",
+    3: "連續6點遞增或遞減",
+    4: "連續14點交替升降",
+    5: "3點中有2點超出 2σ（同側）",
+    6: "5點中有4點超出 1σ（同側）",
+    7: "連續15點在 1σ 內",
+    8: "連續8點皆在 1σ 外（兩側）",
+}
+
+# 管制圖常數 d2 / d3（n = 2..25）
+_D2 = {
+    2: 1.128, 3: 1.693, 4: 2.059, 5: 2.326, 6: 2.534, 7: 2.704, 8: 2.847, 9: 2.970,
+    10: 3.078, 11: 3.173, 12: 3.258, 13: 3.336, 14: 3.407, 15: 3.472, 16: 3.532,
+    17: 3.588, 18: 3.640, 19: 3.689, 20: 3.735, 21: 3.778, 22: 3.819, 23: 3.858,
+    24: 3.895, 25: 3.931,
+}
+_D3 = {
+    2: 0.853, 3: 0.888, 4: 0.880, 5: 0.864, 6: 0.848, 7: 0.833, 8: 0.820, 9: 0.808,
+    10: 0.797, 11: 0.787, 12: 0.778, 13: 0.770, 14: 0.763, 15: 0.756, 16: 0.750,
+    17: 0.744, 18: 0.739, 19: 0.734, 20: 0.729, 21: 0.724, 22: 0.720, 23: 0.716,
+    24: 0.712, 25: 0.708,
+}
+
+
+def d2(n):
+    """n > 25 以常態最大值期望近似（Blom），n = 25 時與查表值一致"""
+    if n in _D2:
+        return _D2[n]
+    return 2 * NormalDist().inv_cdf((n - 0.375) / (n + 0.25))
+
+
+def d3(n):
+    """n > 25 沿用 n = 25 的值（R 圖界限略寬，偏保守）"""
+    return _D3.get(n, _D3[25])
+
+
+def group_series(rows, key='series'):
+    """依 key 將已排序的列切成 [(序列 id, [列])]"""
+    current, points = None, []
+    for row in rows:
+        if row[key] != current:
+            if points:
+                yield current, points
+            current, points = row[key], []
+        points.append(row)
+    if points:
+        yield current, points
+
+
+def _round(value, digits=3):
+    return None if value is None else round(value, digits)
+
+
+def analyze(points, recent=1, include_points=False):
+    """
+    單一序列的 SPC 分析
+    points: 依日期排序的 [{date, n, xbar, r, defect, output}]；xbar / r 為百分比
+    recent: 最後幾個子群組內有任何訊號即視為「目前失控」
+    """
+    # 中心線與 σ（單次累計）
+    total_n = total_x = total_defect = total_output = 0
+    sigma_sum = sigma_cnt = 0
+    mr_sum = 0.0
+    prev = None
+    for p in points:
+        total_n += p['n']
+        total_x += p['xbar'] * p['n']
+        total_defect += p['defect'] or 0
+        total_output += p['output'] or 0
+        if p['n'] >= 2 and p['r'] is not None:
+            sigma_sum += p['r'] / d2(p['n'])
+            sigma_cnt += 1
+        if prev is not None:
+            mr_sum += abs(p['xbar'] - prev)
+        prev = p['xbar']
+
+    count = len(points)
+    center = total_x / total_n if total_n else 0.0
+    n_bar = total_n / count if count else 1
+    if sigma_cnt:
+        sigma = sigma_sum / sigma_cnt
+    elif count > 1:
+        # 子群組皆為單筆：以移動全距估計（I-MR）
+        sigma = mr_sum / (count - 1) / _D2[2]
+    else:
+        sigma = 0.0
+    p_bar = total_defect / total_output if total_output else 0.0
+    sigma_bar = sigma / math.sqrt(n_bar) if n_bar else 0.0
+
+    # 單次掃描：管制界限、EWMA、CUSUM、Nelson 規則
+    violations = {rule: 0 for rule in NELSON_RULES}
+    counts = {"r": 0, "p": 0, "ewma": 0, "cusum": 0}
+    detail = []
+    recent_signals = []
+
+    ewma = center
+    ewma_factor = 1.0
+    c_pos = c_neg = 0.0
+    side_run = side = 0
+    trend_run = trend = 0
+    alt_run = 0
+    last_diff = 0
+    inside_run = outside_run = 0
+    since_above = since_below = 8   # 距上一個 z > 1 / z < -1 的點數
+    last3 = deque(maxlen=3)
+    last5 = deque(maxlen=5)
+    prev_x = None
+
+    for i, p in enumerate(points):
+        x, n = p['xbar'], p['n']
+        s_i = sigma / math.sqrt(n) if n else 0.0
+        z = (x - center) / s_i if s_i else 0.0
+        rules = []
+
+        # 規則 1
+        if abs(z) > 3:
+            rules.append(1)
+        # 規則 2：同側連續
+        cur_side = (z > 0) - (z < 0)
+        side_run = side_run + 1 if cur_side and cur_side == side else (1 if cur_side else 0)
+        side = cur_side
+        if side_run >= 9:
+            rules.append(2)
+        # 規則 3 / 4：連續遞增遞減、交替升降
+        if prev_x is not None:
+            diff = (x > prev_x) - (x < prev_x)
+            trend_run = trend_run + 1 if diff and diff == trend else (1 if diff else 0)
+            trend = diff
+            alt_run = alt_run + 1 if diff and diff == -last_diff else (1 if diff else 0)
+            last_diff = diff
+        if trend_run >= 5:
+            rules.append(3)
+        if alt_run >= 13:
+            rules.append(4)
+        prev_x = x
+        # 規則 5 / 6：k 點中有 m 點超出（同側）
+        last3.append(z)
+        last5.append(z)
+        if len(last3) == 3 and (sum(v > 2 for v in last3) >= 2 or sum(v < -2 for v in last3) >= 2):
+            rules.append(5)
+        if len(last5) == 5 and (sum(v > 1 for v in last5) >= 4 or sum(v < -1 for v in last5) >= 4):
+            rules.append(6)
+        # 規則 7 / 8
+        inside_run = inside_run + 1 if abs(z) < 1 else 0
+        outside_run = outside_run + 1 if abs(z) > 1 else 0
+        since_above = 0 if z > 1 else since_above + 1
+        since_below = 0 if z < -1 else since_below + 1
+        if inside_run >= 15 and s_i:
+            rules.append(7)
+        # 最近 8 點皆在 1σ 外，且兩側都有
+        if outside_run >= 8 and since_above < 8 and since_below < 8:
+            rules.append(8)
+        for rule in rules:
+            violations[rule] += 1
+
+        # R 圖
+        signals = [f"rule{rule}" for rule in rules]
+        r_center = r_ucl = r_lcl = None
+        if n >= 2 and p['r'] is not None:
+            r_center = d2(n) * sigma
+            r_ucl = (d2(n) + 3 * d3(n)) * sigma
+            r_lcl = max(0.0, (d2(n) - 3 * d3(n)) * sigma)
+            if p['r'] > r_ucl or p['r'] < r_lcl:
+                counts['r'] += 1
+                signals.append('r')
+
+        # p 圖
+        p_i = p_ucl = p_lcl = None
+        if p['output']:
+            p_i = (p['defect'] or 0) / p['output']
+            p_sigma = math.sqrt(p_bar * (1 - p_bar) / p['output'])
+            p_ucl = p_bar + 3 * p_sigma
+            p_lcl = max(0.0, p_bar - 3 * p_sigma)
+            if p_i > p_ucl or p_i < p_lcl:
+                counts['p'] += 1
+                signals.append('p')
+
+        # EWMA
+        ewma = EWMA_LAMBDA * x + (1 - EWMA_LAMBDA) * ewma
+        ewma_factor *= (1 - EWMA_LAMBDA) ** 2
+        ewma_width = EWMA_L * sigma_bar * math.sqrt(EWMA_LAMBDA / (2 - EWMA_LAMBDA) * (1 - ewma_factor))
+        if sigma_bar and abs(ewma - center) > ewma_width:
+            counts['ewma'] += 1
+            signals.append('ewma')
+
+        # CUSUM
+        zc = (x - center) / sigma_bar if sigma_bar else 0.0
+        c_pos = max(0.0, c_pos + zc - CUSUM_K)
+        c_neg = max(0.0, c_neg - zc - CUSUM_K)
+        if c_pos > CUSUM_H or c_neg > CUSUM_H:
+            counts['cusum'] += 1
+            signals.append('cusum')
+
+        if i >= count - recent and signals:
+            recent_signals.append({"date": p['date'], "signals": signals})
+
+        if include_points:
+            detail.append({
+                "date": p['date'],
+                "n": n,
+                "xbar": _round(x),
+                "ucl": _round(center + 3 * s_i),
+                "lcl": _round(max(0.0, center - 3 * s_i)),
+                "z": _round(z, 2),
+                "r": _round(p['r']),
+                "r_center": _round(r_center),
+                "r_ucl": _round(r_ucl),
+                "r_lcl": _round(r_lcl),
+                "p": _round(p_i * 100 if p_i is not None else None),
+                "p_ucl": _round(p_ucl * 100 if p_ucl is not None else None),
+                "p_lcl": _round(p_lcl * 100 if p_lcl is not None else None),
+                "ewma": _round(ewma),
+                "ewma_ucl": _round(center + ewma_width),
+                "ewma_lcl": _round(max(0.0, center - ewma_width)),
+                "cusum_pos": _round(c_pos, 2),
+                "cusum_neg": _round(c_neg, 2),
+                "rules": rules,
+            })
+
+    result = {
+        "points": count,
+        "center": _round(center),
+        "sigma": _round(sigma),
+        "n_bar": _round(n_bar, 1),
+        "p_bar": _round(p_bar * 100),
+        "violations": {str(rule): cnt for rule, cnt in violations.items() if cnt},
+        "signals": {name: cnt for name, cnt in counts.items() if cnt},
+        "last_date": points[-1]['date'] if points else None,
+        "recent_signals": recent_signals,
+        "out_of_control": bool(recent_signals),
+    }
+    if include_points:
+        result["detail"] = detail
+    return result